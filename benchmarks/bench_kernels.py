@@ -0,0 +1,64 @@
+####################################################################################################################
+# bench_kernels.py
+#
+# benchmarks for the kernel backends - each kernel runs on both the numpy & numba backends, so the speedup shows up
+# side by side in each group
+
+
+
+####################################################################################################################
+# IMPORTS
+import numpy as np
+import pytest
+from eatlib import numba, set_kernel_backend, get_kernel_backend, bin_loads, run_lengths, simulate_storage, \
+    min_storage_size
+from synthetic import make_trend_series
+
+####################################################################################################################
+# FIXTURES
+
+@pytest.fixture(params=['numpy', pytest.param('numba', marks=pytest.mark.skipif(numba is None,
+                                                                                 reason='numba is not installed'))])
+def backend(request):
+    previous = get_kernel_backend()
+    set_kernel_backend(request.param)
+    yield request.param
+    set_kernel_backend(previous)
+
+
+@pytest.fixture(scope='module')
+def year_of_loads():
+    # 1 year of 15 minute data
+    return make_trend_series(35_040, freq='15min')['Heating Load (MBH)'].to_numpy()
+
+####################################################################################################################
+# BENCHMARKS
+
+def bench_bin_loads(benchmark, trend_df, backend):
+    loads = trend_df['Heating Load (MBH)'].to_numpy()
+    edges = np.array([0, 50, 100, 200, 300, 400, 600, 800, 1200, 2700])  # uneven bins
+    bin_loads(loads, edges)  # compile/load from the cache before timing
+    bin_sums, bin_counts = benchmark(bin_loads, loads, edges)
+    assert len(bin_counts) == len(edges) - 1
+
+
+def bench_run_lengths(benchmark, trend_df, backend):
+    values = trend_df['HHW Supply Temp (°F)'].round().to_numpy()  # rounded, so there are runs to find
+    run_lengths(values)
+    lengths = benchmark(run_lengths, values)
+    assert len(lengths) == len(values)
+
+
+def bench_simulate_storage(benchmark, year_of_loads, backend):
+    plant_mbh, tank_kbtu = [grid.ravel() for grid in np.meshgrid(np.linspace(200, 700, 10), np.linspace(0, 5000, 10))]
+    simulate_storage(year_of_loads[:10], 0.25, plant_mbh, tank_kbtu)
+    unmet_kbtu, unmet_hrs = benchmark.pedantic(simulate_storage, args=(year_of_loads, 0.25, plant_mbh, tank_kbtu),
+                                               rounds=3)
+    assert unmet_kbtu.shape == plant_mbh.shape
+
+
+def bench_min_storage_size(benchmark, year_of_loads, backend):
+    plant_mbh = np.linspace(200, 700, 100)
+    min_storage_size(year_of_loads[:10], 0.25, plant_mbh)
+    min_tank_df = benchmark.pedantic(min_storage_size, args=(year_of_loads, 0.25, plant_mbh), rounds=3)
+    assert len(min_tank_df) == len(plant_mbh)
@@ -0,0 +1,207 @@
+####################################################################################################################
+# bench_load_profile.py
+#
+# benchmarks for the load_profile.py hot paths - the Excel reads, part load binning, figure rendering, html writing,
+# the template workbook export, plot_time(), plot_x_density(), prototype profile generation, the bootstrap
+# confidence bands, the data quality scan, incremental summary updates & carpet_matrix()
+
+
+
+####################################################################################################################
+# IMPORTS
+import numpy as np
+import pandas as pd
+import pytest
+from eatlib import plot_time, plot_time_fast, summarize_loads, render_load_profile, plot_load_profile, load_profile_template, \
+    write_load_profile_html, write_load_profile_workbook, load_bin_table, PrototypeLibrary, generate_load_profiles, \
+    summarize_load_matrix, HOURS_OF_YEAR, bootstrap_load_profile, plot_x_density, parse_timestamps, \
+    scan_data_quality, update_load_summary, read_load_summary, carpet_matrix
+from synthetic import make_weather
+
+####################################################################################################################
+# FIXTURES
+
+@pytest.fixture(scope='module')
+def meta_df():
+    return pd.DataFrame({'Value': [2700, 125948, 'Bldg 1']}, index=['Design MBH', 'Building GSF', 'Building Name'])
+
+
+@pytest.fixture(scope='module')
+def summary():
+    trend_df = pd.DataFrame({'Timestamp': pd.date_range('2018-01-01', periods=35_040, freq='15min')})
+    trend_df['Heating Load (MBH)'] = (trend_df.index % 2700).astype(float)
+    return summarize_loads(trend_df['Timestamp'], trend_df['Heating Load (MBH)'], 2700)
+
+
+@pytest.fixture(scope='module')
+def prototype_library():
+    # one synthetic prototype - heating below 60 F & cooling above 65 F, on synthetic weather
+    dry_bulb = make_weather(8760)['dry_bulb'] * 1.8 + 32
+    heating = np.clip(60 - dry_bulb, 0, None) / np.clip(60 - dry_bulb, 0, None).max()
+    cooling = np.clip(dry_bulb - 65, 0, None) / np.clip(60 - dry_bulb, 0, None).max()
+    return PrototypeLibrary(['Office'], heating[None], cooling[None], dry_bulb[None], np.array([1000.0]),
+                            np.array([50_000.0]))
+
+####################################################################################################################
+# BENCHMARKS
+
+def bench_read_excel_loads(benchmark, workbook_path):
+    # same call as load_profile.py
+    load_df = benchmark.pedantic(pd.read_excel, args=(workbook_path,),
+                                 kwargs=dict(sheet_name='Bldg 2', usecols='A:I', engine='openpyxl'), rounds=3)
+    assert load_df.shape[1] == 9
+
+
+def bench_read_excel_metadata(benchmark, workbook_path):
+    meta_df = benchmark.pedantic(pd.read_excel, args=(workbook_path,),
+                                 kwargs=dict(sheet_name='Bldg 2', index_col=0, usecols='K:L', engine='openpyxl'),
+                                 rounds=3)
+    assert meta_df.dropna().iloc[0, 0] == 2700
+
+
+def bench_summarize_loads(benchmark, trend_df):
+    summary = benchmark(summarize_loads, trend_df['Timestamp'], trend_df['Heating Load (MBH)'], 2700)
+    assert summary['points'] == len(trend_df)
+
+
+@pytest.mark.parametrize('timestamp_format', ['%m/%d/%Y %H:%M', '%m/%d/%Y %I:%M %p', '%d-%b-%y %I:%M:%S %p PST'])
+def bench_parse_timestamps(benchmark, trend_df, timestamp_format):
+    # BAS export strings, 12 hour times must keep their AM/PM
+    strings = trend_df['Timestamp'].dt.strftime(timestamp_format)
+    timestamps = benchmark(parse_timestamps, strings)
+    assert (timestamps.to_numpy() == trend_df['Timestamp'].dt.floor('s').to_numpy()).all()
+
+
+@pytest.mark.parametrize('case', ['constant', 'step', 'offset', 'offset noise'])
+def bench_scan_data_quality(benchmark, case):
+    # clean series that round off used to flag as spikes, plus one real spike that has to be found
+    n = 100_000
+    noise = np.random.default_rng(0).normal(0, 1, n)
+    values = {'constant': np.full(n, 72.3),
+              'step': np.repeat([10.0, 20.0, 15.0, 30.0], n // 4),
+              'offset': 1e6 + 10 * np.sin(np.arange(n) / 50),
+              'offset noise': 1e6 + noise}[case]
+    values[n // 2] += 1000
+    dq_summary, dq_mask = benchmark(scan_data_quality, pd.Series(values), flatline_steps=n + 1, zero_steps=None)
+    spikes = set(np.flatnonzero(dq_mask['Spike']))
+    if case == 'offset noise':
+        # noise gets the same (statistical, > 6 sigma) flags with or without the offset
+        noise[n // 2] += 1000
+        assert spikes == set(np.flatnonzero(scan_data_quality(pd.Series(noise))[1]['Spike']))
+    elif case == 'constant':
+        assert not spikes  # no spread to compare against, the flatline check covers constant data
+    else:
+        assert spikes == {n // 2}
+
+
+def bench_update_load_summary(benchmark, trend_df, tmp_path, capsys):
+    # the last 10% of the rows are new since the saved summary, only they get binned
+    summary_path = str(tmp_path / 'Bldg 1.json')
+    n_saved = len(trend_df) * 9 // 10
+
+    def setup():
+        update_load_summary(summary_path, trend_df.iloc[:n_saved], 2700)
+        return (summary_path, trend_df, 2700), {}
+
+    summary = benchmark.pedantic(update_load_summary, setup=setup, rounds=3)
+    full = summarize_loads(trend_df['Timestamp'], trend_df['Heating Load (MBH)'], 2700)
+    assert {k: summary[k] for k in ['start', 'end', 'points', 'op_points', 'bin_counts', 'max_load']} == \
+        {k: full[k] for k in ['start', 'end', 'points', 'op_points', 'bin_counts', 'max_load']}
+    assert summary['bin_sums'] == pytest.approx(full['bin_sums']) and not summary['exclude_bad_data']
+
+    # filtered data doesn't merge into an unfiltered summary (or the other way around), it's rebuilt
+    filtered_df = trend_df.iloc[::2]
+    summary = update_load_summary(summary_path, filtered_df, 2700, exclude_bad_data=True)
+    assert summary['points'] == len(filtered_df) and read_load_summary(summary_path)['exclude_bad_data']
+    summary = update_load_summary(summary_path, trend_df, 2700)
+    assert summary['points'] == len(trend_df) and not summary['exclude_bad_data']
+    capsys.readouterr()
+
+
+def bench_plot_time(benchmark, trend_df, capsys):
+    # plot_time() writes the timestamps back into its input, so every round gets a fresh copy
+    fig = benchmark.pedantic(plot_time, setup=lambda: ((trend_df.copy(),), {}), rounds=3)
+    capsys.readouterr()  # throw away the data preview
+    assert len(fig.data) == trend_df.shape[1] - 1
+
+
+def bench_plot_time_fast(benchmark, trend_df):
+    # same data as bench_plot_time but with the timestamps as strings, like a BAS export
+    string_df = trend_df.assign(Timestamp=trend_df['Timestamp'].dt.strftime('%m/%d/%Y %H:%M'))
+    fig = benchmark.pedantic(plot_time_fast, args=(string_df,), kwargs=dict(cache_key='bench'), rounds=3)
+    assert len(fig.data) == trend_df.shape[1] - 1
+
+
+def bench_plot_x_density(benchmark, trend_df):
+    # load vs. flow, the figure size shouldn't grow with the rows
+    fig = benchmark(plot_x_density, trend_df[['HHW Flow (GPM)', 'Heating Load (MBH)']])
+    benchmark.extra_info['figure_mb'] = len(fig.to_json()) / 1e6
+    assert fig.data[0].z.shape == (100, 200)
+
+
+def bench_carpet_matrix(benchmark, trend_df):
+    # a timezone-aware export (8 hours behind UTC, no DST) lands in the same cells as its local wall clock times
+    local = trend_df['Timestamp'].dt.tz_localize('Etc/GMT+8')
+    carpet_df = benchmark(carpet_matrix, trend_df['Heating Load (MBH)'], local, freq='1min', slot='1h')
+    expected = carpet_matrix(trend_df['Heating Load (MBH)'], trend_df['Timestamp'], freq='1min', slot='1h')
+    pd.testing.assert_frame_equal(carpet_df, expected)
+
+
+def bench_plot_load_profile(benchmark, summary, meta_df):
+    fig = benchmark(plot_load_profile, summary, meta_df)
+    assert len(fig.data) == 4
+
+
+def bench_render_load_profile(benchmark, summary, meta_df):
+    load_profile_template()  # the template is built once per process, don't count it
+    fig_dict = benchmark(render_load_profile, summary, meta_df)
+    assert len(fig_dict['data']) == 4
+
+
+def bench_render_load_profile_empty(benchmark, meta_df):
+    # no loads, e.g. every point excluded as bad data - a clear error instead of a TypeError from round(None)
+    timestamps = pd.date_range('2018-01-01', periods=96, freq='15min')
+    empty = summarize_loads(timestamps, np.full(96, np.nan), 2700)
+    with pytest.raises(ValueError, match='no load data'):
+        benchmark(render_load_profile, empty, meta_df)
+
+
+@pytest.mark.parametrize('include_plotlyjs', [True, 'directory', 'cdn'])
+def bench_write_html(benchmark, summary, meta_df, tmp_path, include_plotlyjs):
+    fig_dict = render_load_profile(summary, meta_df)
+    html_path = str(tmp_path / 'report.html')
+    benchmark(write_load_profile_html, fig_dict, html_path, include_plotlyjs=include_plotlyjs)
+
+
+def bench_write_load_profile_workbook(benchmark, throughput, trend_df, summary, meta_df, tmp_path):
+    # streaming export in the template's layout, up to a million rows. throughput is saved with the results
+    xlsx_path = str(tmp_path / 'export.xlsx')
+    benchmark.pedantic(write_load_profile_workbook, args=(xlsx_path, trend_df, meta_df),
+                       kwargs=dict(sheets={'Bins': load_bin_table(summary)}), rounds=1)
+    throughput('rows_per_s', len(trend_df))
+
+
+@pytest.mark.parametrize('n_buildings', [100, 2_000])
+def bench_generate_load_profiles(benchmark, throughput, prototype_library, epw_path, n_buildings):
+    # half the buildings weather adjusted to the synthetic .epw, streamed into the part load binning
+    buildings_df = pd.DataFrame({'Design MBH': np.linspace(200, 5000, n_buildings),
+                                 'Weather File': [epw_path, None] * (n_buildings // 2)})
+
+    def generate_and_summarize():
+        summaries = []
+        for names, heating, cooling in generate_load_profiles(buildings_df, prototype_library):
+            summaries += summarize_load_matrix(HOURS_OF_YEAR, heating, buildings_df.loc[names, 'Design MBH'])
+        return summaries
+
+    summaries = benchmark.pedantic(generate_and_summarize, rounds=1)
+    throughput('buildings_per_s', n_buildings)
+    assert len(summaries) == n_buildings
+
+
+def bench_bootstrap_load_profile(benchmark, throughput, trend_df):
+    # 2000 replicates of day blocks, the load_profile.py setting
+    bands_df, peak_band = benchmark(bootstrap_load_profile, trend_df['Timestamp'], trend_df['Heating Load (MBH)'],
+                                    2700, n_boot=2000, seed=0)
+    throughput('replicates_per_s', 2000)
+    assert (bands_df['Hours (%) Low'] <= bands_df['Hours (%) High']).all()
+    assert peak_band['Low'] <= peak_band['High']
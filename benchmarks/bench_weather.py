@@ -0,0 +1,89 @@
+####################################################################################################################
+# bench_weather.py
+#
+# benchmarks for the weather hot paths - read_epw() & its unit conversions, plot_epw(), plane_of_array(), the .epw
+# writer/morphing & compact_dtypes() on weather frames
+
+
+
+####################################################################################################################
+# IMPORTS
+import numpy as np
+import pandas as pd
+import pytest
+
+from eatlib import read_epw, plot_epw, plane_of_array, write_epw, morph_epws, compact_dtypes
+
+####################################################################################################################
+# BENCHMARKS
+
+def bench_read_epw(benchmark, epw_path):
+    epw_df = benchmark.pedantic(read_epw, args=(epw_path,), rounds=5)
+    assert len(epw_df) == 8760
+
+
+def bench_read_epw_units(benchmark, epw_path, tmp_path):
+    # two step IP conversions - radiation Wh/m2 -> Btu/ft2, visibility km -> mi & snow depth cm -> ft
+    with open(epw_path) as f:
+        lines = f.read().splitlines()
+    rows = [line.split(',') for line in lines[8:]]
+    for i, row in enumerate(rows):
+        row[24] = '{:.1f}'.format(1 + i % 400 / 10)  # visibility (km)
+        row[30] = str(i % 50)  # snow depth (cm)
+    units_path = str(tmp_path / 'units.epw')
+    with open(units_path, 'w') as f:
+        f.write('\n'.join(lines[:8] + [','.join(row) for row in rows]) + '\n')
+
+    epw_df = benchmark.pedantic(read_epw, args=(units_path,), rounds=5)
+    raw = np.array([row[:31] for row in rows], dtype=object)
+    # point in time fields are shifted an hour, so compare the sorted values
+    for column, field, factor in [('Global Horizontal Radiation', 13, 0.316998), ('Visibility', 24, 0.621371),
+                                  ('Snow Depth', 30, 0.0328084)]:
+        expected = np.sort(raw[:, field].astype(float)) * factor
+        np.testing.assert_allclose(np.sort(np.asarray(epw_df[column], dtype=float)), expected, rtol=1e-5)
+
+
+def bench_compact_dtypes(benchmark, epw_path):
+    # every measurement column has to stay numeric, e.g. whole number Wind Direction can't become a categorical
+    epw_df = read_epw(epw_path)
+    epw_df['Wind Direction'] = (np.asarray(epw_df['Wind Direction'], dtype=float) / 10).round() * 10  # like real files
+    compact_df = benchmark(compact_dtypes, epw_df)
+    assert all(pd.api.types.is_numeric_dtype(dtype) for dtype in compact_df.dtypes)
+    np.testing.assert_allclose(compact_df.mean().to_numpy(dtype=float), epw_df.astype(float).mean().to_numpy(),
+                               rtol=1e-4, atol=1e-3)
+
+
+def bench_plot_epw(benchmark, trend_df):
+    # plot_epw() works on any time-indexed frame, the trend series stands in for longer/sub-hourly weather data
+    epw_df = trend_df.set_index('Timestamp')
+    fig = benchmark.pedantic(plot_epw, args=(epw_df,), rounds=3)
+    assert len(fig.data) == epw_df.shape[1]
+
+
+@pytest.mark.parametrize('n_surfaces', [100, 10_000])
+def bench_plane_of_array(benchmark, epw_path, n_surfaces):
+    epw_df = read_epw(epw_path)
+    rng = np.random.default_rng(0)
+    surfaces = pd.DataFrame({'Tilt': rng.uniform(0, 90, n_surfaces), 'Azimuth': rng.uniform(0, 360, n_surfaces)})
+    poa_df = benchmark.pedantic(plane_of_array, args=(epw_df, surfaces), kwargs={'dtype': np.float32}, rounds=3)
+    assert poa_df.shape == (8760, n_surfaces)
+
+
+def bench_write_epw(benchmark, throughput, epw_path, tmp_path):
+    epw_df = read_epw(epw_path)
+    out_path = str(tmp_path / 'written.epw')
+    benchmark.pedantic(write_epw, args=(epw_df, out_path), rounds=5)
+    throughput('files_per_s', 1)
+    assert len(read_epw(out_path)) == 8760
+
+
+@pytest.mark.parametrize('n_scenarios', [10, 100])
+def bench_morph_epws(benchmark, throughput, epw_path, tmp_path, n_scenarios):
+    # monthly warming steps & drier summers, like a batch of future climate scenarios
+    scenarios = {'scenario_{:03d}'.format(i): {'dry_bulb_shift': np.linspace(1, 6, 12) * i / n_scenarios,
+                                               'humidity_scale': 1 - 0.1 * i / n_scenarios,
+                                               'radiation_scale': 1.02}
+                 for i in range(n_scenarios)}
+    epw_paths = benchmark.pedantic(morph_epws, args=(epw_path, scenarios, str(tmp_path / 'morphed')), rounds=1)
+    throughput('files_per_s', n_scenarios)
+    assert len(epw_paths) == n_scenarios
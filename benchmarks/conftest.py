@@ -0,0 +1,49 @@
+####################################################################################################################
+# conftest.py
+#
+# shared fixtures for the benchmarks - synthetic data is generated once per session at a few sizes
+
+
+
+####################################################################################################################
+# IMPORTS
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # so eatlib can be imported
+
+from synthetic import make_epw, make_trend_series, make_load_workbook
+
+####################################################################################################################
+# SIZES
+
+TREND_ROWS = [10_000, 100_000, 1_000_000]  # ~1 week, ~2 months & ~2 years of 1 minute data
+WORKBOOK_ROWS = [1_000, 10_000, 35_040]  # up to 1 year of 15 minute data
+
+####################################################################################################################
+# FIXTURES
+
+@pytest.fixture(scope='session')
+def epw_path(tmp_path_factory):
+    return make_epw(str(tmp_path_factory.mktemp('weather') / 'synthetic.epw'))
+
+
+@pytest.fixture(scope='session', params=TREND_ROWS)
+def trend_df(request):
+    return make_trend_series(request.param)
+
+
+@pytest.fixture
+def throughput(benchmark):
+    # save items per second with the results - benchmark.stats is None with --benchmark-disable, so skip it there
+    def record(name, count):
+        if benchmark.stats is not None:
+            benchmark.extra_info[name] = count / benchmark.stats.stats.mean
+    return record
+
+
+@pytest.fixture(scope='session', params=WORKBOOK_ROWS)
+def workbook_path(request, tmp_path_factory):
+    xlsx_path = tmp_path_factory.mktemp('loads') / 'synthetic_{}.xlsx'.format(request.param)
+    return make_load_workbook(str(xlsx_path), request.param, sheet_names=('Bldg 1', 'Bldg 2', 'Bldg 3'))
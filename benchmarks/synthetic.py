@@ -0,0 +1,191 @@
+####################################################################################################################
+# synthetic.py
+#
+# generators for synthetic HVAC data used by the benchmarks - EPW weather files, load profile workbooks laid out
+# like 'Input Load Profiles/Load Profile Template.xlsx' & long minute-level trend series
+
+
+
+####################################################################################################################
+# IMPORTS
+import numpy as np
+import pandas as pd
+import openpyxl
+
+####################################################################################################################
+# FUNCTIONS
+
+#####################################################
+# make_weather(n_hours, seed=0) - smooth, seasonal weather arrays in SI units (the units EPW files use)
+#
+#   Inputs:
+#
+#   n_hours - number of hourly values
+#   seed - random seed, the same seed always gives the same data
+#
+#
+#   Outputs:
+#
+#   weather - a dictionary of numpy arrays (dry bulb, dew point, RH, pressure, irradiance, wind)
+#
+def make_weather(n_hours, seed=0):
+    rng = np.random.default_rng(seed)
+    hours = np.arange(n_hours)
+    day_angle = 2 * np.pi * hours / 8760
+    hour_angle = 2 * np.pi * (hours % 24) / 24
+
+    dry_bulb = 15 - 8 * np.cos(day_angle) - 5 * np.cos(hour_angle) + rng.normal(0, 1.5, n_hours)
+    dew_point = dry_bulb - 4 - 3 * rng.random(n_hours)
+    rh = np.clip(100 - 5 * (dry_bulb - dew_point), 5, 100)
+    sun = np.clip(-np.cos(hour_angle), 0, None) * (0.75 - 0.25 * np.cos(day_angle))
+    ghi = 1000 * sun * rng.uniform(0.6, 1, n_hours)
+    dni = 0.7 * ghi
+    dhi = ghi - 0.5 * dni
+
+    weather = {
+        'dry_bulb': dry_bulb.round(1),
+        'dew_point': dew_point.round(1),
+        'rh': rh.round(),
+        'pressure': (101325 + rng.normal(0, 300, n_hours)).round(),
+        'ghi': ghi.round(),
+        'dni': dni.round(),
+        'dhi': dhi.round(),
+        'wind_dir': rng.integers(0, 360, n_hours),
+        'wind_speed': rng.gamma(2, 1.5, n_hours).round(1)
+    }
+    return weather
+#####################################################
+
+
+#####################################################
+# make_epw(epw_path, year=2017, seed=0) - write a synthetic 8760 hour .epw file
+#
+#   Inputs:
+#
+#   epw_path - where to write the file
+#   year - year written in the data rows (leap years still get 8760 hours, like TMY files)
+#   seed - random seed
+#
+#
+#   Outputs:
+#
+#   epw_path - the path that was written
+#
+def make_epw(epw_path, year=2017, seed=0):
+    n_hours = 8760
+    w = make_weather(n_hours, seed)
+    stamps = pd.date_range('2017-01-01', periods=n_hours, freq='h')  # non-leap year, epw hour 1 = 00:00-01:00
+    month = stamps.month
+    day = stamps.day
+    hour = stamps.hour + 1
+
+    header = [
+        'LOCATION,Synthetic Site,CA,USA,SYNTH,999999,33.90,-118.50,-8.0,30.0',
+        'DESIGN CONDITIONS,0',
+        'TYPICAL/EXTREME PERIODS,0',
+        'GROUND TEMPERATURES,0',
+        'HOLIDAYS/DAYLIGHT SAVINGS,No,0,0,0',
+        'COMMENTS 1,Synthetic weather file for hvaclib benchmarks',
+        'COMMENTS 2,seed {}'.format(seed),
+        'DATA PERIODS,1,1,Data,Sunday, 1/ 1,12/31'
+    ]
+    row_format = ('{},{},{},{},60,A7A7A7A7*0?9?9?9?9?9?9?9A7A7A7A7A7A7*0E8*0*0,{},{},{:.0f},{:.0f},0,1415,300,{:.0f},'
+                  '{:.0f},{:.0f},999900,999900,999900,999900,{},{},5,5,9999,77777,9,999999999,0,0.0000,0,88,0.000,'
+                  '0.0,0.0')
+    rows = [row_format.format(year, *values) for values in zip(
+        month, day, hour, w['dry_bulb'], w['dew_point'], w['rh'], w['pressure'], w['ghi'], w['dni'], w['dhi'],
+        w['wind_dir'], w['wind_speed'])]
+
+    with open(epw_path, 'w') as f:
+        f.write('\n'.join(header + rows) + '\n')
+    return epw_path
+#####################################################
+
+
+#####################################################
+# make_trend_series(n_rows, freq='1min', start='2018-01-01', seed=0) - long BAS style trend export
+#
+#   Inputs:
+#
+#   n_rows - number of rows
+#   freq - trend interval, e.g. '1min', '10min', '15min'
+#   start - first timestamp
+#   seed - random seed
+#
+#
+#   Outputs:
+#
+#   trend_df - a DataFrame with the same columns as the load profile template (Timestamp in the first column)
+#
+def make_trend_series(n_rows, freq='1min', start='2018-01-01', seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range(start, periods=n_rows, freq=freq)
+    hours = (timestamps - timestamps[0]) / pd.Timedelta(hours=1)
+    oat = 60 - 15 * np.cos(2 * np.pi * hours / 8760) - 8 * np.cos(2 * np.pi * (hours % 24) / 24)
+
+    hhw_flow = np.clip(250 - 4 * oat + rng.normal(0, 10, n_rows), 0, None).round(1)
+    hhw_supply = (160 + rng.normal(0, 1, n_rows)).round(1)
+    hhw_return = (hhw_supply - np.clip(5 + 0.2 * (65 - oat), 1, None)).round(1)
+    chw_flow = np.clip(8 * (oat - 55) + rng.normal(0, 10, n_rows), 0, None).round(1)
+    chw_supply = (44 + rng.normal(0, 0.5, n_rows)).round(1)
+    chw_return = (chw_supply + 10 + rng.normal(0, 1, n_rows)).round(1)
+
+    trend_df = pd.DataFrame({
+        'Timestamp': timestamps,
+        'HHW Flow (GPM)': hhw_flow,
+        'HHW Return Temp (°F)': hhw_return,
+        'HHW Supply Temp (°F)': hhw_supply,
+        'Heating Load (MBH)': (0.5 * hhw_flow * (hhw_supply - hhw_return)).round(2),  # 500 x GPM x dT / 1000
+        'CHW Flow (GPM)': chw_flow,
+        'CHW Return Temp (°F)': chw_return,
+        'CHW Supply Temp (°F)': chw_supply,
+        'Cooling Load (MBH)': (0.5 * chw_flow * (chw_return - chw_supply)).round(2)
+    })
+    return trend_df
+#####################################################
+
+
+#####################################################
+# make_load_workbook(xlsx_path, n_rows, sheet_names=('Bldg 1',), freq='15min', seed=0) - load profile workbook
+#
+#   Inputs:
+#
+#   xlsx_path - where to write the workbook
+#   n_rows - number of trend rows on each sheet
+#   sheet_names - one sheet per building
+#   freq - trend interval
+#   seed - random seed, each sheet gets seed + sheet number
+#
+#
+#   Outputs:
+#
+#   xlsx_path - the path that was written
+#
+#
+#   Notes:
+#
+#   -Each sheet has the trend data in A:I & the static inputs/metadata in K:L, the same as the load profile template,
+#    so load_profile.py can read it without any changes.
+#
+def make_load_workbook(xlsx_path, n_rows, sheet_names=('Bldg 1',), freq='15min', seed=0):
+    wb = openpyxl.Workbook(write_only=True)
+    for n, sheet_name in enumerate(sheet_names):
+        trend_df = make_trend_series(n_rows, freq=freq, seed=seed + n)
+        metadata = [
+            ('Static Inputs/Metadata', None),
+            ('Design MBH', 2700),
+            ('Building GSF', 125948),
+            ('Building Name', sheet_name),
+            ('Site', 'Synthetic Campus'),
+            ('CEC Climate Zone', 7),
+            ('Building Type', 'School')
+        ]
+
+        ws = wb.create_sheet(sheet_name)
+        ws.append(list(trend_df.columns) + [None] + list(metadata[0]))
+        for i, row in enumerate(trend_df.itertuples(index=False)):
+            meta_row = list(metadata[i + 1]) if i + 1 < len(metadata) else []
+            ws.append([row[0].to_pydatetime()] + [None if np.isnan(x) else float(x) for x in row[1:]] + [None] + meta_row)
+    wb.save(xlsx_path)
+    return xlsx_path
+#####################################################
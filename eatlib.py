@@ -9,17 +9,53 @@
 ####################################################################################################################
 # IMPORTS
 
+import io
 import os
+import mmap
+import contextlib
+import sys
+import json
+import time
+import threading
+import tracemalloc
+import atexit
+import warnings
+import weakref
 import random
+import functools
+import collections
+import copy
+import hashlib
+import sqlite3
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
 import datetime
 import numpy as np
 import openpyxl
-# import warnings
-# import time
+from numpy.dtypes import StringDType
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from xml.etree import ElementTree
+import ladybug_pandas as lbp
+from ladybug.epw import EPW, EPWFields
+from ladybug.header import Header
+from ladybug.datatype.base import DataTypeBase
+from ladybug.analysisperiod import AnalysisPeriod
+from ladybug.datacollection import HourlyContinuousCollection
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
+try:
+    import resource  # peak RSS, not available on Windows
+except ImportError:
+    resource = None
+try:
+    import numba  # optional, compiled kernels - see set_kernel_backend()
+except ImportError:
+    numba = None
 # import tkinter as tk
 # from tkinter import filedialog
 # from tkinter import messagebox
@@ -32,213 +68,4606 @@ from matplotlib import pyplot as plt
 # FUNCTIONS:
 
 ###########################################################################
-# e.g. DATA CLEANING FUNCTIONS:
+# INSTRUMENTATION FUNCTIONS:
 
-###########################################################################
-# e.g. ENERGY FUNCTIONS:
+_profiler = None  # the active StageProfiler, None = instrumentation is off
+
+
+#####################################################
+# start_profiling(trace_memory=False) / stop_profiling() - turn stage timing on & off
+#
+#   Imports:
+#
+#   import tracemalloc
+#
+#
+#   Inputs:
+#
+#   trace_memory - also record the peak Python memory of each stage with tracemalloc. This slows the code down
+#                  noticeably while it's on, so it's off by default.
+#
+#
+#   Outputs:
+#
+#   profiler - the StageProfiler collecting the stages (stop_profiling() returns it too)
+#
+#
+#   Example:
+#
+#   start_profiling()
+#   epw_df = read_epw('Weather Files/CZ06RV2.epw')
+#   with profile_stage('my stage', rows=len(epw_df)):
+#       ...
+#   profiler = stop_profiling()
+#   print(profiler.summary())
+#   profiler.write_chrome_trace('trace.json')   # open in chrome://tracing or https://ui.perfetto.dev
+#
+def start_profiling(trace_memory=False):
+    global _profiler
+    stop_profiling()
+    _profiler = StageProfiler(trace_memory=trace_memory)
+    return _profiler
+
+
+def stop_profiling():
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    if profiler is not None:
+        profiler.close()
+    return profiler
+#####################################################
+
+
+#####################################################
+# profile_stage(name, rows=None) - context manager that records one named stage
+#
+#   Inputs:
+#
+#   name - stage name, e.g. 'read_excel'
+#   rows - number of rows the stage handles, if known. Can also be set inside the with block:
+#
+#          with profile_stage('read_excel') as stage:
+#              load_df = pd.read_excel(...)
+#              stage.rows = len(load_df)
+#
+#
+#   Notes:
+#
+#   -When profiling is off this returns a shared do-nothing object, so leaving stages in the code costs ~nothing.
+#
+def profile_stage(name, rows=None):
+    if _profiler is None:
+        return _NULL_STAGE
+    return _Stage(_profiler, name, rows)
+#####################################################
+
+
+#####################################################
+# profiled(name=None) - decorator that records every call of a function as a stage
+#
+#   Inputs:
+#
+#   name - stage name, defaults to the function name
+#
+#
+#   Notes:
+#
+#   -If the function returns a DataFrame, Series or array, its length is recorded as the stage's rows.
+#   -When profiling is off the only cost is one extra function call & an 'is None' check.
+#
+def profiled(name=None):
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _Stage(_profiler, stage_name, None) as stage:
+                result = func(*args, **kwargs)
+                if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+                    stage.rows = len(result)
+                return result
+        return wrapper
+    return decorator
+#####################################################
+
+
+#####################################################
+# peak_rss_mb() - peak resident memory of this process so far (MB), None where it isn't available (Windows)
+#
+def peak_rss_mb():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1e6 if sys.platform == 'darwin' else max_rss / 1e3  # bytes on macOS, kB on Linux
+#####################################################
 
 ###########################################################################
-# PLOTTING FUNCTIONS:
+# KERNEL BACKEND FUNCTIONS:
+
+_kernels = {}  # kernel name -> {'numpy': function, 'numba': function}
+_kernel_backend = None  # 'numpy' or 'numba', picked on first use from the EATLIB_KERNELS environment variable
+_compiled_kernels = {}  # kernel name -> numba compiled function
 
-# testing
 
 #####################################################
-# plot_time(load_df) - variable vs. time plotting function
+# set_kernel_backend(backend='auto') / get_kernel_backend() - choose how eatlib's sequential hot loops are run
 #
 #   Imports:
 #
-#   import pandas as pd
-#   import datetime
-#   import plotly.graph_objects as go (IF USING PLOTLY)
-#   from matplotlib import pyplot as plt (IF USING MATPLOTLIB)
+#   import numba (optional)
 #
 #
 #   Inputs:
 #
-#   load_df - a pandas DataFrame object with timestamps in the first column & some variable of interest in the second column.
+#   backend - 'numba' (compiled loops, needs numba installed), 'numpy' (pure NumPy) or 'auto' (numba if it's
+#             installed, otherwise numpy)
 #
 #
 #   Outputs:
 #
-#   No outputs. This function just draws a plot. We could change it so it returns a matplotlib object (figure or axes) and then use that to plot later.
+#   backend - the backend now in use, 'numba' or 'numpy'
 #
 #
-#   TODO:
+#   Notes:
 #
-#   -Make more flexible/robust
-#   -Show interpolated data in a different color
+#   -The kernels are the loops NumPy can't express without temporary arrays: part load binning (bin_loads()),
+#    run lengths (run_lengths()) & the storage recurrences (simulate_storage(), min_storage_size()). Both backends
+#    give the same results.
+#   -The default comes from the EATLIB_KERNELS environment variable ('auto' if it isn't set).
+#   -numba kernels are compiled the first time they're called & cached to disk (__pycache__, or NUMBA_CACHE_DIR), so
+#    later runs load them in milliseconds instead of recompiling.
 #
-# PLOTLY.GRAPH_OBJECTS VERSION - STABLE
-def plot_time(df):
-    # import pandas as pd
-    # import plotly.graph_objects as go
-    # import datetime
-    print('\nPLOT_TIME FUNCTION ACTIVATED') # let the user know this function has been called
+def set_kernel_backend(backend='auto'):
+    global _kernel_backend
+    if backend == 'auto':
+        backend = 'numpy' if numba is None else 'numba'
+    if backend not in ('numpy', 'numba'):
+        raise ValueError("backend must be 'auto', 'numba' or 'numpy', not {!r}.".format(backend))
+    if backend == 'numba' and numba is None:
+        raise ImportError("The 'numba' kernel backend needs numba installed (pip install numba).")
+    _kernel_backend = backend
+    return backend
 
-    # print some information about the data being plotted
-    print("\n HERE'S A PREVIEW OF THE DATA YOU'RE PLOTTING:")
-    print(df)
-    print()
-    print(df.dtypes)
 
-    # convert timestamps to datetime64 objects
-    print('\nconverting timestamp data...')
-    timestamps = pd.to_datetime(df.iloc[:, 0])
-    print('TIMESTAMP DATA CONVERTED FROM', type(df.iloc[0, 0]), 'TO', type(timestamps[0]))
-    df.iloc[:, 0] = timestamps
-    print(df.iloc[:, 0].head())
+def get_kernel_backend():
+    if _kernel_backend is None:
+        set_kernel_backend(os.environ.get('EATLIB_KERNELS', 'auto'))
+    return _kernel_backend
+#####################################################
 
-    # use graph_objects to create the figure
-    fig = go.Figure()
 
-    # create traces for each column vs. time
-    for i in range(df.shape[1] - 1):
-        fig.add_trace(go.Scatter(x=timestamps, y=df.iloc[:, i + 1],
-                                 visible='legendonly',
-                                 mode='lines',
-                                 name=df.columns[i + 1]))
-        #TODO add label for max value
-        # fig.add_annotation(x=2, y=5,
-        #                    text="Text annotation with arrow",
-        #                    showarrow=True,
-        #                    arrowhead=1)
+#####################################################
+# kernel(name, backend=None) - get the implementation of a kernel for the current (or given) backend
+#
+#   Inputs:
+#
+#   name - kernel name, e.g. 'bin_loads', 'run_lengths', 'simulate_storage', 'max_deficit'
+#   backend - None = get_kernel_backend()
+#
+#
+#   Outputs:
+#
+#   function - the kernel. Kernels only take numpy arrays & numbers, the eatlib functions that call them do the
+#              conversions & NaN handling.
+#
+#
+#   Notes:
+#
+#   -Register new kernels with @_register_kernel(name, backend). numba kernels are plain python loops that get
+#    compiled with numba.njit(cache=True) the first time they're asked for.
+#
+def kernel(name, backend=None):
+    backend = backend or get_kernel_backend()
+    if backend == 'numba':
+        if name not in _compiled_kernels:
+            _compiled_kernels[name] = numba.njit(cache=True)(_kernels[name]['numba'])
+        return _compiled_kernels[name]
+    return _kernels[name]['numpy']
 
-    fig.update_layout(showlegend=True)    # force the legend for single-trace plots
-    fig.update_layout(legend_title_text='Points:')
-    fig.update_layout(hovermode='x')
-    # fig.show()    # changed this to return a fig instead of plotting. can change back if we want.
-    return fig
+
+def _register_kernel(name, backend):
+    def decorator(func):
+        _kernels.setdefault(name, {})[backend] = func
+        return func
+    return decorator
+#####################################################
+
+
+#####################################################
+# kernels - each one has a numpy & a numba version that return the same thing
 #
-# # PLOTLY.EXPRESS VERSION - STABLE
-# def plot_time(load_df):
-#     # import pandas as pd
-#     # import plotly.express as px
-#     # import datetime
-#     print('\nPLOT_TIME FUNCTION ACTIVATED') # let the user know this function has been called
+
+# bin_loads(values, edges) -> (sums, counts): edges[i] < value <= edges[i + 1] lands in bin i, values outside the
+# edges are dropped. NaN sorts past the last edge, so it's dropped too.
+@_register_kernel('bin_loads', 'numpy')
+def _bin_loads_numpy(values, edges):
+    n_bins = len(edges) - 1
+    bin_index = np.searchsorted(edges, values, side='left') - 1
+    in_range = (bin_index >= 0) & (bin_index < n_bins)
+    sums = np.bincount(bin_index[in_range], weights=values[in_range], minlength=n_bins)
+    counts = np.bincount(bin_index[in_range], minlength=n_bins)
+    return sums, counts
+
+
+@_register_kernel('bin_loads', 'numba')
+def _bin_loads_numba(values, edges):
+    n_bins = len(edges) - 1
+    sums = np.zeros(n_bins)
+    counts = np.zeros(n_bins, dtype=np.int64)
+    for value in values:
+        i = np.searchsorted(edges, value) - 1
+        if 0 <= i < n_bins:
+            sums[i] += value
+            counts[i] += 1
+    return sums, counts
+
+
+# run_lengths(values) -> lengths: length of the run of equal values each element belongs to
+@_register_kernel('run_lengths', 'numpy')
+def _run_lengths_numpy(values):
+    n = len(values)
+    change = np.empty(n, dtype=bool)
+    change[0] = True
+    np.not_equal(values[1:], values[:-1], out=change[1:])  # True where a new run starts
+    starts = np.flatnonzero(change)
+    lengths = np.diff(np.append(starts, n))
+    return np.repeat(lengths, lengths)
+
+
+@_register_kernel('run_lengths', 'numba')
+def _run_lengths_numba(values):
+    n = len(values)
+    lengths = np.empty(n, dtype=np.int64)
+    start = 0
+    for i in range(1, n + 1):
+        if i == n or values[i] != values[i - 1]:
+            lengths[start:i] = i - start
+            start = i
+    return lengths
+
+
+# simulate_storage(loads_kbtu, plant_kbtu, tank_kbtu) -> (unmet_kbtu, unmet_steps): tank state of charge recurrence
+# for every plant/tank candidate, tanks start full
+@_register_kernel('simulate_storage', 'numpy')
+def _simulate_storage_numpy(loads_kbtu, plant_kbtu, tank_kbtu):
+    soc = tank_kbtu.copy()  # state of charge (kBtu), start with full tanks
+    shortfall = np.zeros(plant_kbtu.shape)
+    unmet_kbtu = np.zeros(plant_kbtu.shape)
+    unmet_steps = np.zeros(plant_kbtu.shape, dtype=np.int64)
+    for load in loads_kbtu:
+        soc += plant_kbtu - load  # charge with surplus, discharge with deficit
+        np.minimum(soc, 0, out=shortfall)  # negative state of charge = load the tank couldn't cover
+        unmet_kbtu -= shortfall
+        unmet_steps += shortfall < 0
+        np.clip(soc, 0, tank_kbtu, out=soc)
+    return unmet_kbtu, unmet_steps
+
+
+@_register_kernel('simulate_storage', 'numba')
+def _simulate_storage_numba(loads_kbtu, plant_kbtu, tank_kbtu):
+    unmet_kbtu = np.zeros(plant_kbtu.shape)
+    unmet_steps = np.zeros(plant_kbtu.shape, dtype=np.int64)
+    for j in range(len(plant_kbtu)):  # one candidate at a time, its state stays in registers
+        soc = tank_kbtu[j]
+        for load in loads_kbtu:
+            soc += plant_kbtu[j] - load
+            if soc < 0:
+                unmet_kbtu[j] -= soc
+                unmet_steps[j] += 1
+                soc = 0.0
+            elif soc > tank_kbtu[j]:
+                soc = tank_kbtu[j]
+    return unmet_kbtu, unmet_steps
+
+
+# max_deficit(loads_kbtu, plant_kbtu) -> max_deficit: largest running deficit for every plant capacity, the
+# deficit grows by (load - capacity) each timestep & resets to zero when the plant catches up
+@_register_kernel('max_deficit', 'numpy')
+def _max_deficit_numpy(loads_kbtu, plant_kbtu):
+    deficit = np.zeros(plant_kbtu.shape)
+    max_deficit = np.zeros(plant_kbtu.shape)
+    for load in loads_kbtu:
+        deficit += load - plant_kbtu
+        np.maximum(deficit, 0, out=deficit)
+        np.maximum(max_deficit, deficit, out=max_deficit)
+    return max_deficit
+
+
+@_register_kernel('max_deficit', 'numba')
+def _max_deficit_numba(loads_kbtu, plant_kbtu):
+    max_deficit = np.zeros(plant_kbtu.shape)
+    for j in range(len(plant_kbtu)):
+        deficit = 0.0
+        for load in loads_kbtu:
+            deficit = max(deficit + (load - plant_kbtu[j]), 0.0)
+            max_deficit[j] = max(max_deficit[j], deficit)
+    return max_deficit
+#####################################################
+
+###########################################################################
+# e.g. DATA CLEANING FUNCTIONS:
+
+#####################################################
+# run_lengths(values) - length of the run of equal values each element belongs to
 #
-#     pd.options.plotting.backend = "plotly"  # activate Plotly backend
-#     print('plotly backend activated...')
+#   Imports:
 #
-#     print("\n HERE'S A PREVIEW OF THE DATA YOU'RE PLOTTING:")
-#     print(load_df)   # print some information about the data being plotted
-#     print()
-#     print(load_df.dtypes)
+#   import numpy as np
 #
-#     print('\nconverting timestamp data...')  # convert timestamps to datetime64 objects
-#     timestamp = pd.to_datetime(load_df.iloc[:, 0])
-#     print('TIMESTAMP DATA CONVERTED FROM', type(load_df.iloc[0, 0]), 'TO', type(timestamp[0]))
-#     load_df.iloc[:, 0] = timestamp
-#     print(load_df.iloc[:, 0].head())
 #
-#     y_values = load_df.iloc[:,1] # values in the 2nd column will be plotted on the y-axis
-#     x_values = load_df.iloc[:,0] # timestamps on the x-axis
+#   Inputs:
 #
-#     y_label = load_df.columns[1] # name of 2nd column is y-axis label
-#     x_label = load_df.columns[0] # name of 1st column is x-axis label
-#     xy_labels = {'x': x_label, 'y': y_label}    # create a dictionary of the labels to pass to px.line
+#   values - 1-D array-like
 #
-#     fig = px.line(x=x_values, y=y_values, labels=xy_labels, title=y_label + ' vs. ' + x_label)  # plot using plotly
-#     fig.show()
-#     return
 #
-# MATPLOTLIB VERSION - STABLE
-# def plot_time(load_df):
-#     # import pandas as pd
-#     # from matplotlib import pyplot as plt
+#   Outputs:
 #
-#     y_values = load_df.iloc[:,1]  # Values in the 2nd column will be plotted on the y-axis
-#     x_values = range(len(y_values))  # x-axis is just a range of the same length as y_values
+#   lengths - int array the same length as values, e.g. [5, 5, 7, 7, 7] -> [2, 2, 3, 3, 3]
 #
-#     x_ticks = [x*796.364 for x in range(12)]    # create x ticks corresponding to months
-#     months = ['J','F','M','A','M','J','J','A','S','O','N','D']  # list of months
 #
-#     y_label = load_df.columns[1]  # Name of 2nd column is y-axis label
-#     x_label = load_df.columns[0]  # Name of 1st column is x-axis label
+#   Notes:
 #
-#     fig, ax = plt.subplots()  # Create a figure containing a single axes.
-#     ax.set_title(y_label + ' vs. ' + x_label)  # set the title
-#     ax.set_xlabel(x_label)  # label the x-axis
-#     ax.set_ylabel(y_label)  # label the y-axis
-#     ax.set_xticks(x_ticks)  # set and label x-ticks
-#     ax.set_xticklabels(months)
-#     ax.plot(x_values, y_values, lw=0.1)  # plot using matplotlib
-#     plt.show()  # show the plot
-#     return
+#   -NaN never equals NaN, so every missing value is its own run of length 1.
+#
+def run_lengths(values):
+    values = np.asarray(values)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if values.dtype.kind not in 'biuf':
+        return kernel('run_lengths', 'numpy')(values)  # strings/objects, numba only compiles numbers
+    return kernel('run_lengths')(values)
 #####################################################
 
 
 #####################################################
-# plot_x(load_df) - variable vs. variable plotting function
+# scan_data_quality(series, ...) - flag common trend data problems in a load or weather series
 #
 #   Imports:
 #
+#   import numpy as np
 #   import pandas as pd
-#   import plotly.express as px (IF USING PLOTLY)
-#   from matplotlib import pyplot as plt (IF USING MATPLOTLIB)
 #
 #
 #   Inputs:
 #
-#   load_df - 'nx2' pandas DataFrame object with x-values in the first column & y-values in the second column.
+#   series - a pandas Series (or 1-D array) of numeric data, e.g. load_df['Heating Load (MBH)']
+#   timestamps - optional array-like of timestamps for the duplicate timestamp check (strings are fine)
+#   min_value, max_value - optional valid range, e.g. min_value=0 for loads. None = no limit.
+#   flatline_steps - runs of the same non-zero value at least this many points long are flagged as flatlined
+#   zero_steps - runs of exactly zero at least this many points long are flagged as stuck at zero. None = off.
+#   spike_window - number of points in the centered window used for the spike check
+#   spike_threshold - a point more than this many standard deviations from the rest of its window is a spike
 #
 #
 #   Outputs:
 #
-#   No outputs. This function just draws a plot. We could change it so it returns a matplotlib object (figure or axes) and then use that to plot later.
+#   dq_summary - a DataFrame with the number & percent of points flagged for each issue
+#   dq_mask - a boolean DataFrame (one row per point) with a column per issue & an 'Any Issue' column
 #
-# PLOTLY VERSION - STABLE
-def plot_x(df):
-    # import pandas as pd
-    # import plotly.express as px
-    print("\n HERE'S A PREVIEW OF THE DATA YOU'RE PLOTTING:")  # show a preview of the data passed to the function
-    print(df)   # print some information about the data being plotted
-    print()
-    print(df.dtypes)
+#
+#   Notes:
+#
+#   -All checks are vectorized and run in O(n): run lengths come from run_lengths(), and the spike check uses
+#    rolling moments with the point itself left out of its own window so a spike can't hide itself.
+#   -Windows whose other points are constant (to round off) aren't spike checked - there's no spread to compare
+#    against. Long constant runs are caught by the flatline check instead.
+#   -Step counts depend on the trend interval. The defaults are 2 hrs flat / 2 days at zero for 10 minute data.
+#   -Use ~dq_mask['Any Issue'] to drop bad points before binning, or dq_mask to highlight them in a plot.
+#
+@profiled()
+def scan_data_quality(series, timestamps=None, min_value=None, max_value=None, flatline_steps=12, zero_steps=288,
+                      spike_window=13, spike_threshold=6.0):
+    values = np.asarray(series, dtype=float)
+    index = series.index if isinstance(series, pd.Series) else pd.RangeIndex(len(values))
+    missing = np.isnan(values)
+    lengths = run_lengths(values)
 
-    x_values = df.iloc[:, 0]  # Values in the 1st column will be plotted on the x-axis
-    y_values = df.iloc[:, 1]  # Values in the 2nd column will be plotted on the y-axis
+    dq_mask = pd.DataFrame(index=index)
+    dq_mask['Missing'] = missing
 
-    x_label = df.columns[0]  # Name of 1st column is x-axis label
-    y_label = df.columns[1]  # Name of 2nd column is y-axis label
-    xy_labels = {'x': x_label, 'y': y_label}    # create a dictionary of the labels to pass to px.line
+    # out of range values
+    out_of_range = np.zeros(len(values), dtype=bool)
+    if min_value is not None:
+        out_of_range |= values < min_value
+    if max_value is not None:
+        out_of_range |= values > max_value
+    dq_mask['Out of Range'] = out_of_range
 
-    if (type(x_values[1]) == str) or (type(y_values[1]) == str):    # do a quick check that the data is plottable (i.e. not a string - this could be more robust)
-        print("\nERROR: Please make sure you are plotting numerical data.\n")
-        return
+    # flatlined sensors & stuck-at-zero runs
+    dq_mask['Flatlined'] = (lengths >= flatline_steps) & (values != 0) & ~missing
+    if zero_steps is not None:
+        dq_mask['Stuck at Zero'] = (lengths >= zero_steps) & (values == 0)
+    else:
+        dq_mask['Stuck at Zero'] = False
 
-    fig = px.scatter(x=x_values, y=y_values, labels=xy_labels, title=y_label + ' vs. ' + x_label, trendline="ols")  # plot using plotly
-    fig.show()
-    return
+    # spikes - compare each point to the mean/std of the other points in its window. the window mean & variance come
+    # from pandas' online (Welford) rolling moments & the point is taken back out with the same update, sums of
+    # squares would lose everything to round off on flat or offset data
+    window = pd.Series(values).rolling(spike_window, center=True, min_periods=3)
+    n_window = window.count().to_numpy()
+    n_others = n_window - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_window = window.mean().to_numpy()
+        mean_others = mean_window + (mean_window - values) / n_others
+        m2_others = window.var(ddof=0).to_numpy() * n_window - (values - mean_window) * (values - mean_others)
+        std_others = np.sqrt(np.clip(m2_others / n_others, 0, None))
+        deviation = np.abs(values - mean_others)
+        tolerance = 1e-9 * np.maximum(np.abs(mean_others), 1)  # round off, relative to the size of the readings
+        dq_mask['Spike'] = ((n_others >= 2) & (std_others > tolerance) & (deviation > tolerance)
+                            & (deviation > spike_threshold * std_others))
+
+    # duplicated timestamps (every repeat after the first one)
+    if timestamps is not None:
+        dq_mask['Duplicate Timestamp'] = pd.Series(np.asarray(timestamps)).duplicated(keep='first').to_numpy()
+    else:
+        dq_mask['Duplicate Timestamp'] = False
+
+    dq_mask['Any Issue'] = dq_mask.any(axis=1)
+
+    counts = dq_mask.sum()
+    dq_summary = pd.DataFrame({
+        'Points': counts,
+        'Percent': 100 * counts / max(len(values), 1)
+    })
+    dq_summary.index.name = 'Issue'
+    return dq_summary, dq_mask
+#####################################################
+
+
+#####################################################
+# detect_timestamp_format(values, cache_key=None) - find an explicit strptime format for timestamp strings
 #
-# MATPLOTLIB VERSION - STABLE
-# def plot_x(load_df):
-#     # import pandas as pd
-#     # from matplotlib import pyplot as plt
+#   Inputs:
 #
-#     print("\n HERE'S A PREVIEW OF THE DATA YOU'RE PLOTTING:")  # show a preview of the data passed to the function
-#     print(load_df)   # print some information about the data being plotted
-#     print()
-#     print(load_df.dtypes)
+#   values - array-like of timestamp strings (only the first 20 non-empty values are checked)
+#   cache_key - anything that identifies the source, e.g. (file_name_in, sheet_name). A format found for a key is
+#               reused for that key until it stops working.
 #
-#     x_values = load_df.iloc[:, 0]  # Values in the 1st column will be plotted on the x-axis
-#     y_values = load_df.iloc[:, 1]  # Values in the 2nd column will be plotted on the y-axis
 #
-#     x_label = load_df.columns[0]  # Name of 1st column is x-axis label
-#     y_label = load_df.columns[1]  # Name of 2nd column is y-axis labelxy_labels = {'x': x_label, 'y': y_label}    # create a dictionary of the labels to pass to px.line
+#   Outputs:
 #
-#     # make the plot
-#     fig, ax = plt.subplots()  # Create a figure containing a single axes.
-#     ax.set_title(str(y_label) + ' vs. ' + str(x_label))  # set the title
-#     ax.set_xlabel(x_label)  # label the x-axis
-#     ax.set_ylabel(y_label)  # label the y-axis
-#     ax.plot(x_values, y_values, lw=0.1)  # Plot the data
-#     plt.show()  # show the plot
-#     return
-##############################################################################
+#   timestamp_format - a format string for pd.to_datetime(format=...), or None if none of TIMESTAMP_FORMATS fit
+#
+#
+#   Notes:
+#
+#   -Trailing time zone abbreviations ('PST', 'PDT', etc. in BAS exports) aren't part of the format, they're
+#    stripped by parse_timestamps() first. Only the ones in TIMEZONE_ABBREVIATIONS are stripped, so AM/PM is kept.
+#
+TIMESTAMP_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y %I:%M:%S %p',
+    '%m/%d/%Y %I:%M %p',
+    '%m/%d/%y %H:%M',
+    '%m/%d/%y %I:%M %p',
+    '%d-%b-%y %I:%M:%S %p',
+    '%d-%b-%y %H:%M:%S',
+    '%d-%b-%Y %H:%M',
+    '%Y/%m/%d %H:%M:%S'
+]
+TIMEZONE_ABBREVIATIONS = ['UTC', 'GMT', 'EST', 'EDT', 'CST', 'CDT', 'MST', 'MDT', 'PST', 'PDT', 'AKST', 'AKDT', 'HST',
+                          'HDT']  # stripped from the end of timestamps by parse_timestamps()
+_timestamp_formats = {}  # cache_key -> format found by detect_timestamp_format()
 
 
+def detect_timestamp_format(values, cache_key=None):
+    if cache_key is not None and cache_key in _timestamp_formats:
+        return _timestamp_formats[cache_key]
+
+    sample = pd.Series(values).dropna().astype(str).iloc[:20]
+    timestamp_format = None
+    for candidate in TIMESTAMP_FORMATS:
+        try:
+            pd.to_datetime(sample, format=candidate)
+        except (ValueError, TypeError):
+            continue
+        timestamp_format = candidate
+        break
+
+    if cache_key is not None and timestamp_format is not None:
+        _timestamp_formats[cache_key] = timestamp_format
+    return timestamp_format
+#####################################################
 
-####################################################################################################################
-# CLASSES:
 
-# class
\ No newline at end of file
+#####################################################
+# parse_timestamps(values, timestamp_format=None, cache_key=None) - fast timestamp parsing
+#
+#   Imports:
+#
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   values - array-like of timestamps (strings, datetimes or datetime64)
+#   timestamp_format - explicit format. None = detect it with detect_timestamp_format().
+#   cache_key - passed to detect_timestamp_format() so each source only has its format detected once
+#
+#
+#   Outputs:
+#
+#   timestamps - a datetime64 Series (a new object, values isn't modified)
+#
+#
+#   Notes:
+#
+#   -datetime64 data is returned without parsing.
+#   -With an explicit format pandas skips per-value format inference, which is most of the cost of
+#    pd.to_datetime() on long trend exports.
+#   -If a cached format stops matching the data, the format is detected again. If nothing matches, falls back
+#    to pd.to_datetime() inference.
+#
+def parse_timestamps(values, timestamp_format=None, cache_key=None):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values.copy()
+    if not (pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype)):
+        return pd.to_datetime(values)
+    if not isinstance(values.dropna().iloc[0] if values.notna().any() else '', str):
+        return pd.to_datetime(values)  # datetime.datetime objects from openpyxl
+
+    # strip trailing time zone abbreviations, e.g. '16-Jan-18 10:50:00 AM PST' - never AM/PM
+    values = values.str.replace(r'\s+(?:' + '|'.join(TIMEZONE_ABBREVIATIONS) + r')$', '', regex=True)
+
+    explicit = timestamp_format is not None
+    if not explicit:
+        timestamp_format = detect_timestamp_format(values, cache_key)
+    if timestamp_format is not None:
+        try:
+            return pd.to_datetime(values, format=timestamp_format)
+        except ValueError:
+            if explicit:
+                raise
+            _timestamp_formats.pop(cache_key, None)  # cached format doesn't fit this data anymore
+            timestamp_format = detect_timestamp_format(values, cache_key)
+            if timestamp_format is not None:
+                return pd.to_datetime(values, format=timestamp_format)
+    return pd.to_datetime(values)
+#####################################################
+
+
+#####################################################
+# carpet_matrix(series, timestamps=None, freq='10min', slot=None, how='mean') - day x time of day matrix
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   series - a pandas Series (or array) of values, e.g. load_df['Heating Load (MBH)'] or epw_df['Dry Bulb Temperature']
+#   timestamps - array-like of timestamps. None = use the series' DatetimeIndex (like read_epw() frames).
+#   freq - the regular interval the data is snapped to, e.g. '1h' for weather, '10min' or '15min' for trends.
+#          Must divide evenly into one day.
+#   slot - optional coarser interval for the columns, a multiple of freq, e.g. '1h' to show 10 minute data by hour
+#   how - 'mean', 'max' or 'sum' - how values that land in the same cell are combined
+#
+#
+#   Outputs:
+#
+#   carpet_df - a DataFrame with one row per day & one column per time of day ('00:00', '00:10', ...). Missing
+#               intervals are NaN.
+#
+#
+#   Notes:
+#
+#   -Each value is dropped straight into its cell of a flat days x slots array with np.bincount (or np.fmax.at for
+#    'max'), which is then reshaped, so there's no pivot or groupby. Coarser slots are reductions over a
+#    (days, slots, k) reshape of the same memory.
+#   -With how='mean' a coarser slot is the mean of the freq interval means, so intervals with missing data don't
+#    get extra weight.
+#   -Values with no timestamp (NaT) are dropped.
+#   -Timezone-aware timestamps are binned on their local wall clock time, not UTC.
+#
+def carpet_matrix(series, timestamps=None, freq='10min', slot=None, how='mean'):
+    if how not in ('mean', 'max', 'sum'):
+        raise ValueError("how must be 'mean', 'max' or 'sum', not {!r}.".format(how))
+    values = np.asarray(series, dtype=float)
+    if timestamps is None:
+        timestamps = series.index
+    timestamps = pd.DatetimeIndex(parse_timestamps(timestamps))
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_localize(None)  # local wall clock time
+    timestamps = timestamps.to_numpy(dtype='datetime64[ns]')
+    timestamped = ~np.isnat(timestamps)
+    if not timestamped.any():
+        raise ValueError('No timestamped values.')
+    values = values[timestamped]
+    timestamps = timestamps[timestamped]
+
+    step = pd.Timedelta(freq).value
+    day = pd.Timedelta('1D').value
+    if day % step:
+        raise ValueError('freq must divide evenly into one day.')
+    slots_per_day = day // step
+
+    # position of every value in a flat (days x slots) array
+    first_day = timestamps.min().astype('datetime64[D]')
+    position = (timestamps - first_day).astype(np.int64) // step
+    n_days = position.max() // slots_per_day + 1
+    n_cells = n_days * slots_per_day
+
+    valid = ~np.isnan(values)
+    counts = np.bincount(position[valid], minlength=n_cells)
+    if how == 'max':
+        flat = np.full(n_cells, np.nan)
+        np.fmax.at(flat, position[valid], values[valid])
+    else:
+        flat = np.bincount(position[valid], weights=values[valid], minlength=n_cells)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            flat = flat / counts if how == 'mean' else np.where(counts > 0, flat, np.nan)
+    grid = flat.reshape(n_days, slots_per_day)  # a view, no copy
+
+    # combine into coarser slots
+    if slot is not None and pd.Timedelta(slot).value != step:
+        k = pd.Timedelta(slot).value // step
+        if (pd.Timedelta(slot).value % step) or (slots_per_day % k):
+            raise ValueError('slot must be a multiple of freq that divides evenly into one day.')
+        blocks = grid.reshape(n_days, slots_per_day // k, k)
+        has_data = (~np.isnan(blocks)).any(axis=2)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)  # all-NaN blocks
+            if how == 'mean':
+                grid = np.nanmean(blocks, axis=2)
+            elif how == 'max':
+                grid = np.nanmax(blocks, axis=2)
+            else:
+                grid = np.where(has_data, np.nansum(blocks, axis=2), np.nan)
+        step = step * k
+
+    days = pd.date_range(pd.Timestamp(first_day), periods=n_days, freq='D')
+    slot_labels = [(pd.Timestamp(0) + pd.Timedelta(step * i, unit='ns')).strftime('%H:%M') for i in range(grid.shape[1])]
+    return pd.DataFrame(grid, index=days, columns=slot_labels, copy=False)
+#####################################################
+
+
+#####################################################
+# plan_dtypes(df, float_atol=1e-3, float_rtol=1e-6, category_ratio=0.5) - pick a compact dtype for every column of a frame
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   df - a DataFrame, e.g. from read_epw(), pd.read_excel() in load_profile.py or a TMY .csv
+#   float_atol, float_rtol - largest error allowed when a float column is stored as float32, as in np.allclose().
+#                            The defaults are well under the resolution of any weather or trend data we use.
+#   category_ratio - string columns with at most this many unique values per row can be stored as categoricals
+#
+#
+#   Outputs:
+#
+#   plan - dict of column name: dtype, only for columns that would change. Pass it to compact_dtypes().
+#
+#
+#   Notes:
+#
+#   -Floats that are all whole numbers (no NaN) become the smallest int that fits, otherwise float32 if the round
+#    trip error is within float_atol + float_rtol * |value|. Whole numbers with NaN (e.g. present weather codes)
+#    only become float32 if they round trip exactly.
+#   -Int columns get the smallest int that fits, e.g. Month -> int8. Numeric columns stay numeric (never
+#    categoricals), so .mean() & arithmetic still work after compact_dtypes().
+#   -String columns become categoricals if that takes fewer bytes.
+#   -Integer time columns (Year, Month, Hour, Hours since 00:00 Jan 1, ...) are downcast like any other int.
+#    datetime64 columns are left alone.
+#   -ladybug columns from read_epw() are planned like floats.
+#
+def plan_dtypes(df, float_atol=1e-3, float_rtol=1e-6, category_ratio=0.5):
+    plan = {}
+    n = len(df)
+    for column in df.columns:
+        col = df[column]
+        dtype = col.dtype
+        if n == 0 or isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype) \
+                or pd.api.types.is_datetime64_any_dtype(dtype) or pd.api.types.is_timedelta64_dtype(dtype):
+            continue
+
+        # numeric columns
+        candidate = None
+        if pd.api.types.is_integer_dtype(dtype):
+            candidate = _smallest_int(col.min(), col.max())
+        elif pd.api.types.is_float_dtype(dtype):
+            values = np.asarray(col, dtype=np.float64)
+            finite = np.isfinite(values)
+            whole = np.array_equal(values[finite], np.round(values[finite]))
+            if finite.all() and whole and np.abs(values).max() < 2 ** 63:
+                candidate = _smallest_int(values.min(), values.max())
+            else:
+                with np.errstate(over='ignore'):
+                    rounded = values.astype(np.float32).astype(np.float64)
+                if whole:  # codes/counts with gaps, keep them exact
+                    fits = np.array_equal(rounded[finite], values[finite])
+                else:
+                    fits = np.allclose(rounded[finite], values[finite], rtol=float_rtol, atol=float_atol)
+                candidate = 'float32' if fits else 'float64'
+        elif not (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)):
+            continue
+        if candidate is not None:
+            if candidate != dtype.name:
+                plan[column] = candidate
+            continue
+
+        # repeated strings - use a categorical if it's smaller than 8 byte pointers
+        n_unique = col.nunique(dropna=True)
+        if n_unique <= category_ratio * n:
+            code_bytes = np.dtype(_smallest_int(-1, n_unique)).itemsize
+            if n * code_bytes + n_unique * 8 < n * 8:
+                plan[column] = 'category'
+    return plan
+
+
+def _smallest_int(low, high):
+    for int_type in (np.int8, np.int16, np.int32, np.int64):
+        info = np.iinfo(int_type)
+        if info.min <= low and high <= info.max:
+            return np.dtype(int_type).name
+    return 'int64'
+#####################################################
+
+
+#####################################################
+# compact_dtypes(df, plan=None, **kwargs) - downcast a frame to the dtypes from plan_dtypes()
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   df - a DataFrame
+#   plan - dict of column name: dtype from plan_dtypes(). None = plan_dtypes(df, **kwargs)
+#   **kwargs - passed to plan_dtypes(), e.g. float_atol=0.01
+#
+#
+#   Outputs:
+#
+#   compact_df - a new DataFrame with the same index & columns, df is not changed
+#
+#
+#   Notes:
+#
+#   -ladybug columns (read_epw()) become plain numpy columns, the ladybug type & unit of each converted column is kept
+#    in compact_df.attrs['units'], e.g. {'Dry Bulb Temperature': 'Dry Bulb Temperature (F)'}.
+#   -Use the same plan for every building/year so frames still concat without upcasting.
+#
+@profiled()
+def compact_dtypes(df, plan=None, **kwargs):
+    if plan is None:
+        plan = plan_dtypes(df, **kwargs)
+
+    columns = {}
+    units = dict(df.attrs.get('units', {}))
+    for column in df.columns:
+        col = df[column]
+        if column not in plan:
+            columns[column] = col
+            continue
+        if isinstance(col.dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_float_dtype(col.dtype):
+            units[column] = str(col.dtype)  # ladybug data type & unit
+            col = pd.Series(np.asarray(col, dtype=np.float64), index=df.index, name=column)
+        columns[column] = col.astype(plan[column])
+
+    compact_df = pd.DataFrame(columns, index=df.index, copy=False)
+    compact_df.attrs = dict(df.attrs)
+    if units:
+        compact_df.attrs['units'] = units
+    return compact_df
+#####################################################
+
+
+#####################################################
+# memory_report(df, compact_df=None) - bytes per column before & after compact_dtypes()
+#
+#   Imports:
+#
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   df - the original DataFrame
+#   compact_df - the compacted DataFrame. None = compact_dtypes(df)
+#
+#
+#   Outputs:
+#
+#   report - DataFrame with one row per column plus 'Index' & 'Total' rows & columns 'Dtype Before', 'Bytes Before',
+#            'Dtype After', 'Bytes After', 'Saved (%)'
+#
+#
+#   Notes:
+#
+#   -Bytes are from memory_usage(deep=True), so strings are counted at their real size.
+#
+def memory_report(df, compact_df=None):
+    if compact_df is None:
+        compact_df = compact_dtypes(df)
+
+    before = df.memory_usage(deep=True)
+    after = compact_df.memory_usage(deep=True).reindex(before.index)
+    report = pd.DataFrame({
+        'Dtype Before': [str(df.index.dtype)] + [str(dtype) for dtype in df.dtypes],
+        'Bytes Before': before.to_numpy(),
+        'Dtype After': [str(compact_df.index.dtype)] + [str(compact_df[column].dtype) for column in df.columns],
+        'Bytes After': after.to_numpy(),
+    }, index=before.index)
+    report.loc['Total'] = ['', before.sum(), '', after.sum()]
+    report['Saved (%)'] = (100 * (1 - report['Bytes After'] / report['Bytes Before'])).round(1)
+    return report
+#####################################################
+
+###########################################################################
+# e.g. ENERGY FUNCTIONS:
+
+#####################################################
+# simulate_storage(loads, td_in_hrs, plant_mbh, tank_kbtu) - thermal storage state-of-charge simulation
+#
+#   Imports:
+#
+#   import numpy as np
+#
+#
+#   Inputs:
+#
+#   loads - array-like of building loads (MBH) at a fixed interval, e.g. load_df['Heating Load (MBH)']
+#   td_in_hrs - length of one timestep in hours (same as td_in_hrs in load_profile.py)
+#   plant_mbh - array of plant capacities (MBH), one per candidate
+#   tank_kbtu - array of usable tank capacities (kBtu), same shape as plant_mbh (or a scalar)
+#
+#
+#   Outputs:
+#
+#   unmet_kbtu - array of total load the plant + tank could not meet (kBtu) for each candidate
+#   unmet_hrs - array of hours with unmet load for each candidate
+#
+#
+#   Notes:
+#
+#   -The recurrence runs in the 'simulate_storage' kernel. On the numpy backend every candidate is updated at once on
+#    each timestep, so the Python loop runs over time only, never over candidates. On the numba backend each
+#    candidate is a compiled loop over time.
+#   -Tanks start fully charged. Whenever the plant has spare capacity it recharges the tank, and whenever the load
+#    exceeds the plant it discharges the tank. Standby losses are ignored.
+#   -Negative and missing loads are treated as zero load.
+#
+def simulate_storage(loads, td_in_hrs, plant_mbh, tank_kbtu):
+    loads_kbtu = np.nan_to_num(np.asarray(loads, dtype=float)).clip(min=0) * td_in_hrs  # energy per timestep
+    plant_mbh = np.asarray(plant_mbh, dtype=float)
+    plant_kbtu = plant_mbh * td_in_hrs  # energy the plant can deliver per timestep
+    tank_kbtu = np.broadcast_to(np.asarray(tank_kbtu, dtype=float), plant_mbh.shape)
+
+    # state of charge recurrence, see the simulate_storage kernels
+    shape = plant_mbh.shape
+    unmet_kbtu, unmet_steps = kernel('simulate_storage')(loads_kbtu, plant_kbtu.ravel(),
+                                                         np.ascontiguousarray(tank_kbtu).ravel())
+    return unmet_kbtu.reshape(shape), unmet_steps.reshape(shape) * td_in_hrs
+#####################################################
+
+
+#####################################################
+# min_storage_size(loads, td_in_hrs, plant_mbh) - minimum tank size curve
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   loads - array-like of building loads (MBH) at a fixed interval
+#   td_in_hrs - length of one timestep in hours
+#   plant_mbh - array of plant capacities (MBH)
+#
+#
+#   Outputs:
+#
+#   min_tank_df - a DataFrame with the smallest tank (kBtu) that meets every load for each plant capacity
+#
+#
+#   Notes:
+#
+#   -The smallest tank that never runs dry equals the largest running deficit the plant accumulates, where the
+#    deficit grows by (load - capacity) each timestep and is reset to zero whenever the plant catches up.
+#    This gives the exact curve without sweeping tank sizes.
+#   -'Sustainable' is False when the plant can't deliver the total energy over the period. The tank size shown
+#    then only covers the data period and doesn't repeat year over year.
+#
+def min_storage_size(loads, td_in_hrs, plant_mbh):
+    loads_kbtu = np.nan_to_num(np.asarray(loads, dtype=float)).clip(min=0) * td_in_hrs
+    plant_mbh = np.asarray(plant_mbh, dtype=float).ravel()
+    plant_kbtu = plant_mbh * td_in_hrs
+
+    max_deficit = kernel('max_deficit')(loads_kbtu, plant_kbtu)
+
+    min_tank_df = pd.DataFrame({
+        'Plant Capacity (MBH)': plant_mbh,
+        'Min. Tank Size (kBtu)': max_deficit,
+        'Sustainable': plant_kbtu * len(loads_kbtu) >= loads_kbtu.sum()
+    })
+    return min_tank_df
+#####################################################
+
+
+#####################################################
+# size_storage(loads, td_in_hrs, plant_mbh, tank_kbtu, processes=None) - plant capacity x tank size sweep
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#   from concurrent.futures import ProcessPoolExecutor
+#
+#
+#   Inputs:
+#
+#   loads - array-like of building loads (MBH) at a fixed interval
+#   td_in_hrs - length of one timestep in hours
+#   plant_mbh - 1-D array of plant capacities to try (MBH), e.g. np.linspace(0.2, 1, 17) * mbh_design
+#   tank_kbtu - 1-D array of tank sizes to try (kBtu)
+#   processes - number of worker processes. None or 1 runs everything in this process.
+#
+#
+#   Outputs:
+#
+#   storage_df - a DataFrame with one row per (plant capacity, tank size) pair with the unmet load & unmet hours
+#   min_tank_df - the minimum tank size curve from min_storage_size()
+#
+#
+#   Notes:
+#
+#   -With processes > 1 the grid is split into chunks and each worker runs simulate_storage() on one chunk. This
+#    keeps the timestep loop intact, which is what makes multi-year data slow.
+#   -Call this from inside an if __name__ == '__main__': block when using processes on Windows/macOS.
+#
+def size_storage(loads, td_in_hrs, plant_mbh, tank_kbtu, processes=None):
+    loads = np.nan_to_num(np.asarray(loads, dtype=float))
+    plant_grid, tank_grid = np.meshgrid(np.asarray(plant_mbh, dtype=float), np.asarray(tank_kbtu, dtype=float),
+                                        indexing='ij')
+    plant_grid = plant_grid.ravel()
+    tank_grid = tank_grid.ravel()
+
+    if processes is None or processes <= 1:
+        unmet_kbtu, unmet_hrs = simulate_storage(loads, td_in_hrs, plant_grid, tank_grid)
+    else:
+        plant_chunks = np.array_split(plant_grid, processes)
+        tank_chunks = np.array_split(tank_grid, processes)
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(simulate_storage, [loads] * processes, [td_in_hrs] * processes,
+                                        plant_chunks, tank_chunks))
+        unmet_kbtu = np.concatenate([r[0] for r in results])
+        unmet_hrs = np.concatenate([r[1] for r in results])
+
+    total_load = loads.clip(min=0).sum() * td_in_hrs
+    storage_df = pd.DataFrame({
+        'Plant Capacity (MBH)': plant_grid,
+        'Tank Size (kBtu)': tank_grid,
+        'Unmet Load (kBtu)': unmet_kbtu,
+        'Unmet Load (%)': 100 * unmet_kbtu / total_load if total_load > 0 else 0.0,
+        'Unmet Hours': unmet_hrs
+    })
+    min_tank_df = min_storage_size(loads, td_in_hrs, plant_mbh)
+    return storage_df, min_tank_df
+#####################################################
+
+
+#####################################################
+# humidity_ratio(dew_point, pressure) / moist_air_enthalpy(dry_bulb, w) - psychrometrics in IP units
+#
+#   Imports:
+#
+#   import numpy as np
+#
+#
+#   Inputs:
+#
+#   dew_point - dew point (F), e.g. epw_df['Dew Point Temperature']
+#   pressure - station pressure (inHg), e.g. epw_df['Atmospheric Station Pressure']
+#   dry_bulb - dry bulb (F)
+#   w - humidity ratio (lb water/lb dry air)
+#
+#
+#   Outputs:
+#
+#   w - humidity ratio (lb/lb)
+#   h - enthalpy of moist air (Btu/lb dry air)
+#
+#
+#   Notes:
+#
+#   -Saturation pressure at the dew point from the Magnus formula (Alduchov & Eskridge, within 0.4% from -40 to 120 F).
+#   -h = 0.240 T + W (1061 + 0.444 T), ASHRAE Fundamentals ch. 1
+#   -Both take numbers or numpy arrays of any (broadcastable) shape.
+#
+def humidity_ratio(dew_point, pressure):
+    dew_point_c = (np.asarray(dew_point, dtype=float) - 32) / 1.8
+    vapor_pressure = 6.1094 * np.exp(17.625 * dew_point_c / (dew_point_c + 243.04)) / 33.8639  # hPa -> inHg
+    return 0.621945 * vapor_pressure / (np.asarray(pressure, dtype=float) - vapor_pressure)
+
+
+def moist_air_enthalpy(dry_bulb, w):
+    dry_bulb = np.asarray(dry_bulb, dtype=float)
+    return 0.240 * dry_bulb + np.asarray(w, dtype=float) * (1061 + 0.444 * dry_bulb)
+#####################################################
+
+
+#####################################################
+# estimate_loads(buildings_df, epw_df, ...) - hourly heating & cooling loads for many buildings from a weather file
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   buildings_df - DataFrame with one row per building, indexed by building name. Columns use the same labels as the
+#                  static inputs/metadata block (K:L) load_profile.py reads:
+#                  'Building GSF' - required
+#                  'Design MBH' - optional, used to calibrate UA when 'UA (Btu/h-F)' isn't given
+#                  'UA (Btu/h-F)', 'Ventilation (CFM)', 'Internal Gains (W/sf)', 'Solar Aperture (sf)',
+#                  'Heating Setpoint (F)', 'Cooling Setpoint (F)' - optional, the defaults below are used for missing
+#                  columns/blank values
+#   epw_df - a dataframe from read_epw()
+#   heating_setpoint, cooling_setpoint - default setpoints (F)
+#   ua_per_sf - default envelope UA per sf of floor (Btu/h-F-sf), used when there's no UA or design MBH
+#   cfm_per_sf - default outdoor air (CFM/sf) during occupied hours
+#   internal_w_per_sf - default lights, plugs & people (W/sf) during occupied hours
+#   solar_aperture_per_sf - default effective solar aperture (glazing area x SHGC, sf) per sf of floor, multiplies
+#                           global horizontal radiation
+#   indoor_w - humidity ratio held indoors when cooling (0.0093 = 75 F/50% RH)
+#   occupied_hours - (start, end) hour of the occupied period on weekdays
+#   unoccupied_fraction - fraction of internal gains left on when unoccupied, outdoor air is off
+#   chunk_buildings - buildings computed at a time, limits the size of the temporary arrays
+#
+#
+#   Outputs:
+#
+#   heating_df - DataFrame of heating loads (MBH), one row per hour (epw_df's index, named 'Timestamp') & one column
+#                per building
+#   cooling_df - same for cooling loads (MBH)
+#
+#
+#   Notes:
+#
+#   -Every term is a (buildings x hours) matrix made by broadcasting per-building coefficients against the hourly
+#    weather & schedules, there's no loop over buildings or hours:
+#      heating = max(UA (Th - To) + 4.5 CFM occ (h(Th, Wo) - h(To, Wo)) - gains, 0)
+#      cooling = max(UA (To - Tc) + 4.5 CFM occ (h(To, Wo) - h(Tc, Wi)) + gains, 0), Wi = min(Wo, indoor_w)
+#      gains = internal W/sf x 3.412 x GSF x schedule + solar aperture x global horizontal radiation
+#   -With 'Design MBH' & no UA, UA is set so the heating load at the 99.6% heating dry bulb (the 0.4th percentile of
+#    the file) with full outdoor air & no gains equals the design MBH. Design MBH usually includes a safety factor,
+#    so these are on the high side. If the 99.6% dry bulb isn't below the building's heating setpoint (hot climates)
+#    there's no design heating load to calibrate to, so that raises a ValueError - give a UA instead.
+#   -A column of heating_df can go straight into the part load analysis, e.g.
+#    summarize_loads(heating_df.index, heating_df['GMCS'], mbh_design) or update_load_summary() with
+#    heating_df[['GMCS']].rename(columns={'GMCS': 'Heating Load (MBH)'}).reset_index()
+#   -This is a screening estimate (steady state, no thermal mass, solar on a horizontal aperture). Use metered data
+#    when there is any.
+#
+@profiled()
+def estimate_loads(buildings_df, epw_df, heating_setpoint=70, cooling_setpoint=75, ua_per_sf=0.1, cfm_per_sf=0.15,
+                   internal_w_per_sf=1.5, solar_aperture_per_sf=0.02, indoor_w=0.0093, occupied_hours=(7, 18),
+                   unoccupied_fraction=0.3, chunk_buildings=500):
+    # hourly weather & schedules (1 x hours)
+    outdoor_t = np.asarray(epw_df['Dry Bulb Temperature'], dtype=float)
+    outdoor_w = humidity_ratio(np.asarray(epw_df['Dew Point Temperature'], dtype=float),
+                               np.asarray(epw_df['Atmospheric Station Pressure'], dtype=float))
+    outdoor_h = moist_air_enthalpy(outdoor_t, outdoor_w)
+    indoor_cooling_w = np.minimum(outdoor_w, indoor_w)
+    ghi = np.nan_to_num(np.asarray(epw_df['Global Horizontal Radiation'], dtype=float))  # Btu/h-ft2
+    timestamps = pd.DatetimeIndex(epw_df.index)
+    occupied = ((timestamps.dayofweek < 5) & (timestamps.hour >= occupied_hours[0])
+                & (timestamps.hour < occupied_hours[1])).astype(float)
+    gain_schedule = np.where(occupied > 0, 1.0, unoccupied_fraction)
+    vent_sensible = 4.5 * (0.240 + 0.444 * outdoor_w) * occupied  # Btu/h per CFM per F, h(Th, Wo) - h(To, Wo)
+
+    # per building coefficients (buildings x 1)
+    def column(name, default):
+        if name in buildings_df.columns:
+            return pd.to_numeric(buildings_df[name], errors='coerce').fillna(default).to_numpy(dtype=float)
+        return np.full(len(buildings_df), default, dtype=float)
+
+    gsf = column('Building GSF', np.nan)
+    if np.isnan(gsf).any():
+        raise ValueError('Every building needs a Building GSF.')
+    heating_t = column('Heating Setpoint (F)', heating_setpoint)
+    cooling_t = column('Cooling Setpoint (F)', cooling_setpoint)
+    cfm = column('Ventilation (CFM)', np.nan)
+    cfm = np.where(np.isnan(cfm), cfm_per_sf * gsf, cfm)
+    internal = column('Internal Gains (W/sf)', internal_w_per_sf) * 3.412 * gsf  # Btu/h
+    aperture = column('Solar Aperture (sf)', np.nan)
+    aperture = np.where(np.isnan(aperture), solar_aperture_per_sf * gsf, aperture)
+
+    # UA - given, calibrated to the design MBH, or the default per sf
+    ua = column('UA (Btu/h-F)', np.nan)
+    design_mbh = column('Design MBH', np.nan)
+    design_dt = heating_t - np.nanpercentile(outdoor_t, 0.4)
+    uncalibrated = np.isnan(ua) & ~np.isnan(design_mbh) & (design_dt <= 0)
+    if uncalibrated.any():
+        raise ValueError('Can\'t calibrate UA to the Design MBH for {}: the 99.6% heating dry bulb ({:.1f} F) isn\'t '
+                         'below the heating setpoint. Give a UA (Btu/h-F) instead.'.format(
+                             ', '.join(map(str, buildings_df.index[uncalibrated])), np.nanpercentile(outdoor_t, 0.4)))
+    calibrated = np.clip(1000 * design_mbh / design_dt - 1.08 * cfm, 0, None)
+    ua = np.where(np.isnan(ua), np.where(np.isnan(calibrated), ua_per_sf * gsf, calibrated), ua)
+
+    # (buildings x hours) loads, a chunk of buildings at a time
+    heating = np.empty((len(buildings_df), len(outdoor_t)))
+    cooling = np.empty((len(buildings_df), len(outdoor_t)))
+    for start in range(0, len(buildings_df), chunk_buildings):
+        b = slice(start, start + chunk_buildings)
+        gains = internal[b, None] * gain_schedule + aperture[b, None] * ghi
+
+        # heating: envelope + outdoor air sensible to the heating setpoint, less gains
+        loss = heating_t[b, None] - outdoor_t
+        loss *= ua[b, None] + cfm[b, None] * vent_sensible
+        loss -= gains
+        np.clip(loss, 0, None, out=loss)
+        heating[b] = loss / 1000
+
+        # cooling: envelope + outdoor air enthalpy down to the cooling setpoint & indoor humidity, plus gains
+        indoor_h = moist_air_enthalpy(cooling_t[b, None], indoor_cooling_w)
+        gain = (outdoor_h - indoor_h) * (4.5 * occupied)
+        gain *= cfm[b, None]
+        gain += ua[b, None] * (outdoor_t - cooling_t[b, None])
+        gain += gains
+        np.clip(gain, 0, None, out=gain)
+        cooling[b] = gain / 1000
+
+    index = timestamps.rename('Timestamp')
+    heating_df = pd.DataFrame(heating.T, index=index, columns=buildings_df.index, copy=False)
+    cooling_df = pd.DataFrame(cooling.T, index=index, columns=buildings_df.index, copy=False)
+    return heating_df, cooling_df
+#####################################################
+
+
+#####################################################
+# generate_load_profiles(buildings_df, library=None, chunk_buildings=500) - scaled, weather adjusted prototype
+# profiles for many buildings
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   buildings_df - DataFrame with one row per building, indexed by building name, with columns:
+#                  'Building Type' - a type in the library (optional with a one type library)
+#                  'Design MBH' - heating design capacity, the prototype is scaled so its peak heating is this
+#                  'Building GSF' - used to scale by floor area instead when there's no design MBH (needs the
+#                                   prototype's GSF, see PrototypeLibrary.from_xlsx())
+#                  'Weather File' - optional .epw file (anything read_epw() accepts) the building is in, blank =
+#                                   the prototype's own weather
+#   library - a PrototypeLibrary, defaults to load_prototype_library() (bldg_heat_cool_profiles.xlsx, no prototype
+#             GSF). For buildings with a GSF & no design MBH pass load_prototype_library(gsf={type: GSF, ...}).
+#   chunk_buildings - buildings generated at a time
+#
+#
+#   Outputs:
+#
+#   generator of (names, heating, cooling) - names is a chunk of buildings_df.index, heating & cooling are
+#   (buildings x 8760) arrays of loads (MBH) on HOURS_OF_YEAR. Stream them into save_load_profiles() or
+#   summarize_load_matrix(), e.g.
+#       for names, heating, cooling in generate_load_profiles(buildings_df):
+#           summaries.update(zip(names, summarize_load_matrix(HOURS_OF_YEAR, heating,
+#                                                             buildings_df.loc[names, 'Design MBH'])))
+#
+#
+#   Notes:
+#
+#   -Each chunk is gathered from the library's normalized arrays by building type & climate & adjusted by
+#    broadcasting, no per building loop:
+#      heating = size x max(prototype heating + slope (min(site T, balance) - min(prototype T, balance)), 0)
+#    & the same for cooling with max() above its balance point, using PrototypeLibrary's fits.
+#   -Each weather file is read once, leap days are dropped to line the hours up.
+#   -Design MBH is the size at the prototype's weather. A colder site can peak above it, which is the point.
+#
+@profiled()
+def generate_load_profiles(buildings_df, library=None, chunk_buildings=500):
+    library = load_prototype_library() if library is None else library
+
+    def column(name):
+        return buildings_df[name] if name in buildings_df.columns else pd.Series(np.nan, index=buildings_df.index)
+
+    type_index = library.index(column('Building Type').fillna(library.types[0]))
+    design = pd.to_numeric(column('Design MBH'), errors='coerce').to_numpy(dtype=float)
+    gsf = pd.to_numeric(column('Building GSF'), errors='coerce').to_numpy(dtype=float)
+    size = np.where(np.isnan(design), library.peak_mbh[type_index] * gsf / library.gsf[type_index], design)
+    if np.isnan(size).any():
+        raise ValueError('Every building needs a Design MBH, or a Building GSF & a prototype GSF, e.g. '
+                         'library=load_prototype_library(gsf={type: GSF, ...}).')
+
+    # site dry bulb for each weather file, the last row (index -1) is NaN for buildings without one
+    weather = column('Weather File')
+    climates = list(pd.unique(weather.dropna()))
+    site_dry_bulb = np.full((len(climates) + 1, 8760), np.nan)
+    for i, epw_file in enumerate(climates):
+        epw_df = read_epw(epw_file)
+        keep = ~((epw_df.index.month == 2) & (epw_df.index.day == 29))
+        site_dry_bulb[i] = np.asarray(epw_df['Dry Bulb Temperature'], dtype=float)[keep]
+    climate_index = weather.map({epw_file: i for i, epw_file in enumerate(climates)}).fillna(-1).to_numpy(dtype=int)
+
+    for start in range(0, len(buildings_df), chunk_buildings):
+        b = slice(start, start + chunk_buildings)
+        t = type_index[b]
+        prototype_t = library.dry_bulb[t]
+        site_t = site_dry_bulb[climate_index[b]]
+        site_t = np.where(np.isnan(site_t), prototype_t, site_t)
+
+        slope, balance = library.heating_fit[t].T
+        heating = library.heating[t]
+        heating += slope[:, None] * (np.minimum(site_t, balance[:, None]) - np.minimum(prototype_t, balance[:, None]))
+        np.clip(heating, 0, None, out=heating)
+        heating *= size[b, None]
+
+        slope, balance = library.cooling_fit[t].T
+        cooling = library.cooling[t]
+        cooling += slope[:, None] * (np.maximum(site_t, balance[:, None]) - np.maximum(prototype_t, balance[:, None]))
+        np.clip(cooling, 0, None, out=cooling)
+        cooling *= size[b, None]
+        yield buildings_df.index[b], heating, cooling
+#####################################################
+
+
+#####################################################
+# bin_loads(loads, edges) - total load & number of points in each part load bin
+#
+#   Imports:
+#
+#   import numpy as np
+#
+#
+#   Inputs:
+#
+#   loads - array-like of loads (MBH)
+#   edges - sorted bin edges, any spacing, e.g. np.arange(21) * mbh_design / 20 or [0, 100, 500, 2000, 2700]
+#
+#
+#   Outputs:
+#
+#   bin_sums - array of the sum of the loads in each bin (len(edges) - 1 bins)
+#   bin_counts - array of the number of loads in each bin
+#
+#
+#   Notes:
+#
+#   -edges[i] < load <= edges[i + 1] lands in bin i. NaN & loads outside the edges (incl. zero & negative loads with
+#    edges starting at 0) aren't counted.
+#   -Runs the 'bin_loads' kernel, one pass with no temporary arrays on the numba backend.
+#
+def bin_loads(loads, edges):
+    return kernel('bin_loads')(np.asarray(loads, dtype=float), np.asarray(edges, dtype=float))
+#####################################################
+
+
+#####################################################
+# summarize_loads(timestamps, loads, mbh_design, td_in_hrs=None, n_bins=20) - mergeable part load summary
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   timestamps - array-like of timestamps, e.g. load_df['Timestamp']
+#   loads - array-like of loads (MBH), e.g. load_df['Heating Load (MBH)']
+#   mbh_design - design capacity (MBH). The bins are n_bins equal slices of 0 to mbh_design.
+#   td_in_hrs - length of one timestep in hours. None = use the first two timestamps, like load_profile.py does.
+#   n_bins - number of part load bins
+#
+#
+#   Outputs:
+#
+#   summary - a dictionary with everything the part load figure needs (bin sums & counts, totals, max, negative
+#             load stats & interval coverage). It's plain JSON so it can be saved with save_load_summary().
+#
+#
+#   Notes:
+#
+#   -Bins are (low, high], so a zero load isn't counted as an operating point & loads above design aren't binned.
+#   -Every value in the summary is a sum, count, min or max, so two summaries can be combined with
+#    merge_load_summaries() without going back to the raw data.
+#
+@profiled()
+def summarize_loads(timestamps, loads, mbh_design, td_in_hrs=None, n_bins=20):
+    timestamps = parse_timestamps(timestamps).reset_index(drop=True)
+    loads = np.asarray(loads, dtype=float)
+    valid = ~np.isnan(loads)
+
+    if td_in_hrs is None:
+        td_in_hrs = round((timestamps.iloc[1] - timestamps.iloc[0]).seconds / 3600, 2) if len(timestamps) > 1 else 0
+
+    # bin the loads - edges[i] < load <= edges[i + 1] lands in bin i
+    edges = np.arange(n_bins + 1) * (mbh_design / n_bins)
+    bin_sums, bin_counts = bin_loads(loads, edges)
+
+    neg_loads = loads[valid & (loads < 0)]
+    summary = {
+        'mbh_design': mbh_design.item() if hasattr(mbh_design, 'item') else mbh_design,  # keep ints as ints
+        'n_bins': int(n_bins),
+        'td_in_hrs': float(td_in_hrs),
+        'start': timestamps.min().isoformat() if len(timestamps) else None,
+        'end': timestamps.max().isoformat() if len(timestamps) else None,  # watermark for the next update
+        'points': int(len(loads)),
+        'op_points': int(np.count_nonzero(loads[valid] > 0)),
+        'total_load': float(loads[valid].sum()),
+        'max_load': float(loads[valid].max()) if valid.any() else None,
+        'neg_points': int(len(neg_loads)),
+        'neg_load': float(neg_loads.sum()),
+        'bin_sums': bin_sums.tolist(),
+        'bin_counts': bin_counts.tolist()
+    }
+    return summary
+#####################################################
+
+
+#####################################################
+# summarize_load_matrix(timestamps, loads, mbh_design, td_in_hrs=None, n_bins=20) - summarize_loads() for many
+# buildings at once
+#
+#   Imports:
+#
+#   import numpy as np
+#
+#
+#   Inputs:
+#
+#   timestamps - array-like of timestamps shared by every building, e.g. HOURS_OF_YEAR
+#   loads - (buildings x timestamps) array of loads (MBH), e.g. a chunk from generate_load_profiles() or
+#           heating_df.to_numpy().T from estimate_loads()
+#   mbh_design - design capacity (MBH), one per building (or one number for all)
+#   td_in_hrs, n_bins - as summarize_loads()
+#
+#
+#   Outputs:
+#
+#   summaries - list of summaries, one per row of loads, each the same as summarize_loads() gives for that row
+#
+#
+#   Notes:
+#
+#   -Every row is binned in one np.bincount() over (row, bin) pairs, the bin of each load is worked out from its row's
+#    bin width & checked against the same edges summarize_loads() uses, so the bins match exactly.
+#
+@profiled()
+def summarize_load_matrix(timestamps, loads, mbh_design, td_in_hrs=None, n_bins=20):
+    timestamps = parse_timestamps(timestamps).reset_index(drop=True)
+    loads = np.atleast_2d(np.asarray(loads, dtype=float))
+    mbh_design = np.broadcast_to(np.asarray(mbh_design), loads.shape[:1])
+    n_rows = len(loads)
+
+    if td_in_hrs is None:
+        td_in_hrs = round((timestamps.iloc[1] - timestamps.iloc[0]).seconds / 3600, 2) if len(timestamps) > 1 else 0
+
+    # bin every row at once - edges[r, i] < load <= edges[r, i + 1] lands in bin i of row r
+    edges = np.arange(n_bins + 1) * (mbh_design.astype(float) / n_bins)[:, None]
+    valid = ~np.isnan(loads)
+    filled = np.where(valid, loads, 0)
+    bin_index = np.clip(np.ceil(filled / edges[:, 1:2]) - 1, 0, n_bins - 1).astype(np.int64)
+    bin_index -= filled <= np.take_along_axis(edges, bin_index, axis=1)  # round off in the division
+    bin_index += filled > np.take_along_axis(edges, np.clip(bin_index + 1, 0, n_bins), axis=1)
+    binned = valid & (filled > edges[:, :1]) & (filled <= edges[:, -1:])
+    flat_index = (np.arange(n_rows)[:, None] * n_bins + bin_index)[binned]
+    bin_sums = np.bincount(flat_index, weights=filled[binned], minlength=n_rows * n_bins).reshape(n_rows, n_bins)
+    bin_counts = np.bincount(flat_index, minlength=n_rows * n_bins).reshape(n_rows, n_bins)
+
+    negative = valid & (filled < 0)
+    op_points = np.count_nonzero(filled > 0, axis=1)
+    max_load = np.where(valid, loads, -np.inf).max(axis=1)
+    neg_points = np.count_nonzero(negative, axis=1)
+    any_valid = valid.any(axis=1)
+    start = timestamps.min().isoformat() if len(timestamps) else None
+    end = timestamps.max().isoformat() if len(timestamps) else None
+
+    summaries = []
+    for r in range(n_rows):
+        summaries.append({
+            'mbh_design': mbh_design[r].item(),
+            'n_bins': int(n_bins),
+            'td_in_hrs': float(td_in_hrs),
+            'start': start,
+            'end': end,
+            'points': int(loads.shape[1]),
+            'op_points': int(op_points[r]),
+            'total_load': float(loads[r][valid[r]].sum()),  # summed like summarize_loads() so the totals match
+            'max_load': float(max_load[r]) if any_valid[r] else None,
+            'neg_points': int(neg_points[r]),
+            'neg_load': float(loads[r][negative[r]].sum()),
+            'bin_sums': bin_sums[r].tolist(),
+            'bin_counts': bin_counts[r].tolist()
+        })
+    return summaries
+#####################################################
+
+
+#####################################################
+# merge_load_summaries(summary1, summary2) - combine two summaries from summarize_loads()
+#
+#   Inputs:
+#
+#   summary1, summary2 - summaries from summarize_loads() with the same design MBH & number of bins
+#
+#
+#   Outputs:
+#
+#   summary - the combined summary. The timestep length is taken from summary1.
+#
+#
+#   Notes:
+#
+#   -The summaries should cover different rows. Overlapping data is counted twice.
+#
+def merge_load_summaries(summary1, summary2):
+    if (summary1['mbh_design'] != summary2['mbh_design']) or (summary1['n_bins'] != summary2['n_bins']):
+        raise ValueError('Load summaries use different bins (design MBH or number of bins changed).')
+
+    summary = dict(summary1)
+    for key in ['points', 'op_points', 'total_load', 'neg_points', 'neg_load']:
+        summary[key] = summary1[key] + summary2[key]
+    summary['bin_sums'] = [a + b for a, b in zip(summary1['bin_sums'], summary2['bin_sums'])]
+    summary['bin_counts'] = [a + b for a, b in zip(summary1['bin_counts'], summary2['bin_counts'])]
+
+    starts = [s['start'] for s in (summary1, summary2) if s['start'] is not None]
+    ends = [s['end'] for s in (summary1, summary2) if s['end'] is not None]
+    max_loads = [s['max_load'] for s in (summary1, summary2) if s['max_load'] is not None]
+    summary['start'] = min(starts, key=pd.Timestamp) if starts else None
+    summary['end'] = max(ends, key=pd.Timestamp) if ends else None
+    summary['max_load'] = max(max_loads) if max_loads else None
+    return summary
+#####################################################
+
+
+#####################################################
+# read_load_summary(summary_path) / save_load_summary(summary, summary_path) - load summary .json files
+#
+#   Inputs:
+#
+#   summary_path - path to the .json file, e.g. 'Load Summaries/GMCS.json'
+#   summary - a summary from summarize_loads() or merge_load_summaries()
+#
+#
+#   Outputs:
+#
+#   read_load_summary() returns the summary, or None if the file doesn't exist yet
+#
+def read_load_summary(summary_path):
+    if not os.path.exists(summary_path):
+        return None
+    with open(summary_path) as f:
+        return json.load(f)
+
+
+def save_load_summary(summary, summary_path):
+    folder = os.path.dirname(summary_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=1)
+#####################################################
+
+
+#####################################################
+# update_load_summary(summary_path, load_df, mbh_design, ...) - add new trend data to a saved load summary
+#
+#   Imports:
+#
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   summary_path - path to the building's summary .json file (created if it doesn't exist)
+#   load_df - a DataFrame with the trend export, e.g. load_df from load_profile.py
+#   mbh_design - design capacity (MBH)
+#   timestamp_col - name of the timestamp column
+#   load_col - name of the load column
+#   n_bins - number of part load bins
+#   exclude_bad_data - whether points flagged by scan_data_quality() were dropped from load_df, saved with the
+#                      summary so a run with the other setting doesn't merge into it
+#
+#
+#   Outputs:
+#
+#   summary - the updated summary (also saved to summary_path)
+#
+#
+#   Notes:
+#
+#   -Only rows with timestamps after the saved watermark (the 'end' of the summary) are binned, so re-exporting
+#    the whole history every month only costs the new rows.
+#   -If the design MBH, number of bins or exclude_bad_data changed, the old bins can't be reused & the summary is
+#    rebuilt from load_df alone. Summaries saved before exclude_bad_data was stored are taken as unfiltered.
+#
+@profiled()
+def update_load_summary(summary_path, load_df, mbh_design, timestamp_col='Timestamp', load_col='Heating Load (MBH)',
+                        n_bins=20, exclude_bad_data=False):
+    summary = read_load_summary(summary_path)
+    timestamps = parse_timestamps(load_df[timestamp_col], cache_key=summary_path)
+
+    if summary is not None and (summary['mbh_design'] != mbh_design or summary['n_bins'] != n_bins
+                                or summary.get('exclude_bad_data', False) != exclude_bad_data):
+        print('\nWARNING: design MBH, bins or bad data filter changed - rebuilding', summary_path)
+        summary = None
+
+    if summary is None:
+        summary = summarize_loads(timestamps, load_df[load_col], mbh_design, n_bins=n_bins)
+        summary['exclude_bad_data'] = bool(exclude_bad_data)
+    else:
+        new_rows = (timestamps > pd.Timestamp(summary['end'])).to_numpy()
+        print('\nadding', new_rows.sum(), 'new rows to', summary_path)
+        if new_rows.any():
+            new_summary = summarize_loads(timestamps[new_rows], load_df[load_col].to_numpy()[new_rows], mbh_design,
+                                          td_in_hrs=summary['td_in_hrs'], n_bins=n_bins)
+            summary = merge_load_summaries(summary, new_summary)
+
+    save_load_summary(summary, summary_path)
+    return summary
+#####################################################
+
+
+#####################################################
+# summarize_load_periods(timestamps, loads, td_in_hrs, freq='MS') - load totals per calendar period
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   timestamps - array-like of timestamps, e.g. load_df['Timestamp']
+#   loads - array-like of loads (MBH), e.g. load_df['Heating Load (MBH)']
+#   td_in_hrs - length of one timestep in hours
+#   freq - pandas period alias, 'MS' = calendar months, 'D' = days, etc.
+#
+#
+#   Outputs:
+#
+#   period_df - a DataFrame indexed by period start with points, operating hours, total load & max load
+#
+#
+#   Notes:
+#
+#   -'Total Load' is the sum of the load readings, the same way summarize_loads() totals them.
+#
+def summarize_load_periods(timestamps, loads, td_in_hrs, freq='MS'):
+    loads = pd.Series(np.asarray(loads, dtype=float), index=pd.DatetimeIndex(parse_timestamps(timestamps)))
+    grouped = loads.resample(freq)
+    period_df = pd.DataFrame({
+        'Points': grouped.count(),
+        'Operating Hours': (loads > 0).resample(freq).sum() * td_in_hrs,
+        'Total Load': grouped.sum(),
+        'Max Load (MBH)': grouped.max()
+    })
+    period_df.index.name = 'Period Start'
+    return period_df
+#####################################################
+
+
+#####################################################
+# bootstrap_load_profile(timestamps, loads, mbh_design, td_in_hrs=None, n_bins=20, block='D', n_boot=2000,
+#                        confidence=0.9, seed=None) - block bootstrap confidence bands for the part load distribution
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   timestamps - array-like of timestamps, e.g. load_df['Timestamp']
+#   loads - array-like of loads (MBH), e.g. load_df['Heating Load (MBH)']
+#   mbh_design, td_in_hrs, n_bins - as summarize_loads()
+#   block - pandas period alias for the resampled blocks, 'D' = days, 'W' = weeks
+#   n_boot - number of bootstrap replicates
+#   confidence - width of the bands, 0.9 = 5th to 95th percentile of the replicates
+#   seed - random seed
+#
+#
+#   Outputs:
+#
+#   bands_df - load_bin_table() for the data plus 'Hours (%) Low', 'Hours (%) High', 'Load (%) Low' &
+#              'Load (%) High' columns
+#   peak_band - Series with the 'Estimate', 'Low' & 'High' max load (MBH)
+#
+#
+#   Notes:
+#
+#   -Each replicate draws as many whole blocks (with replacement) as the data has, so the daily/weekly patterns &
+#    the correlation between neighbouring readings are kept. Blocks are the calendar periods the readings fall in,
+#    short blocks (missing data) stay short.
+#   -The bin of a reading doesn't depend on which replicate it lands in, so every block is binned once (one
+#    np.bincount() over (block, bin) pairs, same edges as summarize_loads()). All the replicates are then one
+#    (replicates x blocks) matrix of sampled block numbers: the peaks are a gather of the block peaks & the bin
+#    counts/sums a matrix product of the block multiplicities with the block bins. No loop per replicate & the cost
+#    doesn't grow with the number of readings, 2000 replicates of 2 years of 1 minute data take well under a second.
+#   -A resampled year can't peak higher than the data did, so the high end of the peak band is the measured max.
+#    Readings with no timestamp are left out of the replicates.
+#
+@profiled()
+def bootstrap_load_profile(timestamps, loads, mbh_design, td_in_hrs=None, n_bins=20, block='D', n_boot=2000,
+                           confidence=0.9, seed=None):
+    timestamps = parse_timestamps(timestamps).reset_index(drop=True)
+    loads = np.asarray(loads, dtype=float)
+    bands_df = load_bin_table(summarize_loads(timestamps, loads, mbh_design, td_in_hrs=td_in_hrs, n_bins=n_bins))
+    peak = np.nanmax(loads) if (~np.isnan(loads)).any() else np.nan
+
+    # blocks sorted by block number, readings with no timestamp dropped
+    block_codes = pd.factorize(timestamps.dt.to_period(block))[0]
+    order = np.argsort(block_codes, kind='stable')
+    order = order[block_codes[order] >= 0]
+    block_codes = block_codes[order]
+    loads = loads[order]
+    filled = np.nan_to_num(loads)
+    n_blocks = block_codes[-1] + 1 if len(block_codes) else 0
+    if n_blocks == 0:
+        raise ValueError('No timestamped readings to resample.')
+
+    # bin every block - edges[i] < load <= edges[i + 1] lands in bin i, n_bins = not binned (outside the edges or NaN)
+    edges = np.arange(n_bins + 1) * (mbh_design / n_bins)
+    point_bins = np.searchsorted(edges, loads, side='left') - 1
+    point_bins[(point_bins < 0) | (point_bins >= n_bins)] = n_bins
+    flat_bins = block_codes * (n_bins + 1) + point_bins
+    block_counts = np.bincount(flat_bins, minlength=n_blocks * (n_bins + 1)).reshape(n_blocks, -1)[:, :n_bins]
+    block_sums = np.bincount(flat_bins, weights=filled, minlength=n_blocks * (n_bins + 1)).reshape(n_blocks, -1)
+    block_totals = np.bincount(block_codes, weights=filled, minlength=n_blocks)
+    block_starts = np.flatnonzero(np.r_[True, block_codes[1:] != block_codes[:-1]])
+    block_peaks = np.fmax.reduceat(loads, block_starts)
+
+    # every replicate at once - sampled block numbers, how many times each block was drawn
+    rng = np.random.default_rng(seed)
+    sampled = rng.integers(n_blocks, size=(n_boot, n_blocks))
+    draws = np.bincount((np.arange(n_boot)[:, None] * n_blocks + sampled).ravel(),
+                        minlength=n_boot * n_blocks).reshape(n_boot, n_blocks).astype(float)
+    counts = draws @ block_counts
+    sums = draws @ block_sums[:, :n_bins]
+    totals = draws @ block_totals
+    peaks = np.fmax.reduce(block_peaks[sampled], axis=1)
+
+    # shares like load_bin_table(), bands from the percentiles of the replicates
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hours_share = 100 * counts / counts.sum(axis=1, keepdims=True)
+        load_share = 100 * sums / totals[:, None]
+    tails = 100 * np.array([(1 - confidence) / 2, (1 + confidence) / 2])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN bins, e.g. no operating hours in a replicate
+        bands_df['Hours (%) Low'], bands_df['Hours (%) High'] = np.nanpercentile(hours_share, tails, axis=0)
+        bands_df['Load (%) Low'], bands_df['Load (%) High'] = np.nanpercentile(load_share, tails, axis=0)
+        peak_low, peak_high = np.nanpercentile(peaks, tails)
+    peak_band = pd.Series({'Estimate': peak, 'Low': peak_low, 'High': peak_high}, name='Max Load (MBH)')
+    return bands_df, peak_band
+#####################################################
+
+###########################################################################
+# RESULTS DATABASE & EXPORT FUNCTIONS:
+
+#####################################################
+# open_results_db(db_path) - open (and create if needed) the local analysis results database
+#
+#   Imports:
+#
+#   import sqlite3
+#
+#
+#   Inputs:
+#
+#   db_path - path to the SQLite database file, e.g. 'Results/hvaclib_results.db'
+#
+#
+#   Outputs:
+#
+#   db - a sqlite3 connection with the results tables below
+#
+#
+#   Notes:
+#
+#   Tables:
+#   -buildings - one row per building (name, GSF, design MBH & the rest of the workbook metadata as JSON)
+#   -runs - one row per analysis run with the headline numbers (design/max MBH, Btu/sf design vs. actual, etc.)
+#   -bins - the part load distribution for each run (hours & heating output per bin)
+#   -load_periods - monthly (or other period) load totals per building, replaced whenever a period is re-run
+#   -latest_runs (view) - the most recent run for each building, with the building name
+#
+#   All tables are indexed for portfolio queries, e.g.
+#   query_results_db(db, 'SELECT * FROM latest_runs WHERE btu_sf_actual < 0.5 * btu_sf_design')
+#
+def open_results_db(db_path):
+    folder = os.path.dirname(db_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    db = sqlite3.connect(db_path)
+    db.execute('PRAGMA journal_mode = WAL')  # fast batched writes, readers don't block the writer
+    db.execute('PRAGMA synchronous = NORMAL')
+    db.execute('PRAGMA foreign_keys = ON')
+    db.executescript('''
+        CREATE TABLE IF NOT EXISTS buildings (
+            building_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            gsf REAL,
+            mbh_design REAL,
+            metadata TEXT
+        );
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY,
+            building_id INTEGER NOT NULL REFERENCES buildings (building_id),
+            run_time TEXT NOT NULL,
+            source_file TEXT,
+            sheet_name TEXT,
+            start TEXT,
+            end TEXT,
+            td_in_hrs REAL,
+            points INTEGER,
+            op_hrs REAL,
+            total_load REAL,
+            mbh_design REAL,
+            max_mbh REAL,
+            btu_sf_design REAL,
+            btu_sf_actual REAL,
+            neg_points INTEGER,
+            neg_load REAL
+        );
+        CREATE INDEX IF NOT EXISTS runs_building_idx ON runs (building_id, run_id);
+        CREATE INDEX IF NOT EXISTS runs_btu_sf_idx ON runs (btu_sf_actual, btu_sf_design);
+        CREATE TABLE IF NOT EXISTS bins (
+            run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+            bin INTEGER NOT NULL,
+            low_mbh REAL,
+            high_mbh REAL,
+            hours REAL,
+            hours_pct REAL,
+            load REAL,
+            load_pct REAL,
+            PRIMARY KEY (run_id, bin)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS load_periods (
+            building_id INTEGER NOT NULL REFERENCES buildings (building_id),
+            period_start TEXT NOT NULL,
+            points INTEGER,
+            op_hrs REAL,
+            total_load REAL,
+            max_mbh REAL,
+            PRIMARY KEY (building_id, period_start)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS load_periods_start_idx ON load_periods (period_start);
+        CREATE VIEW IF NOT EXISTS latest_runs AS
+            SELECT buildings.name, runs.*
+            FROM runs JOIN buildings USING (building_id)
+            WHERE runs.run_id = (SELECT MAX(r.run_id) FROM runs r WHERE r.building_id = runs.building_id);
+    ''')
+    return db
+#####################################################
+
+
+#####################################################
+# save_load_results(db, summary, meta_df, ...) - write one load_profile.py analysis to the results database
+#
+#   Imports:
+#
+#   import sqlite3
+#   import json
+#
+#
+#   Inputs:
+#
+#   db - a connection from open_results_db()
+#   summary - the load summary the figure was drawn from (see summarize_loads())
+#   meta_df - the static inputs/metadata DataFrame from the load profile workbook
+#   source_file, sheet_name - where the data came from (optional, for reference)
+#   period_df - optional period totals from summarize_load_periods()
+#   commit - commit right away. Use commit=False & call db.commit() once when saving many buildings.
+#
+#
+#   Outputs:
+#
+#   run_id - the id of the new row in the runs table
+#
+#
+#   Notes:
+#
+#   -The building name comes from the 'Building Name' metadata row, or the sheet name if there isn't one.
+#   -Bins & periods are written with executemany() so a whole run is a handful of statements.
+#
+@profiled()
+def save_load_results(db, summary, meta_df, source_file=None, sheet_name=None, period_df=None, commit=True):
+    metadata = {str(k): (v.item() if hasattr(v, 'item') else v) for k, v in meta_df.iloc[:, 0].items()}
+    name = str(metadata.get('Building Name', sheet_name))
+    gsf = meta_df.iloc[1, 0]
+    gsf = gsf.item() if hasattr(gsf, 'item') else gsf
+    mbh_design = summary['mbh_design']
+    max_mbh = summary['max_load']
+    td_in_hrs = summary['td_in_hrs']
+
+    # add or update the building
+    db.execute('''
+        INSERT INTO buildings (name, gsf, mbh_design, metadata) VALUES (?, ?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET gsf = excluded.gsf, mbh_design = excluded.mbh_design,
+                                         metadata = excluded.metadata
+    ''', (name, gsf, mbh_design, json.dumps(metadata, default=str)))
+    building_id = db.execute('SELECT building_id FROM buildings WHERE name = ?', (name,)).fetchone()[0]
+
+    # add the run
+    cursor = db.execute('''
+        INSERT INTO runs (building_id, run_time, source_file, sheet_name, start, end, td_in_hrs, points, op_hrs,
+                          total_load, mbh_design, max_mbh, btu_sf_design, btu_sf_actual, neg_points, neg_load)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (building_id, datetime.datetime.now().isoformat(timespec='seconds'), source_file, sheet_name,
+          summary['start'], summary['end'], td_in_hrs, summary['points'], summary['op_points'] * td_in_hrs,
+          summary['total_load'], mbh_design, max_mbh, round(1000 * mbh_design / gsf, 2),
+          round(1000 * max_mbh / gsf, 2) if max_mbh is not None else None, summary['neg_points'],
+          summary['neg_load'] * td_in_hrs))
+    run_id = cursor.lastrowid
+
+    # add the bins
+    bins_df = load_bin_table(summary).astype(object)
+    db.executemany('INSERT INTO bins VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [
+        (run_id, *[None if pd.isna(value) else value for value in row]) for row in bins_df.itertuples(index=False)
+    ])
+
+    # add or replace the period totals
+    if period_df is not None:
+        db.executemany('INSERT OR REPLACE INTO load_periods VALUES (?, ?, ?, ?, ?, ?)', [
+            (building_id, period_start.isoformat(), int(points), float(op_hrs), float(total),
+             None if pd.isna(period_max) else float(period_max))
+            for period_start, points, op_hrs, total, period_max in period_df.itertuples()
+        ])
+
+    if commit:
+        db.commit()
+    return run_id
+#####################################################
+
+
+#####################################################
+# query_results_db(db, sql, params=()) - run a query against the results database
+#
+#   Inputs:
+#
+#   db - a connection from open_results_db()
+#   sql - a SELECT statement, e.g. 'SELECT * FROM latest_runs WHERE btu_sf_actual < 0.5 * btu_sf_design'
+#   params - values for any ? placeholders in sql
+#
+#
+#   Outputs:
+#
+#   results_df - a DataFrame with the query results
+#
+def query_results_db(db, sql, params=()):
+    return pd.read_sql_query(sql, db, params=params)
+#####################################################
+
+
+#####################################################
+# load_bin_table(summary) - the part load bins from a load summary as a table
+#
+#   Inputs:
+#
+#   summary - a summary from summarize_loads()/update_load_summary()
+#
+#
+#   Outputs:
+#
+#   bins_df - DataFrame with one row per bin & columns 'Bin', 'Low (MBH)', 'High (MBH)', 'Hours', 'Hours (%)',
+#             'Load (MBH-pts)', 'Load (%)'. Same numbers as the bins table in the results database.
+#
+def load_bin_table(summary):
+    mbh_design = summary['mbh_design']
+    n_bins = summary['n_bins']
+    td_in_hrs = summary['td_in_hrs']
+    counts = np.asarray(summary['bin_counts'], dtype=float)
+    loads = np.asarray(summary['bin_sums'], dtype=float)
+    total_hours = counts.sum() * td_in_hrs
+    total_load = summary['total_load']
+
+    bins = np.arange(n_bins)
+    bins_df = pd.DataFrame({
+        'Bin': bins,
+        'Low (MBH)': mbh_design * bins / n_bins,
+        'High (MBH)': mbh_design * (bins + 1) / n_bins,
+        'Hours': counts * td_in_hrs,
+        'Hours (%)': 100 * counts * td_in_hrs / total_hours if total_hours else np.nan,
+        'Load (MBH-pts)': loads,
+        'Load (%)': 100 * loads / total_load if total_load else np.nan
+    })
+    return bins_df
+#####################################################
+
+
+LOAD_PROFILE_TEMPLATE_XLSX = 'Input Load Profiles/Load Profile Template.xlsx'
+
+
+#####################################################
+# write_load_profile_workbook(xlsx_path, load_df, meta=None, sheets=None, template_path=LOAD_PROFILE_TEMPLATE_XLSX,
+#                             sheet_name='Data', chunk_rows=10_000) - export a load profile in the template's layout
+#
+#   Imports:
+#
+#   import openpyxl
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   xlsx_path - the .xlsx file to write
+#   load_df - the time series, e.g. load_df from load_profile.py or a long trend export. Written from A1 with a header
+#             row, same as the template's Timestamp, HHW Flow (GPM), ... columns.
+#   meta - the static inputs/metadata: meta_df from load_profile.py (labels in the index), a Series or a dict. None =
+#          the template's labels with blank values.
+#   sheets - optional dict of sheet name: DataFrame for analysis results, e.g.
+#            {'Bins': load_bin_table(summary), 'Monthly': period_df}. Named indexes are written as a column.
+#   template_path - the load profile template
+#   sheet_name - name of the data sheet, the template's layout is read from the sheet with this name
+#   chunk_rows - rows converted to python values at a time, memory use doesn't grow past this
+#
+#
+#   Outputs:
+#
+#   xlsx_path - the path that was written
+#
+#
+#   Notes:
+#
+#   -Uses openpyxl's write-only mode: every row is streamed to disk as it's appended, so memory stays flat no matter
+#    how many rows (Excel's limit is 1,048,576). The normal mode keeps a cell object for every value. openpyxl
+#    serializes the xml faster when lxml is installed.
+#   -The header & metadata fonts/fills/borders, number formats & column widths are copied from the template. The
+#    metadata block goes in the template's columns (K:L) unless load_df is wider, then one column after the data.
+#   -Loads are written as values, not the template's =500*(D2-C2)*B2/10^3 formulas - openpyxl can't save the
+#    calculated result, so pd.read_excel() would read the formulas back as NaN.
+#   -NaN/NaT are written as blank cells. Timezones are dropped (Excel doesn't have them).
+#
+@profiled()
+def write_load_profile_workbook(xlsx_path, load_df, meta=None, sheets=None, template_path=LOAD_PROFILE_TEMPLATE_XLSX,
+                                sheet_name='Data', chunk_rows=10_000):
+    layout = _workbook_layout(template_path, sheet_name)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    for letter, width in layout['widths'].items():
+        ws.column_dimensions[letter].width = width  # has to be set before the first row
+
+    # static inputs/metadata - one (label, value) pair per row, under the template's header
+    if meta is None:
+        meta_rows = [[label, None] for label in layout['meta_labels']]
+    else:
+        if isinstance(meta, pd.DataFrame):
+            meta = meta.iloc[:, 0]
+        meta_rows = [[label, _excel_value(value)] for label, value in pd.Series(meta, dtype=object).items()]
+    n_cols = load_df.shape[1]
+    meta_col = max(layout['meta_col'], n_cols + 2)
+    meta_pad = [None] * (meta_col - n_cols - 1)
+
+    # header row
+    header = [_styled_cell(ws, layout['header_styles'].get(i + 1, layout['header_styles'].get(1)), column)
+              for i, column in enumerate(load_df.columns)]
+    header += meta_pad + [_styled_cell(ws, layout['meta_header_style'], layout['meta_header'])]
+    ws.append(header)
+
+    # stream the data in chunks, values go through one reused cell per column when the template has a number format
+    # for it (e.g. m/d/yy h:mm timestamps)
+    formats = [layout['formats'].get(i + 1) or ('m/d/yy h:mm' if pd.api.types.is_datetime64_any_dtype(load_df.iloc[:, i])
+                                                else None) for i in range(n_cols)]
+    cells = {i: _styled_cell(ws, {'number_format': number_format}) for i, number_format in enumerate(formats)
+             if number_format is not None}
+    n_rows = max(len(load_df), len(meta_rows))
+    for start in range(0, n_rows, chunk_rows):
+        columns = [_excel_column(load_df.iloc[start:start + chunk_rows, i]) for i in range(n_cols)]
+        for i in range(start, min(start + chunk_rows, n_rows)):
+            if i < len(load_df):
+                row = [column[i - start] for column in columns]
+                for j, cell in cells.items():
+                    if row[j] is not None:
+                        cell.value = row[j]
+                        row[j] = cell
+            else:
+                row = [None] * n_cols
+            if i < len(meta_rows):
+                row += meta_pad + meta_rows[i]
+            ws.append(row)
+
+    # analysis results, one sheet each
+    for name, result_df in (sheets or {}).items():
+        _write_result_sheet(wb, name, result_df, layout)
+
+    folder = os.path.dirname(xlsx_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    wb.save(xlsx_path)
+    return xlsx_path
+
+
+@functools.lru_cache(maxsize=4)
+def _workbook_layout(template_path, sheet_name):
+    # header/metadata styles, number formats & column widths of a template sheet, read without loading its data
+    wb = openpyxl.load_workbook(template_path, read_only=True)
+    ws = wb[sheet_name]
+    header, first_row = list(ws.iter_rows(min_row=1, max_row=2))
+    layout = {'header_styles': {}, 'formats': {}, 'meta_col': 11, 'meta_header': 'Static Inputs/Metadata',
+              'meta_header_style': None, 'meta_labels': [], 'widths': {}}
+    for cell in header:
+        if cell.value is None:
+            continue
+        if str(cell.value).startswith('Static Inputs'):
+            layout['meta_col'] = cell.column
+            layout['meta_header'] = cell.value
+            layout['meta_header_style'] = _cell_style(cell)
+        else:
+            layout['header_styles'][cell.column] = _cell_style(cell)
+    for cell in first_row:
+        if getattr(cell, 'value', None) is not None and cell.column < layout['meta_col'] \
+                and cell.number_format != 'General':
+            layout['formats'][cell.column] = cell.number_format
+
+    # metadata labels, down to the first blank
+    for (cell,) in ws.iter_rows(min_row=2, max_row=100, min_col=layout['meta_col'], max_col=layout['meta_col']):
+        if cell.value is None:
+            break
+        layout['meta_labels'].append(cell.value)
+
+    # column widths are in the sheet's <cols> element, before the data
+    with wb._archive.open(ws._worksheet_path) as xml:
+        for _, element in ElementTree.iterparse(xml, events=('start',)):
+            tag = element.tag.rsplit('}', 1)[-1]
+            if tag == 'col' and element.get('width'):
+                for i in range(int(element.get('min')), int(element.get('max')) + 1):
+                    layout['widths'][get_column_letter(i)] = float(element.get('width'))
+            elif tag == 'sheetData':
+                break
+    wb.close()
+    return layout
+
+
+def _cell_style(cell):
+    return {'font': copy.copy(cell.font), 'fill': copy.copy(cell.fill), 'border': copy.copy(cell.border),
+            'alignment': copy.copy(cell.alignment), 'number_format': cell.number_format}
+
+
+def _styled_cell(ws, style, value=None):
+    cell = WriteOnlyCell(ws, value=value)
+    for attribute, setting in (style or {}).items():
+        setattr(cell, attribute, setting)
+    return cell
+
+
+def _excel_value(value):
+    # numpy scalars/pandas timestamps -> plain python, missing -> blank
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.tz_localize(None).to_pydatetime() if value.tz else value.to_pydatetime()
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _excel_column(series):
+    # a column as a list of values openpyxl can write, with missing values as None
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if getattr(series.dt, 'tz', None) is not None:
+            series = series.dt.tz_localize(None)
+        values = np.array(series.dt.to_pydatetime(), dtype=object)
+    elif pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series) \
+            and not isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        return series.tolist()
+    elif pd.api.types.is_float_dtype(series):
+        values = np.asarray(series, dtype=np.float64).astype(object)
+    else:
+        values = series.to_numpy(dtype=object)
+    values[pd.isna(series).to_numpy()] = None
+    return values.tolist()
+
+
+def _write_result_sheet(wb, name, result_df, layout):
+    ws = wb.create_sheet(name[:31])  # Excel's sheet name limit
+    if result_df.index.name is not None or any(result_df.index.names[1:]):
+        result_df = result_df.reset_index()
+    header_style = layout['header_styles'].get(1)
+    for i, column in enumerate(result_df.columns):
+        ws.column_dimensions[get_column_letter(i + 1)].width = max(10, len(str(column)) + 2)
+    ws.append([_styled_cell(ws, header_style, str(column)) for column in result_df.columns])
+
+    columns = [_excel_column(result_df.iloc[:, i]) for i in range(result_df.shape[1])]
+    date_cells = {i: _styled_cell(ws, {'number_format': 'm/d/yy h:mm'}) for i in range(result_df.shape[1])
+                  if pd.api.types.is_datetime64_any_dtype(result_df.iloc[:, i])}
+    for i in range(len(result_df)):
+        row = [column[i] for column in columns]
+        for j, cell in date_cells.items():
+            if row[j] is not None:
+                cell.value = row[j]
+                row[j] = cell
+        ws.append(row)
+#####################################################
+
+
+#####################################################
+# save_load_profiles(folder, load_chunks, buildings, timestamps=None, dtype=np.float32) /
+# read_load_profiles(folder, mmap=True) - binary heating & cooling profiles for many buildings
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#   import json
+#
+#
+#   Inputs:
+#
+#   folder - folder for the profiles, e.g. 'Load Profiles/Portfolio'
+#   load_chunks - iterable of (names, heating, cooling) with (buildings x timestamps) arrays, e.g.
+#                 generate_load_profiles(buildings_df)
+#   buildings - every building name, in the order the chunks come in (e.g. buildings_df.index)
+#   timestamps - the timestamps of the columns, defaults to HOURS_OF_YEAR
+#   dtype - stored dtype, float32 keeps 7 significant digits at half the size
+#   mmap - read_load_profiles() memory maps the files instead of reading them in
+#
+#
+#   Outputs:
+#
+#   read_load_profiles() returns heating_df, cooling_df - DataFrames of loads (MBH), one row per timestamp (named
+#   'Timestamp') & one column per building, same layout as estimate_loads()
+#
+#
+#   Notes:
+#
+#   -The folder has heating.npy & cooling.npy (buildings x timestamps), timestamps.npy & profiles.json (building
+#    names). Chunks are written straight into the memory mapped .npy files, so the whole portfolio is never in
+#    memory at once.
+#   -With mmap=True the frames are views of the files, a column is only read from disk when it's used, e.g.
+#    summarize_loads(heating_df.index, heating_df['GMCS'], 2700).
+#
+@profiled()
+def save_load_profiles(folder, load_chunks, buildings, timestamps=None, dtype=np.float32):
+    timestamps = HOURS_OF_YEAR if timestamps is None else pd.DatetimeIndex(timestamps)
+    buildings = [str(building) for building in buildings]
+    os.makedirs(folder, exist_ok=True)
+    arrays = [np.lib.format.open_memmap(os.path.join(folder, name + '.npy'), mode='w+', dtype=dtype,
+                                        shape=(len(buildings), len(timestamps))) for name in ('heating', 'cooling')]
+    row = 0
+    for names, heating, cooling in load_chunks:
+        arrays[0][row:row + len(names)] = heating
+        arrays[1][row:row + len(names)] = cooling
+        row += len(names)
+    for array in arrays:
+        array.flush()
+    if row != len(buildings):
+        raise ValueError('Got profiles for {} buildings, expected {}.'.format(row, len(buildings)))
+
+    np.save(os.path.join(folder, 'timestamps.npy'), timestamps.to_numpy(dtype='datetime64[ns]'))
+    with open(os.path.join(folder, 'profiles.json'), 'w') as f:
+        json.dump({'buildings': buildings, 'units': 'MBH'}, f, indent=1)
+
+
+def read_load_profiles(folder, mmap=True):
+    with open(os.path.join(folder, 'profiles.json')) as f:
+        info = json.load(f)
+    index = pd.DatetimeIndex(np.load(os.path.join(folder, 'timestamps.npy')), name='Timestamp')
+    frames = []
+    for name in ('heating', 'cooling'):
+        values = np.load(os.path.join(folder, name + '.npy'), mmap_mode='r' if mmap else None)
+        frames.append(pd.DataFrame(values.T, index=index, columns=info['buildings'], copy=False))
+    return tuple(frames)
+#####################################################
+
+###########################################################################
+# WEATHER FUNCTIONS:
+
+#####################################################
+#   read_epw(epw_file) - read a .epw weather file into a pandas dataframe
+#
+#   Imports:
+#   import ladybug_pandas as lbp
+#   import numpy as np
+#   import pandas as pd
+#   import mmap
+#   from ladybug.epw import EPWFields
+#   from ladybug.header import Header
+#   from ladybug.analysisperiod import AnalysisPeriod
+#   from ladybug.datacollection import HourlyContinuousCollection
+#   from ladybug.datatype.base import DataTypeBase
+#
+#
+#   Inputs:
+#
+#   epw_file - a .epw weather file (https://energyplus.net/weather). Can be a path, the file contents as
+#              bytes/bytearray/memoryview, or a file-like object (open file, io.BytesIO, Streamlit upload, etc.)
+#
+#
+#   Outputs:
+#
+#   load_df - a dataframe representation of the .epw data with slightly modified columns.
+#   metadata - the site metadata available in the .epw file, in load_df.attrs['location'] (see Notes)
+#
+#
+#   Notes:
+#
+#   -The data rows are parsed straight out of the file's bytes with pandas' C parser instead of ladybug's line by line
+#    parser. Files are memory mapped & bytes/BytesIO/uploads are read through their existing buffer, so the payload
+#    is never copied or written to a temp file. The columns are still ladybug data types, same as before.
+#   -Columns are converted to IP units with ladybug's conversions. ladybug-pandas' to_ip() got the two step ones
+#    wrong - radiation, precipitable water & precipitation 1000x too big, visibility 1000x too small & snow depth
+#    100x too big.
+#   -The LOCATION header line is kept in load_df.attrs['location'], a dict of 'city', 'state', 'country', 'source',
+#    'station', 'latitude', 'longitude', 'time_zone' (hours from UTC) & 'elevation' (m), e.g. for plane_of_array().
+#    The 8 header lines are kept as text in load_df.attrs['header'] for write_epw().
+#
+#
+#   TODO:
+#
+#   - make column names better
+#
+#
+@profiled()
+def read_epw(epw_file):
+    # parse the data rows into ladybug data collections in IP units, then use ladybug-pandas
+    # (https://github.com/ladybug-tools/ladybug-pandas) for the dataframe
+    with _epw_buffer(epw_file) as buffer:
+        collections, header = _parse_epw_buffer(buffer)
+    df_ip = lbp.DataFrame(collections)
+    df_ip.attrs['location'] = _epw_location(header[:header.find('\n')])
+    df_ip.attrs['header'] = header
+
+    # drop unwanted columns, & reset the timestamp column
+    df_ip.index.name='timestamp'
+    # df_ip.reset_index(inplace=True)
+    return df_ip
+
+
+@contextlib.contextmanager
+def _epw_buffer(epw_file):
+    # yield a memoryview of the raw .epw bytes without copying them
+    if isinstance(epw_file, (str, os.PathLike)):
+        with open(epw_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            buffer = memoryview(mapped)
+            try:
+                yield buffer
+            finally:
+                buffer.release()  # the map can't close while a view is open
+    elif isinstance(epw_file, (bytes, bytearray, memoryview)):
+        yield memoryview(epw_file)
+    elif hasattr(epw_file, 'getbuffer'):  # io.BytesIO & Streamlit's UploadedFile
+        buffer = epw_file.getbuffer()
+        try:
+            yield buffer
+        finally:
+            buffer.release()
+    elif hasattr(epw_file, 'read'):
+        contents = epw_file.read()
+        yield memoryview(contents.encode('latin-1') if isinstance(contents, str) else contents)
+    else:
+        raise TypeError('read_epw() needs a path, bytes or a file-like object, not {}.'.format(type(epw_file)))
+
+
+def _parse_epw_buffer(buffer):
+    # skip the 8 header lines
+    start = 0
+    head = bytes(buffer[:1 << 16])  # the header is a few kB, only this part is copied
+    for _ in range(8):
+        start = head.find(b'\n', start) + 1
+        if not start:
+            raise ValueError('Not a .epw file, the 8 header lines are missing.')
+
+    # parse the data fields (the 7th field onward, after the date/time & data source fields)
+    body = io.BufferedReader(_MemoryviewReader(buffer[start:]), buffer_size=1 << 16)
+    data = pd.read_csv(body, header=None, usecols=range(6, 35), dtype=np.float64, encoding='latin-1', engine='c')
+    body.close()
+    analysis_period = AnalysisPeriod(is_leap_year=len(data) == 8784)
+
+    collections = []
+    for field_number in data.columns:
+        field = EPWFields.field_by_number(field_number)
+        values = data[field_number].to_numpy()
+        if field.value_type == int:
+            values = np.rint(values).astype(np.int64)
+        if field.name.point_in_time:
+            values = np.roll(values, 1)  # first value is at 1 AM, move the last hour to the start like ladybug does
+        missing = values == 999999999
+        if missing.any():
+            values = np.where(missing, np.nan, values)
+        offset, scale, unit = _epw_ip_conversion(field_number)
+        if scale != 1 or offset != 0:
+            values = values * scale + offset
+        header = Header(data_type=field.name, unit=unit, analysis_period=analysis_period)
+        collections.append(HourlyContinuousCollection(header, values.tolist()))
+    return collections, head[:start].decode('latin-1')
+
+
+def _epw_location(line):
+    # LOCATION,city,state,country,source,WMO station,latitude,longitude,time zone,elevation (m)
+    fields = line.strip().split(',')
+    if fields[0] != 'LOCATION' or len(fields) < 10:
+        raise ValueError('Not a .epw file, the first header line should be LOCATION.')
+    location = dict(zip(['city', 'state', 'country', 'source', 'station'], fields[1:6]))
+    location.update(zip(['latitude', 'longitude', 'time_zone', 'elevation'], map(float, fields[6:10])))
+    return location
+
+
+@functools.lru_cache(maxsize=None)
+def _epw_ip_conversion(field_number):
+    # ladybug's own unit conversion for an .epw field, worked out on two values so it can be applied to a whole
+    # column as ip = si * scale + offset (the EPW unit conversions are all linear). ladybug-pandas' to_ip() skips the
+    # first step of two step conversions, e.g. Wh/m2 -> kWh/m2 -> Btu/ft2 & mm -> m -> in came out 1000x too big,
+    # so it isn't used. ladybug-pandas also swaps in its conversion on the data types it's given, so the conversion
+    # runs on a fresh copy of the field's data type.
+    field = EPWFields.field_by_number(field_number)
+    data_type = DataTypeBase.from_dict(field.name.to_dict())
+    (zero, one), ip_unit = data_type.to_ip([0.0, 1.0], field.unit)
+    return zero, one - zero, ip_unit
+
+
+class _MemoryviewReader(io.RawIOBase):
+    # minimal read-only stream over a memoryview, so pandas can read from it in chunks without a full copy
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), len(self._buffer) - self._position)
+        b[:n] = self._buffer[self._position:self._position + n]
+        self._position += n
+        return n
+
+    def close(self):
+        self._buffer = None
+        super().close()
+
+
+EPW_VARIABLES = [str(EPWFields.field_by_number(n).name) for n in range(6, 35)]  # read_epw() columns, in order
+#####################################################
+
+
+#####################################################
+# share_weather(weather_df) - publish a weather dataframe in shared memory for worker processes
+#
+#   Imports:
+#
+#   from multiprocessing import shared_memory
+#
+#
+#   Inputs:
+#
+#   weather_df - a dataframe with a DatetimeIndex & numeric columns, e.g. from read_epw() (derived columns like
+#                psychrometrics can be added first)
+#
+#
+#   Outputs:
+#
+#   shared - a SharedWeather handle. Pass shared.spec (a small picklable dictionary) to the workers, which call
+#            attach_weather(spec) to get a read-only dataframe backed by the same memory.
+#
+#
+#   Example:
+#
+#   with share_weather(read_epw('Weather Files/CZ06RV2.epw')) as shared:
+#       with ProcessPoolExecutor() as executor:
+#           results = list(executor.map(analyze_building, buildings, [shared.spec] * len(buildings)))
+#
+#
+#   Notes:
+#
+#   -Values are stored as float64, one contiguous block per column, with the timestamps as int64 in front.
+#   -The segment is removed when the handle is closed, garbage collected or when Python exits, whichever comes
+#    first, so segments aren't left behind in /dev/shm.
+#
+def share_weather(weather_df):
+    return SharedWeather(weather_df)
+#####################################################
+
+
+#####################################################
+# publish_epw(epw_path) - read a .epw file once & share it, reusing the segment if it's already published
+#
+#   Inputs:
+#
+#   epw_path - path to a .epw file
+#
+#
+#   Outputs:
+#
+#   shared - a SharedWeather handle. Every building that uses the same climate file gets the same handle, so memory
+#            scales with the number of distinct weather files, not the number of buildings or workers.
+#
+#
+#   Notes:
+#
+#   -Call release_shared_weather() when the portfolio run is done (it also runs when Python exits).
+#
+def publish_epw(epw_path):
+    key = os.path.abspath(epw_path)
+    if key not in _published_weather:
+        _published_weather[key] = share_weather(read_epw(epw_path))
+    return _published_weather[key]
+
+
+def release_shared_weather():
+    for shared in _published_weather.values():
+        shared.close()
+    _published_weather.clear()
+
+
+_published_weather = {}  # absolute .epw path -> SharedWeather
+atexit.register(release_shared_weather)
+#####################################################
+
+
+#####################################################
+# attach_weather(spec) - get a read-only, zero-copy dataframe from shared weather (call this in the worker)
+#
+#   Imports:
+#
+#   from multiprocessing import shared_memory
+#
+#
+#   Inputs:
+#
+#   spec - the spec dictionary of a SharedWeather handle
+#
+#
+#   Outputs:
+#
+#   weather_df - a dataframe of float64 columns with a DatetimeIndex. The data isn't copied & can't be modified.
+#
+#
+#   Notes:
+#
+#   -Each process attaches to a segment once, later calls with the same spec return the same dataframe.
+#   -The owner process must keep its SharedWeather open until the workers are done.
+#
+def attach_weather(spec):
+    if spec['name'] not in _attached_weather:
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        _attached_weather[spec['name']] = (shm, _shared_weather_frame(shm, spec))
+    return _attached_weather[spec['name']][1]
+
+
+def _shared_weather_frame(shm, spec):
+    n_rows = spec['n_rows']
+    n_cols = len(spec['columns'])
+    index = np.ndarray((n_rows,), dtype=np.int64, buffer=shm.buf)
+    values = np.ndarray((n_cols, n_rows), dtype=np.float64, buffer=shm.buf, offset=8 * n_rows)
+    index.flags.writeable = False
+    values.flags.writeable = False
+
+    # values.T is (rows x columns) but each column is still one contiguous block, no copy is made
+    weather_df = pd.DataFrame(values.T, columns=spec['columns'], index=pd.DatetimeIndex(index.view(spec['index_dtype'])),
+                              copy=False)
+    weather_df.index.name = spec['index_name']
+    return weather_df
+
+
+_attached_weather = {}  # segment name -> (SharedMemory, dataframe) in this process
+#####################################################
+
+
+#####################################################
+# stack_weather(epw_paths, labels=None, variables=None, dtype=np.float64) - load many .epw files into a WeatherStack
+#
+#   Inputs:
+#
+#   epw_paths - list of .epw files for one site, e.g. 30 years of AMY files plus a few future-climate TMYs
+#   labels - one label per file (e.g. the year or 'TMY3 2050'), defaults to the file names
+#   variables - list of column names to keep, defaults to every read_epw() column
+#   dtype - dtype of the stacked array
+#
+#
+#   Outputs:
+#
+#   stack - a WeatherStack (see the CLASSES section)
+#
+def stack_weather(epw_paths, labels=None, variables=None, dtype=np.float64):
+    return WeatherStack.from_epws(epw_paths, labels=labels, variables=variables, dtype=dtype)
+#####################################################
+
+
+#####################################################
+# summarize_epw(epw_df) - annual statistics for every column of a read_epw() frame
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   epw_df - a dataframe from read_epw() (or compact_dtypes() of one)
+#
+#
+#   Outputs:
+#
+#   summary_df - DataFrame with one row per variable & columns 'Units', 'Min', '0.4th Pctl', 'Mean', '99.6th Pctl',
+#                'Max'
+#
+#
+#   Notes:
+#
+#   -The 0.4th & 99.6th percentiles of dry bulb are the ASHRAE 99.6% heating & 0.4% cooling design conditions.
+#
+@profiled()
+def summarize_epw(epw_df):
+    values = epw_df.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    # only columns with data, all-NaN columns (e.g. missing snow depth) stay NaN without numpy warnings
+    # (warnings.catch_warnings() isn't safe in read_epws() threads)
+    has_data = ~np.isnan(values).all(axis=0)
+    stats = np.full((5, values.shape[1]), np.nan)
+    values = values[:, has_data]
+    stats[:, has_data] = [np.nanmin(values, axis=0), *np.nanpercentile(values, [0.4, 99.6], axis=0),
+                          np.nanmean(values, axis=0), np.nanmax(values, axis=0)]
+
+    summary_df = pd.DataFrame({
+        'Units': [epw_unit(epw_df, column) for column in epw_df.columns],
+        'Min': stats[0],
+        '0.4th Pctl': stats[1],
+        'Mean': stats[3],
+        '99.6th Pctl': stats[2],
+        'Max': stats[4]
+    }, index=epw_df.columns)
+    return summary_df
+
+
+def epw_unit(epw_df, column):
+    # unit of a read_epw() column, from the ladybug dtype or the units compact_dtypes() saved in attrs
+    unit = getattr(epw_df[column].dtype, 'unit', None)
+    if unit is None:
+        label = epw_df.attrs.get('units', {}).get(column, '')
+        unit = label[label.rfind('(') + 1:-1] if label.endswith(')') else ''
+    return unit
+#####################################################
+
+
+#####################################################
+# solar_position(timestamps, latitude, longitude, time_zone) - sun position for every timestamp at once
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   timestamps - local standard time (no daylight savings), e.g. epw_df.index + pd.Timedelta('30min') for the middle
+#                of each hour of a read_epw() frame
+#   latitude, longitude - site location (deg, north & east are positive)
+#   time_zone - hours from UTC (e.g. -8.0 for PST), as in the .epw LOCATION line
+#
+#
+#   Outputs:
+#
+#   position_df - DataFrame indexed by timestamps with 'Zenith', 'Elevation' & 'Azimuth' (deg, clockwise from north)
+#
+#
+#   Notes:
+#
+#   -NOAA's general solar position equations (Spencer's declination & equation of time), good to about 0.5 deg,
+#    which is plenty for hourly weather data.
+#   -No refraction correction, so the sun is a few minutes late at sunrise & early at sunset.
+#
+def solar_position(timestamps, latitude, longitude, time_zone):
+    timestamps = pd.DatetimeIndex(timestamps)
+    hour = (timestamps.hour + timestamps.minute / 60 + timestamps.second / 3600).to_numpy(dtype=float)
+    year_angle = 2 * np.pi / 365 * (timestamps.dayofyear.to_numpy(dtype=float) - 1 + (hour - 12) / 24)
+
+    declination = (0.006918 - 0.399912 * np.cos(year_angle) + 0.070257 * np.sin(year_angle)
+                   - 0.006758 * np.cos(2 * year_angle) + 0.000907 * np.sin(2 * year_angle)
+                   - 0.002697 * np.cos(3 * year_angle) + 0.00148 * np.sin(3 * year_angle))
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * np.cos(year_angle) - 0.032077 * np.sin(year_angle)
+                                 - 0.014615 * np.cos(2 * year_angle) - 0.040849 * np.sin(2 * year_angle))  # min
+    solar_time = hour + (equation_of_time + 4 * (longitude - 15 * time_zone)) / 60
+    hour_angle = np.radians(15 * (solar_time - 12))
+
+    lat = np.radians(latitude)
+    cos_zenith = np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+    zenith = np.arccos(np.clip(cos_zenith, -1, 1))
+    azimuth = np.arctan2(np.sin(hour_angle),
+                         np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat)) + np.pi
+
+    position_df = pd.DataFrame({
+        'Zenith': np.degrees(zenith),
+        'Elevation': 90 - np.degrees(zenith),
+        'Azimuth': np.degrees(azimuth) % 360
+    }, index=timestamps)
+    return position_df
+#####################################################
+
+
+#####################################################
+# plane_of_array(epw_df, surfaces, albedo=0.2, location=None, ...) - hourly irradiance on many tilted surfaces
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   epw_df - a dataframe from read_epw(), or any hourly frame with the irradiance columns below & a DatetimeIndex of
+#            local standard time at the start of each hour (e.g. a TMY .csv with Hour - 1 as the hour)
+#   surfaces - DataFrame with 'Tilt' (deg from horizontal, 90 = wall) & 'Azimuth' (deg clockwise from north,
+#              180 = south facing) columns, one row per surface, or a list of (tilt, azimuth) pairs
+#   albedo - ground reflectance
+#   location - dict with 'latitude', 'longitude' & 'time_zone', defaults to epw_df.attrs['location'] from read_epw()
+#   columns - (direct normal, diffuse horizontal, global horizontal) column names, e.g. ('DirectNormalIrradiation
+#             W/m^2', 'DiffuseHorizontalRadiation W/m^2', 'GlobalHorizontalIrradiation W/m^2') for a TMY .csv
+#   dtype - np.float32 halves the memory for very many surfaces
+#   chunk_surfaces - surfaces computed at a time, limits the size of the temporary arrays
+#
+#
+#   Outputs:
+#
+#   poa_df - DataFrame of total irradiance on each surface, one row per hour (epw_df's index) & one column per
+#            surface, in the units of the input columns (Btu/ft2 per hour from read_epw())
+#
+#
+#   Notes:
+#
+#   -Beam on the surface plus isotropic sky diffuse plus ground reflected:
+#      poa = DNI max(cos(incidence), 0) + DHI (1 + cos(tilt)) / 2 + GHI albedo (1 - cos(tilt)) / 2
+#   -cos(incidence) = cos(z) cos(tilt) + sin(z) sin(tilt) cos(sun az - surface az) splits into 3 hourly sun terms
+#    times 3 surface terms, so the (surfaces x hours) beam & diffuse parts are two small matrix products (BLAS)
+#    instead of trig on every element - 10,000 surfaces x 8760 hours takes a fraction of a second.
+#   -The sun is placed at the middle of each hour, irradiance in weather files is the total over the hour.
+#   -Isotropic sky, so sky diffuse on sun facing surfaces is a little low (Perez would be a few % higher).
+#
+@profiled()
+def plane_of_array(epw_df, surfaces, albedo=0.2, location=None,
+                   columns=('Direct Normal Radiation', 'Diffuse Horizontal Radiation', 'Global Horizontal Radiation'),
+                   dtype=np.float64, chunk_surfaces=1000):
+    if location is None:
+        location = epw_df.attrs.get('location')
+        if location is None:
+            raise ValueError('No site location, pass location= or use a frame from read_epw().')
+    if not isinstance(surfaces, pd.DataFrame):
+        surfaces = pd.DataFrame(list(surfaces), columns=['Tilt', 'Azimuth'])
+
+    # hourly sun & irradiance terms (3 x hours & 2 x hours)
+    index = pd.DatetimeIndex(epw_df.index)
+    position_df = solar_position(index + pd.Timedelta('30min'), location['latitude'], location['longitude'],
+                                 location['time_zone'])
+    zenith = np.radians(position_df['Zenith'].to_numpy())
+    sun_azimuth = np.radians(position_df['Azimuth'].to_numpy())
+    dni, dhi, ghi = (np.nan_to_num(np.asarray(epw_df[column], dtype=float)) for column in columns)
+    dni = np.where(zenith < np.pi / 2, dni, 0)  # no beam with the sun below the horizon
+    sun = np.array([np.cos(zenith) * dni,
+                    np.sin(zenith) * np.cos(sun_azimuth) * dni,
+                    np.sin(zenith) * np.sin(sun_azimuth) * dni], dtype=dtype)
+    sky = np.array([dhi / 2 + ghi * albedo / 2, dhi / 2 - ghi * albedo / 2], dtype=dtype)
+
+    # per surface terms (surfaces x 3 & surfaces x 2)
+    tilt = np.radians(surfaces['Tilt'].to_numpy(dtype=float))
+    azimuth = np.radians(surfaces['Azimuth'].to_numpy(dtype=float))
+    facing = np.column_stack([np.cos(tilt), np.sin(tilt) * np.cos(azimuth), np.sin(tilt) * np.sin(azimuth)])
+    facing = facing.astype(dtype)
+    view = np.column_stack([np.ones_like(tilt), np.cos(tilt)]).astype(dtype)
+
+    # (surfaces x hours) beam + diffuse, a chunk of surfaces at a time
+    poa = np.empty((len(surfaces), len(index)), dtype=dtype)
+    for start in range(0, len(surfaces), chunk_surfaces):
+        s = slice(start, start + chunk_surfaces)
+        np.matmul(facing[s], sun, out=poa[s])
+        np.maximum(poa[s], 0, out=poa[s])
+        poa[s] += view[s] @ sky
+
+    poa_df = pd.DataFrame(poa.T, index=epw_df.index, columns=surfaces.index, copy=False)
+    return poa_df
+#####################################################
+
+
+#####################################################
+# read_epws(epw_files, max_workers=4, summarize=True, processes=False) - read several .epw files at once, yielding
+# each as it finishes
+#
+#   Imports:
+#
+#   from concurrent.futures import ThreadPoolExecutor, as_completed
+#
+#
+#   Inputs:
+#
+#   epw_files - dict of label: file, or a list of files (labelled by position). A file is anything read_epw()
+#               accepts, e.g. the list from st.file_uploader(..., accept_multiple_files=True)
+#   max_workers - the most files parsed at the same time
+#   summarize - also run summarize_epw() on each file
+#   processes - parse in worker processes instead of threads
+#
+#
+#   Outputs:
+#
+#   generator of (label, epw_df, summary_df, error) tuples in the order the files finish. If a file can't be read,
+#   epw_df & summary_df are None & error is the exception - the other files carry on. summary_df is None if
+#   summarize=False.
+#
+#
+#   Notes:
+#
+#   -Threads share uploads & buffers without copies, but the ladybug half of read_epw() holds the GIL so they mostly
+#    keep the page responsive. processes=True runs files in parallel: buffers are copied to the workers once & the
+#    frames come back as plain float64 columns (ladybug columns don't pickle), units in attrs['units'] like
+#    compact_dtypes().
+#   -A slow or broken file doesn't hold up the others. Stop iterating early & the files that haven't started yet are
+#    cancelled.
+#
+def read_epws(epw_files, max_workers=4, summarize=True, processes=False):
+    if not isinstance(epw_files, dict):
+        epw_files = dict(enumerate(epw_files))
+
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_read_and_summarize_epw, _picklable_epw(epw_file) if processes else epw_file,
+                               summarize, processes): label
+                   for label, epw_file in epw_files.items()}
+        try:
+            for future in as_completed(futures):
+                try:
+                    epw_df, summary_df = future.result()
+                except Exception as error:
+                    yield futures[future], None, None, error
+                else:
+                    yield futures[future], epw_df, summary_df, None
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _read_and_summarize_epw(epw_file, summarize, plain=False):
+    epw_df = read_epw(epw_file)
+    if plain:
+        epw_df = _plain_epw(epw_df)
+    return epw_df, summarize_epw(epw_df) if summarize else None
+
+
+def _picklable_epw(epw_file):
+    # paths go to the worker as they are, anything else as bytes
+    if isinstance(epw_file, (str, os.PathLike, bytes)):
+        return epw_file
+    with _epw_buffer(epw_file) as buffer:
+        return bytes(buffer)
+#####################################################
+
+
+#####################################################
+# compare_epws(epw_files, reference=None, base_temp=65, max_workers=4, processes=True) - compare many weather files
+# variable by variable
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#   import hashlib
+#
+#
+#   Inputs:
+#
+#   epw_files - dict of label: file, or a list of files (labelled by file name, or by path when two files share a
+#               name). A file is anything read_epw() accepts, e.g. .epw paths for each California climate zone.
+#               Labels that still collide (the same path twice, uploads with the same name) raise a ValueError.
+#   reference - label of the file the others are correlated with, defaults to the first file
+#   base_temp - degree day base temperature (F)
+#   max_workers, processes - passed to read_epws() for the files that aren't cached yet
+#
+#
+#   Outputs:
+#
+#   comparison_df - DataFrame indexed by ('File', 'Variable') with one column per statistic: 'Units', 'Min',
+#                   '0.4th Pctl', 'Mean', '99.6th Pctl', 'Max' (as summarize_epw()), 'Jan Mean' ... 'Dec Mean',
+#                   'HDD', 'CDD' & 'Correlation' (hourly, with the reference file's same variable). Files &
+#                   variables are in input & .epw order, so comparison_df.drop(columns='Units').to_numpy()
+#                   .reshape(n_files, n_variables, -1) is the files x variables x statistics tensor.
+#
+#
+#   Notes:
+#
+#   -Each file is parsed once per session: its statistics, monthly means, daily mean dry bulb & hourly values are
+#    cached by path/size/modified time (or a hash of the contents for bytes & uploads). Adding a file to a
+#    comparison only parses the new file, the rest comes from the cache.
+#   -Degree days are from daily mean dry bulb & only filled in on the dry bulb row.
+#   -Hours are matched by month/day/hour (leap days dropped), so TMY files of different years line up. Correlation is
+#    NaN for a variable missing in either file or constant in either file (e.g. no snow).
+#
+def compare_epws(epw_files, reference=None, base_temp=65, max_workers=4, processes=True):
+    if not isinstance(epw_files, dict):
+        epw_files = list(epw_files)
+        labels = [_epw_label(epw_file, i) for i, epw_file in enumerate(epw_files)]
+        labels = [_epw_label(epw_file, i, full_path=labels.count(label) > 1)
+                  for i, (epw_file, label) in enumerate(zip(epw_files, labels))]  # same file name, different folders
+        if len(set(labels)) < len(labels):
+            raise ValueError('Duplicate weather file labels: {}. Pass a dict of label: file.'.format(
+                ', '.join(sorted({str(label) for label in labels if labels.count(label) > 1}))))
+        epw_files = dict(zip(labels, epw_files))
+    keys = {label: _epw_cache_key(epw_file) for label, epw_file in epw_files.items()}
+
+    # parse the files that aren't cached yet, in worker processes
+    missing = {label: epw_files[label] for label, key in keys.items() if key not in _epw_profiles}
+    for label, epw_df, summary_df, error in read_epws(missing, max_workers=max_workers,
+                                                       processes=processes and len(missing) > 1):
+        if error is not None:
+            raise ValueError('Could not read {}: {}'.format(label, error)) from error
+        _epw_profiles[keys[label]] = _epw_profile(epw_df, summary_df)
+
+    # stack the cached profiles & fill in the files x variables x statistics tensor
+    profiles = [_epw_profiles[keys[label]] for label in epw_files]
+    reference = list(epw_files)[0] if reference is None else reference
+    reference_hourly = _epw_profiles[keys[reference]]['hourly']
+    stats = np.stack([np.column_stack([profile['summary'], profile['monthly'], _degree_days(profile, base_temp),
+                                       _hourly_correlation(profile['hourly'], reference_hourly)])
+                      for profile in profiles])  # files x variables x statistics
+
+    columns = (['Min', '0.4th Pctl', 'Mean', '99.6th Pctl', 'Max']
+               + [month + ' Mean' for month in ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct',
+                                                'Nov', 'Dec']]
+               + ['HDD', 'CDD', 'Correlation'])
+    index = pd.MultiIndex.from_product([list(epw_files), EPW_VARIABLES], names=['File', 'Variable'])
+    comparison_df = pd.DataFrame(stats.reshape(-1, stats.shape[2]), index=index, columns=columns)
+    comparison_df.insert(0, 'Units', np.concatenate([profile['units'] for profile in profiles]))
+    return comparison_df
+
+
+_epw_profiles = {}  # _epw_cache_key() -> _epw_profile(), see compare_epws()
+
+
+def _epw_label(epw_file, position, full_path=False):
+    if isinstance(epw_file, (str, os.PathLike)):
+        return os.path.normpath(epw_file) if full_path else os.path.basename(epw_file)
+    return getattr(epw_file, 'name', position)
+
+
+def _epw_cache_key(epw_file):
+    # path, size & modified time for files on disk, a hash of the contents for anything else
+    if isinstance(epw_file, (str, os.PathLike)):
+        stat = os.stat(epw_file)
+        return os.path.abspath(epw_file), stat.st_size, stat.st_mtime_ns
+    with _epw_buffer(epw_file) as buffer:
+        return hashlib.sha1(buffer).hexdigest()
+
+
+def _epw_profile(epw_df, summary_df):
+    # everything compare_epws() needs from one file, small enough to keep around
+    index = pd.DatetimeIndex(epw_df.index)
+    keep = ~((index.month == 2) & (index.day == 29))
+    hourly = epw_df.to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+    months = (np.arange(1, 13)[:, None] == index.month.to_numpy()[keep]).astype(float)  # 12 x hours
+    with np.errstate(invalid='ignore'):
+        monthly = months @ np.nan_to_num(hourly) / (months @ ~np.isnan(hourly))  # NaN with no data, no warnings
+    return {
+        'summary': summary_df[['Min', '0.4th Pctl', 'Mean', '99.6th Pctl', 'Max']].to_numpy(),
+        'units': summary_df['Units'].to_numpy(),
+        'monthly': monthly.T,
+        'daily_dry_bulb': hourly[:, EPW_VARIABLES.index('Dry Bulb Temperature')].reshape(-1, 24).mean(axis=1),
+        'hourly': hourly
+    }
+
+
+def _degree_days(profile, base_temp):
+    degree_days = np.full((len(EPW_VARIABLES), 2), np.nan)
+    daily = profile['daily_dry_bulb']
+    degree_days[EPW_VARIABLES.index('Dry Bulb Temperature')] = [np.clip(base_temp - daily, 0, None).sum(),
+                                                                np.clip(daily - base_temp, 0, None).sum()]
+    return degree_days
+
+
+def _hourly_correlation(hourly, reference_hourly):
+    # Pearson correlation of each column with the same column of the reference, over hours both have
+    both = ~np.isnan(hourly) & ~np.isnan(reference_hourly)
+    count = both.sum(axis=0)
+    x = np.where(both, hourly, 0)
+    y = np.where(both, reference_hourly, 0)
+    constant = ((np.where(both, hourly, -np.inf).max(axis=0) == np.where(both, hourly, np.inf).min(axis=0))
+                | (np.where(both, reference_hourly, -np.inf).max(axis=0)
+                   == np.where(both, reference_hourly, np.inf).min(axis=0)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = np.where(both, x - x.sum(axis=0) / count, 0)
+        y = np.where(both, y - y.sum(axis=0) / count, 0)
+        correlation = (x * y).sum(axis=0) / np.sqrt((x * x).sum(axis=0) * (y * y).sum(axis=0))
+    correlation[constant] = np.nan  # round off in the means would make these tiny numbers instead of NaN
+    return correlation
+#####################################################
+
+
+#####################################################
+# write_epw(epw_df, epw_file, comments=None) - write a weather dataframe back out as a .epw file
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#   from ladybug.epw import EPWFields
+#
+#
+#   Inputs:
+#
+#   epw_df - a dataframe from read_epw(), morph_epw() or compact_dtypes() of one, with all 29 .epw data columns
+#            (EPW_VARIABLES) in IP or SI units
+#   epw_file - path of the .epw file to write, or a file-like object (e.g. io.BytesIO for st.download_button())
+#   comments - text for the COMMENTS 2 header line, e.g. what was done to the weather
+#
+#
+#   Outputs:
+#
+#   none, the file is written
+#
+#
+#   Notes:
+#
+#   -Whole columns are converted back to the .epw SI units with the same linear conversions read_epw() uses & turned
+#    into text with numpy string operations, no ladybug objects & no per value formatting. Decimals are written as
+#    integer digits plus the shortest fraction that gives back the value (up to 6 places), so read_epw(write_epw(df))
+#    gives back df exactly.
+#   -The header lines come from epw_df.attrs['header'] (read_epw() keeps them), or a minimal header is made from
+#    epw_df.attrs['location']. Design conditions etc. in the header aren't recalculated.
+#   -NaN is written as 999999999, the missing value read_epw() turns back into NaN. The year, minute & data source
+#    flags aren't in the dataframe, so the year comes from the index, the minute is 0 & the flags are the generic
+#    ones ladybug writes.
+#
+@profiled()
+def write_epw(epw_df, epw_file, comments=None):
+    header, newline = _epw_write_header(epw_df, comments)
+    _write_epw_text(epw_file, header, list(_epw_text_columns(epw_df).values()), newline)
+
+
+def _epw_write_header(epw_df, comments=None):
+    header = epw_df.attrs.get('header') or _epw_header(epw_df.attrs.get('location'))
+    newline = '\r\n' if '\r\n' in header else '\n'
+    if comments is not None:
+        header = ''.join('COMMENTS 2,{}{}'.format(comments, newline) if line.startswith('COMMENTS 2') else line
+                         for line in header.splitlines(keepends=True))
+    return header, newline
+
+
+def _epw_text_columns(epw_df):
+    # text of each .epw field, the date/time & data source fields are one piece (key None)
+    missing = [column for column in EPW_VARIABLES if column not in epw_df.columns]
+    if missing:
+        raise ValueError('write_epw() needs all the .epw columns, {} missing.'.format(', '.join(missing)))
+    index = pd.DatetimeIndex(epw_df.index)
+    date_time = [index.year, index.month, index.day, index.hour + 1, np.zeros(len(index), dtype=int)]
+    text = {None: _join_epw_fields([np.asarray(values).astype(StringDType()) for values in date_time]
+                                   + [np.full(len(index), '?9?9?9?9E0?9?9?9?9?9?9?9?9?9?9?9?9?9?9?9*9*9?9?9?9',
+                                              dtype=StringDType())])}
+    for column in EPW_VARIABLES:
+        text[column] = _epw_field_text(epw_df[column].to_numpy(dtype=np.float64, na_value=np.nan), column,
+                                       epw_unit(epw_df, column))
+    return text
+
+
+def _epw_field_text(values, column, unit):
+    # one column as .epw text, in the field's SI units
+    field_number = EPW_VARIABLES.index(column) + 6
+    field = EPWFields.field_by_number(field_number)
+    offset, scale, ip_unit = _epw_ip_conversion(field_number)
+    if unit == ip_unit and unit != field.unit:
+        values = (values - offset) / scale
+    elif unit != field.unit:
+        raise ValueError("{} is in '{}', write_epw() needs {} or {}.".format(column, unit, ip_unit, field.unit))
+    if field.name.point_in_time:
+        values = np.roll(values, -1)  # undo read_epw()'s shift, the first value is at 1 AM
+    values = np.where(np.isnan(values), 999999999, values)
+    if field.value_type != int:
+        return _decimal_text(values)
+    text = np.rint(values).astype(np.int64).astype(StringDType())
+    return np.strings.zfill(text, 9) if column == 'Present Weather Codes' else text
+
+
+def _decimal_text(values):
+    # shortest fixed point text that gives back the values, built from integers (much faster than formatting floats)
+    values = np.round(values, 8) + 0  # undo the unit conversion round off, & no -0
+    for decimals in range(7):
+        if np.array_equal(np.round(values, decimals), values):
+            break
+    else:
+        return values.astype(StringDType())
+    digits = np.rint(np.abs(values) * 10 ** decimals).astype(np.int64)
+    text = np.strings.add(np.where(values < 0, '-', '').astype(StringDType()),
+                          (digits // 10 ** decimals).astype(StringDType()))
+    if decimals:
+        fraction = np.strings.zfill((digits % 10 ** decimals).astype(StringDType()), decimals)
+        text = np.strings.add(np.strings.add(text, '.'), fraction)
+    return text
+
+
+def _join_epw_fields(pieces):
+    text = pieces[0]
+    for piece in pieces[1:]:
+        text = np.strings.add(np.strings.add(text, ','), piece)
+    return text
+
+
+def _write_epw_text(epw_file, header, pieces, newline):
+    text = header + newline.join(_join_epw_fields(pieces).tolist()) + newline
+    if isinstance(epw_file, (str, os.PathLike)):
+        with open(epw_file, 'w', encoding='latin-1', newline='') as f:
+            f.write(text)
+    elif isinstance(epw_file, io.TextIOBase):
+        epw_file.write(text)
+    else:
+        epw_file.write(text.encode('latin-1'))
+
+
+def _epw_header(location):
+    # minimal header for a frame without read_epw()'s header lines
+    if location is None:
+        raise ValueError("No .epw header, use a frame from read_epw() or set epw_df.attrs['location'].")
+    return ('LOCATION,{city},{state},{country},{source},{station},{latitude:g},{longitude:g},{time_zone:g},'
+            '{elevation:g}\n'.format(**location)
+            + 'DESIGN CONDITIONS,0\nTYPICAL/EXTREME PERIODS,0\nGROUND TEMPERATURES,0\n'
+            + 'HOLIDAYS/DAYLIGHT SAVINGS,No,0,0,0\nCOMMENTS 1,\nCOMMENTS 2,\nDATA PERIODS,1,1,Data,Sunday, 1/ 1,12/31\n')
+#####################################################
+
+
+#####################################################
+# morph_epw(epw_df, dry_bulb_shift=0, dry_bulb_stretch=1, humidity_scale=1, radiation_scale=1) /
+# morph_epws(epw_file, scenarios, out_dir) - future climate weather files by shifting & stretching a base file
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   epw_df - a dataframe from read_epw()
+#   dry_bulb_shift - change in monthly mean dry bulb (F)
+#   dry_bulb_stretch - factor on each hour's difference from the monthly mean dry bulb (> 1 = bigger swings)
+#   humidity_scale - factor on relative humidity (capped at 100%), dew point follows the new dry bulb & humidity
+#   radiation_scale - factor on global horizontal, direct normal & diffuse horizontal radiation
+#                     Each factor is one number or 12 monthly values (Jan - Dec).
+#   epw_file - the base .epw file (anything read_epw() accepts) or a dataframe from read_epw()
+#   scenarios - dict of name: dict of the factors above, e.g. {'2050 +3F': {'dry_bulb_shift': 3}, ...}, or a
+#               DataFrame with one row per scenario & factor columns (monthly values as lists)
+#   out_dir - folder for the scenario files, written as '<name>.epw'
+#
+#
+#   Outputs:
+#
+#   morphed_df - morph_epw(): a copy of epw_df (float64 columns, units in attrs['units']) with the morphed columns
+#   epw_paths - morph_epws(): dict of name: path of each scenario file written
+#
+#
+#   Notes:
+#
+#   -Shift & stretch after Belcher, Hacker & Powell (2005): T' = T + shift + (stretch - 1) (T - monthly mean T)
+#   -morph_epws() morphs all the scenarios at once as (scenarios x hours) arrays. The base file is parsed & turned into
+#    .epw text once, each scenario only re-formats the 6 morphed columns (MORPHED_EPW_VARIABLES). The scenario name
+#    goes in the COMMENTS 2 header line.
+#   -Values that are missing (NaN or the field's missing value, e.g. 9999 radiation) are left alone.
+#
+def morph_epw(epw_df, dry_bulb_shift=0, dry_bulb_stretch=1, humidity_scale=1, radiation_scale=1):
+    base_df = _plain_epw(epw_df)
+    factors = dict(dry_bulb_shift=dry_bulb_shift, dry_bulb_stretch=dry_bulb_stretch, humidity_scale=humidity_scale,
+                   radiation_scale=radiation_scale)
+    morphed_df = base_df.copy()
+    for column, values in _morph_arrays(base_df, [factors]).items():
+        morphed_df[column] = values[0]
+    return morphed_df
+
+
+@profiled()
+def morph_epws(epw_file, scenarios, out_dir, chunk_scenarios=100):
+    base_df = _plain_epw(epw_file if isinstance(epw_file, pd.DataFrame) else read_epw(epw_file))
+    if isinstance(scenarios, pd.DataFrame):
+        scenarios = scenarios.to_dict(orient='index')
+    os.makedirs(out_dir, exist_ok=True)
+
+    # format the base file once & join the columns that don't change, so each scenario only formats & joins the
+    # morphed columns
+    segments, unchanged = [], []
+    for column, text in _epw_text_columns(base_df).items():
+        if column in MORPHED_EPW_VARIABLES:
+            if unchanged:
+                segments.append(_join_epw_fields(unchanged))
+                unchanged = []
+            segments.append(column)
+        else:
+            unchanged.append(text)
+    if unchanged:
+        segments.append(_join_epw_fields(unchanged))
+
+    epw_paths = {}
+    names = list(scenarios)
+    for start in range(0, len(names), chunk_scenarios):
+        chunk = names[start:start + chunk_scenarios]
+        morphed = _morph_arrays(base_df, [scenarios[name] for name in chunk])
+        for i, name in enumerate(chunk):
+            pieces = [_epw_field_text(morphed[segment][i], segment, epw_unit(base_df, segment))
+                      if isinstance(segment, str) else segment for segment in segments]
+            header, newline = _epw_write_header(base_df, comments='Morphed: {}'.format(name))
+            epw_paths[name] = os.path.join(out_dir, '{}.epw'.format(name))
+            _write_epw_text(epw_paths[name], header, pieces, newline)
+    return epw_paths
+
+
+MORPHED_EPW_VARIABLES = ['Dry Bulb Temperature', 'Relative Humidity', 'Dew Point Temperature',
+                         'Global Horizontal Radiation', 'Direct Normal Radiation', 'Diffuse Horizontal Radiation']
+
+
+def _plain_epw(epw_df):
+    # float64 copy with units in attrs instead of ladybug columns (they don't pickle & can't hold morphed values)
+    return compact_dtypes(epw_df, plan=dict.fromkeys(epw_df.columns, 'float64'))
+
+
+def _morph_arrays(base_df, factors):
+    # morphed (scenarios x hours) arrays for each changed column, factors is a list of dicts (one per scenario)
+    month = pd.DatetimeIndex(base_df.index).month.to_numpy() - 1
+
+    def monthly(name, default):
+        # scenarios x hours factor, from one number or 12 monthly values per scenario
+        values = np.array([np.broadcast_to(np.asarray(f.get(name, default), dtype=float), 12) for f in factors])
+        return values[:, month]
+
+    def column(name):
+        values = base_df[name].to_numpy(dtype=np.float64)
+        field_number = EPW_VARIABLES.index(name) + 6
+        offset, scale, ip_unit = _epw_ip_conversion(field_number)
+        missing_value = EPWFields.field_by_number(field_number).missing
+        if epw_unit(base_df, name) == ip_unit:
+            missing_value = missing_value * scale + offset
+        return values, np.isnan(values) | np.isclose(values, missing_value)
+
+    morphed = {}
+    dry_bulb, dry_bulb_missing = column('Dry Bulb Temperature')
+    monthly_mean = (np.bincount(month, np.where(dry_bulb_missing, 0, dry_bulb), minlength=12)
+                    / np.bincount(month, ~dry_bulb_missing, minlength=12))[month]
+    new_dry_bulb = (dry_bulb + monthly('dry_bulb_shift', 0)
+                    + (monthly('dry_bulb_stretch', 1) - 1) * (dry_bulb - monthly_mean))
+    morphed['Dry Bulb Temperature'] = np.where(dry_bulb_missing, dry_bulb, new_dry_bulb)
+
+    humidity, humidity_missing = column('Relative Humidity')
+    new_humidity = np.clip(humidity * monthly('humidity_scale', 1), 0, 100)
+    morphed['Relative Humidity'] = np.where(humidity_missing, humidity, new_humidity)
+
+    # dew point moves by the change in dew point the Magnus formula gives for the new dry bulb & humidity, so an
+    # unchanged scenario gives back the file's own dew points
+    def magnus_dew_point(dry_bulb, humidity):
+        dry_bulb_c = (dry_bulb - 32) / 1.8
+        gamma = np.log(np.maximum(humidity, 1) / 100) + 17.625 * dry_bulb_c / (dry_bulb_c + 243.04)
+        return 243.04 * gamma / (17.625 - gamma) * 1.8 + 32
+
+    dew_point, dew_point_missing = column('Dew Point Temperature')
+    new_dew_point = np.minimum(dew_point + (magnus_dew_point(new_dry_bulb, new_humidity)
+                                            - magnus_dew_point(dry_bulb, humidity)), new_dry_bulb)
+    morphed['Dew Point Temperature'] = np.where(dew_point_missing | dry_bulb_missing | humidity_missing, dew_point,
+                                                new_dew_point)
+
+    radiation_scale = monthly('radiation_scale', 1)
+    for name in MORPHED_EPW_VARIABLES[3:]:
+        radiation, radiation_missing = column(name)
+        morphed[name] = np.where(radiation_missing, radiation, radiation * radiation_scale)
+    return morphed
+#####################################################
+
+###########################################################################
+# PLOTTING FUNCTIONS:
+
+# testing
+
+#####################################################
+# plot_time(load_df) - variable vs. time plotting function
+#
+#   Imports:
+#
+#   import pandas as pd
+#   import datetime
+#   import plotly.graph_objects as go (IF USING PLOTLY)
+#   from matplotlib import pyplot as plt (IF USING MATPLOTLIB)
+#
+#
+#   Inputs:
+#
+#   load_df - a pandas DataFrame object with timestamps in the first column & some variable of interest in the second column.
+#
+#
+#   Outputs:
+#
+#   No outputs. This function just draws a plot. We could change it so it returns a matplotlib object (figure or axes) and then use that to plot later.
+#
+#
+#   TODO:
+#
+#   -Make more flexible/robust
+#   -Show interpolated data in a different color
+#
+# PLOTLY.GRAPH_OBJECTS VERSION - STABLE
+@profiled()
+def plot_time(df):
+    # import pandas as pd
+    # import plotly.graph_objects as go
+    # import datetime
+    print('\nPLOT_TIME FUNCTION ACTIVATED') # let the user know this function has been called
+
+    # print some information about the data being plotted
+    print("\n HERE'S A PREVIEW OF THE DATA YOU'RE PLOTTING:")
+    print(df)
+    print()
+    print(df.dtypes)
+
+    # convert timestamps to datetime64 objects
+    print('\nconverting timestamp data...')
+    timestamps = pd.to_datetime(df.iloc[:, 0])
+    print('TIMESTAMP DATA CONVERTED FROM', type(df.iloc[0, 0]), 'TO', type(timestamps[0]))
+    df.iloc[:, 0] = timestamps
+    print(df.iloc[:, 0].head())
+
+    # use graph_objects to create the figure
+    fig = go.Figure()
+
+    # create traces for each column vs. time
+    for i in range(df.shape[1] - 1):
+        fig.add_trace(go.Scatter(x=timestamps, y=df.iloc[:, i + 1],
+                                 visible='legendonly',
+                                 mode='lines',
+                                 name=df.columns[i + 1]))
+        #TODO add label for max value
+        # fig.add_annotation(x=2, y=5,
+        #                    text="Text annotation with arrow",
+        #                    showarrow=True,
+        #                    arrowhead=1)
+
+    fig.update_layout(showlegend=True)    # force the legend for single-trace plots
+    fig.update_layout(legend_title_text='Points:')
+    fig.update_layout(hovermode='x')
+    # fig.show()    # changed this to return a fig instead of plotting. can change back if we want.
+    return fig
+#
+# # PLOTLY.EXPRESS VERSION - STABLE
+# def plot_time(load_df):
+#     # import pandas as pd
+#     # import plotly.express as px
+#     # import datetime
+#     print('\nPLOT_TIME FUNCTION ACTIVATED') # let the user know this function has been called
+#
+#     pd.options.plotting.backend = "plotly"  # activate Plotly backend
+#     print('plotly backend activated...')
+#
+#     print("\n HERE'S A PREVIEW OF THE DATA YOU'RE PLOTTING:")
+#     print(load_df)   # print some information about the data being plotted
+#     print()
+#     print(load_df.dtypes)
+#
+#     print('\nconverting timestamp data...')  # convert timestamps to datetime64 objects
+#     timestamp = pd.to_datetime(load_df.iloc[:, 0])
+#     print('TIMESTAMP DATA CONVERTED FROM', type(load_df.iloc[0, 0]), 'TO', type(timestamp[0]))
+#     load_df.iloc[:, 0] = timestamp
+#     print(load_df.iloc[:, 0].head())
+#
+#     y_values = load_df.iloc[:,1] # values in the 2nd column will be plotted on the y-axis
+#     x_values = load_df.iloc[:,0] # timestamps on the x-axis
+#
+#     y_label = load_df.columns[1] # name of 2nd column is y-axis label
+#     x_label = load_df.columns[0] # name of 1st column is x-axis label
+#     xy_labels = {'x': x_label, 'y': y_label}    # create a dictionary of the labels to pass to px.line
+#
+#     fig = px.line(x=x_values, y=y_values, labels=xy_labels, title=y_label + ' vs. ' + x_label)  # plot using plotly
+#     fig.show()
+#     return
+#
+# MATPLOTLIB VERSION - STABLE
+# def plot_time(load_df):
+#     # import pandas as pd
+#     # from matplotlib import pyplot as plt
+#
+#     y_values = load_df.iloc[:,1]  # Values in the 2nd column will be plotted on the y-axis
+#     x_values = range(len(y_values))  # x-axis is just a range of the same length as y_values
+#
+#     x_ticks = [x*796.364 for x in range(12)]    # create x ticks corresponding to months
+#     months = ['J','F','M','A','M','J','J','A','S','O','N','D']  # list of months
+#
+#     y_label = load_df.columns[1]  # Name of 2nd column is y-axis label
+#     x_label = load_df.columns[0]  # Name of 1st column is x-axis label
+#
+#     fig, ax = plt.subplots()  # Create a figure containing a single axes.
+#     ax.set_title(y_label + ' vs. ' + x_label)  # set the title
+#     ax.set_xlabel(x_label)  # label the x-axis
+#     ax.set_ylabel(y_label)  # label the y-axis
+#     ax.set_xticks(x_ticks)  # set and label x-ticks
+#     ax.set_xticklabels(months)
+#     ax.plot(x_values, y_values, lw=0.1)  # plot using matplotlib
+#     plt.show()  # show the plot
+#     return
+#####################################################
+
+
+#####################################################
+# plot_time_fast(df, columns=None, preview=False, timestamp_format=None, cache_key=None) - quiet plot_time()
+#
+#   Imports:
+#
+#   import pandas as pd
+#   import plotly.graph_objects as go
+#
+#
+#   Inputs:
+#
+#   df - a pandas DataFrame object with timestamps in the first column & variables of interest in the others
+#   columns - list of column names to plot. None = all of them.
+#   preview - print a preview of the data & its dtypes, like plot_time() does
+#   timestamp_format - explicit timestamp format, see parse_timestamps()
+#   cache_key - identifies the data source so its timestamp format is only detected once, e.g. the file name.
+#               None = detect the format every call (different sources share column names, so they can't share a
+#               cached format).
+#
+#
+#   Outputs:
+#
+#   fig - a Plotly figure
+#
+#
+#   Notes:
+#
+#   -Unlike plot_time(), df is never modified & nothing is printed unless preview=True.
+#   -Timestamps that are already datetime64 aren't parsed again.
+#
+@profiled()
+def plot_time_fast(df, columns=None, preview=False, timestamp_format=None, cache_key=None):
+    if preview:
+        print("\n HERE'S A PREVIEW OF THE DATA YOU'RE PLOTTING:")
+        print(df.head())
+        print()
+        print(df.dtypes)
+
+    timestamps = parse_timestamps(df.iloc[:, 0], timestamp_format=timestamp_format, cache_key=cache_key)
+    if columns is None:
+        columns = df.columns[1:]
+
+    # create traces for the requested columns vs. time
+    fig = go.Figure([go.Scatter(x=timestamps.to_numpy(), y=df[column].to_numpy(),
+                                visible='legendonly',
+                                mode='lines',
+                                name=column) for column in columns])
+    fig.update_layout(showlegend=True, legend_title_text='Points:', hovermode='x')
+    return fig
+#####################################################
+
+
+PLOT_X_DENSITY_POINTS = 50_000  # plot_x() switches to plot_x_density() above this many points
+
+
+#####################################################
+# plot_x_density(df, bins=(200, 100), percentiles=(10, 90)) - plot_x() for millions of points
+#
+#   Imports:
+#
+#   import numpy as np
+#   import plotly.graph_objects as go
+#
+#
+#   Inputs:
+#
+#   df - 'nx2' pandas DataFrame object with x-values in the first column & y-values in the second column
+#   bins - number of (x, y) bins in the density grid
+#   percentiles - the low & high percentiles of y drawn as an envelope around the median in each x bin
+#
+#
+#   Outputs:
+#
+#   fig - a Plotly figure with a point count heatmap, the binned median & percentile envelope & an OLS trendline
+#
+#
+#   Notes:
+#
+#   -The points are counted with np.histogram2d() & the figure only holds the grid & one point per x bin per line,
+#    so its size depends on bins, not on the number of points. A year of 1 minute data is ~0.3 MB instead of ~11 MB.
+#   -The median & percentiles of every x bin come from one sort by (x bin, y), the same linear interpolation as
+#    np.percentile(). Empty x bins are left as gaps.
+#   -The trendline is the least squares fit px.scatter(trendline='ols') draws, from np.polyfit().
+#   -Points with NaN/inf in either column are skipped.
+#
+@profiled()
+def plot_x_density(df, bins=(200, 100), percentiles=(10, 90)):
+    x_label = df.columns[0]
+    y_label = df.columns[1]
+    x_values = pd.to_numeric(df.iloc[:, 0]).to_numpy(dtype=float)
+    y_values = pd.to_numeric(df.iloc[:, 1]).to_numpy(dtype=float)
+    valid = np.isfinite(x_values) & np.isfinite(y_values)
+    x_values = x_values[valid]
+    y_values = y_values[valid]
+
+    # count the points in each cell - empty cells are left transparent
+    counts, x_edges, y_edges = np.histogram2d(x_values, y_values, bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+
+    # median & percentiles of y in each x bin - y sorted within each bin, then read at the interpolated positions
+    n_x = len(x_centers)
+    x_bins = np.clip(np.searchsorted(x_edges, x_values, side='right') - 1, 0, n_x - 1)  # last bin includes its edge
+    y_sorted = y_values[np.lexsort((y_values, x_bins))]
+    bin_counts = np.bincount(x_bins, minlength=n_x)
+    bin_starts = np.cumsum(bin_counts) - bin_counts
+    position = bin_starts + np.array([percentiles[0], 50, percentiles[1]])[:, None] / 100 * (bin_counts - 1)
+    low = np.floor(position).astype(np.int64).clip(0, max(len(y_sorted) - 1, 0))
+    high = np.minimum(low + 1, bin_starts + bin_counts - 1).clip(0, max(len(y_sorted) - 1, 0))
+    if len(y_sorted):
+        y_bands = y_sorted[low] + (position - low) * (y_sorted[high] - y_sorted[low])
+        y_bands[:, bin_counts == 0] = np.nan
+    else:
+        y_bands = np.full((3, n_x), np.nan)
+
+    # least squares trendline
+    if len(x_values) > 1 and np.ptp(x_values) > 0:
+        slope, intercept = np.polyfit(x_values, y_values, 1)
+        r_squared = np.corrcoef(x_values, y_values)[0, 1] ** 2
+    else:
+        slope, intercept, r_squared = np.nan, np.nan, np.nan
+
+    fig = go.Figure([
+        go.Heatmap(x=x_centers, y=y_centers, z=np.where(counts > 0, counts, np.nan).T, colorscale='Blues',
+                   colorbar=dict(title=dict(text='Points')),
+                   hovertemplate=x_label + ': %{x:,.4g}<br>' + y_label + ': %{y:,.4g}<br><b>%{z:,.0f} points</b>'
+                                 '<extra></extra>'),
+        go.Scatter(x=x_centers, y=y_bands[2], mode='lines', line=dict(color='#F58518', width=1, dash='dot'),
+                   name='{:g}th percentile'.format(percentiles[1])),
+        go.Scatter(x=x_centers, y=y_bands[0], mode='lines', line=dict(color='#F58518', width=1, dash='dot'),
+                   fill='tonexty', fillcolor='rgba(245, 133, 24, 0.15)',
+                   name='{:g}th percentile'.format(percentiles[0])),
+        go.Scatter(x=x_centers, y=y_bands[1], mode='lines', line=dict(color='#F58518', width=2), name='Median'),
+        go.Scatter(x=x_edges[[0, -1]], y=slope * x_edges[[0, -1]] + intercept, mode='lines',
+                   line=dict(color='#E45756', width=2),
+                   name='OLS trendline<br>y = {:.4g}x + {:.4g}<br>R<sup>2</sup> = {:.4f}'.format(slope, intercept,
+                                                                                              r_squared))
+    ])
+    fig.update_layout(
+        title=dict(text=y_label + ' vs. ' + x_label + ' ({:,} points)'.format(len(x_values))),
+        xaxis=dict(title=dict(text=x_label)),
+        yaxis=dict(title=dict(text=y_label)),
+        legend=dict(x=1.12)  # clear of the colorbar
+    )
+    return fig
+#####################################################
+
+
+#####################################################
+# plot_x(load_df, density_threshold=PLOT_X_DENSITY_POINTS) - variable vs. variable plotting function
+#
+#   Imports:
+#
+#   import pandas as pd
+#   import plotly.express as px (IF USING PLOTLY)
+#   from matplotlib import pyplot as plt (IF USING MATPLOTLIB)
+#
+#
+#   Inputs:
+#
+#   load_df - 'nx2' pandas DataFrame object with x-values in the first column & y-values in the second column.
+#   density_threshold - above this many points the plot is drawn with plot_x_density() instead of one marker per
+#                       point. None = always plot every point.
+#
+#
+#   Outputs:
+#
+#   No outputs. This function just draws a plot. We could change it so it returns a matplotlib object (figure or axes) and then use that to plot later.
+#
+# PLOTLY VERSION - STABLE
+def plot_x(df, density_threshold=PLOT_X_DENSITY_POINTS):
+    # import pandas as pd
+    # import plotly.express as px
+    print("\n HERE'S A PREVIEW OF THE DATA YOU'RE PLOTTING:")  # show a preview of the data passed to the function
+    print(df)   # print some information about the data being plotted
+    print()
+    print(df.dtypes)
+
+    x_values = df.iloc[:, 0]  # Values in the 1st column will be plotted on the x-axis
+    y_values = df.iloc[:, 1]  # Values in the 2nd column will be plotted on the y-axis
+
+    x_label = df.columns[0]  # Name of 1st column is x-axis label
+    y_label = df.columns[1]  # Name of 2nd column is y-axis label
+    xy_labels = {'x': x_label, 'y': y_label}    # create a dictionary of the labels to pass to px.line
+
+    if (type(x_values[1]) == str) or (type(y_values[1]) == str):    # do a quick check that the data is plottable (i.e. not a string - this could be more robust)
+        print("\nERROR: Please make sure you are plotting numerical data.\n")
+        return
+
+    if density_threshold is not None and len(df) > density_threshold:   # too many markers for the browser, bin them
+        plot_x_density(df).show()
+        return
+
+    fig = px.scatter(x=x_values, y=y_values, labels=xy_labels, title=y_label + ' vs. ' + x_label, trendline="ols")  # plot using plotly
+    fig.show()
+    return
+#
+# MATPLOTLIB VERSION - STABLE
+# def plot_x(load_df):
+#     # import pandas as pd
+#     # from matplotlib import pyplot as plt
+#
+#     print("\n HERE'S A PREVIEW OF THE DATA YOU'RE PLOTTING:")  # show a preview of the data passed to the function
+#     print(load_df)   # print some information about the data being plotted
+#     print()
+#     print(load_df.dtypes)
+#
+#     x_values = load_df.iloc[:, 0]  # Values in the 1st column will be plotted on the x-axis
+#     y_values = load_df.iloc[:, 1]  # Values in the 2nd column will be plotted on the y-axis
+#
+#     x_label = load_df.columns[0]  # Name of 1st column is x-axis label
+#     y_label = load_df.columns[1]  # Name of 2nd column is y-axis labelxy_labels = {'x': x_label, 'y': y_label}    # create a dictionary of the labels to pass to px.line
+#
+#     # make the plot
+#     fig, ax = plt.subplots()  # Create a figure containing a single axes.
+#     ax.set_title(str(y_label) + ' vs. ' + str(x_label))  # set the title
+#     ax.set_xlabel(x_label)  # label the x-axis
+#     ax.set_ylabel(y_label)  # label the y-axis
+#     ax.plot(x_values, y_values, lw=0.1)  # Plot the data
+#     plt.show()  # show the plot
+#     return
+##############################################################################
+
+
+#####################################################
+#   plot_epw(epw_df) - plot weather data from a dataframe constructed with read_epw()
+#
+#   Imports:
+#
+#   import pandas as pd
+#   import plotly.graph_objects as go
+#
+#
+#   Inputs:
+#
+#   epw_df - a dataframe constructed with read_epw()
+#
+#
+#   Outputs:
+#
+#   fig - a Plotly figure
+#
+#
+@profiled()
+def plot_epw(epw_df):
+    # use graph_objects to create the figure
+    fig = go.Figure()
+
+    # create traces for all columns vs. timestamps
+    for i in range(epw_df.shape[1]):
+        fig.add_trace(go.Scatter(x=epw_df.index, y=epw_df.iloc[:, i],
+                                 visible='legendonly',
+                                 mode='lines',
+                                 name=epw_df.columns[i]))
+
+    # layout configuration
+    fig.update_layout(showlegend=True)  # force the legend for single-trace plots
+    fig.update_layout(legend_title_text='Legend')
+    fig.update_layout(hovermode='x')
+    return fig
+#####################################################
+
+
+#####################################################
+#   plot_epw_overlay(epw_dfs, variable) - plot one weather variable from several files on the same time axis
+#
+#   Imports:
+#
+#   import plotly.graph_objects as go
+#
+#
+#   Inputs:
+#
+#   epw_dfs - dict of label: dataframe from read_epw(), e.g. one per climate zone
+#   variable - column to plot, e.g. 'Dry Bulb Temperature'
+#
+#
+#   Outputs:
+#
+#   fig - a Plotly figure with one trace per file
+#
+#
+#   Notes:
+#
+#   -read_epw() puts every file on the same reference year, so TMY files (whose months come from different years)
+#    line up hour for hour.
+#
+@profiled()
+def plot_epw_overlay(epw_dfs, variable):
+    fig = go.Figure()
+    unit = ''
+    for label, epw_df in epw_dfs.items():
+        fig.add_trace(go.Scatter(x=epw_df.index, y=epw_df[variable],
+                                 mode='lines',
+                                 name=str(label)))
+        unit = unit or epw_unit(epw_df, variable)
+
+    # layout configuration
+    fig.update_layout(showlegend=True)  # force the legend for single-trace plots
+    fig.update_layout(legend_title_text='Legend')
+    fig.update_layout(hovermode='x')
+    fig.update_layout(yaxis_title=variable + (' (' + unit + ')' if unit else ''))
+    return fig
+#####################################################
+
+
+#####################################################
+# plot_carpet(carpet_df, title='', colorbar_title='') - carpet plot (heatmap of value by date & time of day)
+#
+#   Imports:
+#
+#   import plotly.graph_objects as go
+#
+#
+#   Inputs:
+#
+#   carpet_df - a DataFrame from carpet_matrix()
+#   title - figure title
+#   colorbar_title - label for the color scale, e.g. 'MBH' or '°F'
+#
+#
+#   Outputs:
+#
+#   fig - a Plotly figure
+#
+#
+#   Notes:
+#
+#   -The figure has one cell per row/column of carpet_df, so use a coarser slot in carpet_matrix() to keep
+#    multi-year minute data light.
+#
+@profiled()
+def plot_carpet(carpet_df, title='', colorbar_title=''):
+    fig = go.Figure(go.Heatmap(
+        z=carpet_df.to_numpy().T,  # dates along x, time of day along y
+        x=carpet_df.index,
+        y=carpet_df.columns,
+        colorscale='Viridis',
+        colorbar=dict(title=dict(text=colorbar_title)),
+        hovertemplate='%{x|%b %-d, %Y} %{y}<br><b>%{z:,.1f}</b><extra></extra>'
+    ))
+    fig.update_layout(
+        title=dict(text=title),
+        xaxis=dict(title=dict(text='Date')),
+        yaxis=dict(title=dict(text='Time of day'), type='category', nticks=13)
+    )
+    return fig
+#####################################################
+
+
+#####################################################
+# load_profile_template() - cached layout for the part load distribution figure (the load_profile.py report)
+#
+#   Imports:
+#
+#   import copy
+#   import functools
+#   import plotly.graph_objects as go
+#   from plotly.subplots import make_subplots
+#
+#
+#   Outputs:
+#
+#   template - a plotly figure dictionary with the full layout, empty traces & placeholder text. It's a deep copy of
+#              the cached one, so it's safe to modify.
+#
+#
+#   Notes:
+#
+#   -The layout only goes through Plotly's validation once per process, which is most of the cost of building the
+#    figure with update_layout()/update_xaxes()/update_yaxes()/add_annotation() calls. The copy is well under a
+#    millisecond.
+#   -Axis names come from make_subplots(rows=2, secondary_y=True): row 1 is xaxis/yaxis/yaxis2 & row 2 is
+#    xaxis2/yaxis3/yaxis4.
+#
+def load_profile_template():
+    return copy.deepcopy(_load_profile_template())
+
+
+@functools.lru_cache(maxsize=1)
+def _load_profile_template():
+    # create a figure with a secondary y-axis
+    fig = make_subplots(
+        rows = 2,
+        cols = 1,
+        vertical_spacing=0.05,
+        specs=[[{"secondary_y": True}],[{"secondary_y": True}]]
+    )
+
+    # Set figure title
+    fig.update_layout(
+        autosize=True,
+        title = dict(
+            text = '',
+            xanchor = 'left',
+            yanchor = 'top',
+            y = 0.95,
+            font = dict(color='black')
+        )
+    )
+
+    # row 1
+    # add the hours bar chart on the primary axis
+    fig.add_trace(
+        go.Bar(
+            marker=dict(
+                color = "#3B6D89"
+            ),
+            hovertemplate='<b>%{y:.2f}% of total operating hours</b> <extra>@ %{customdata[0]} design capacity</extra>'
+        ),
+        secondary_y=False,
+        row = 1,
+        col = 1
+    )
+
+    # add the cumulative percent line on the secondary axis
+    fig.add_trace(
+        go.Scatter(
+            mode='lines+markers',
+            marker = dict(
+                color = "#FB9A2D",
+            ),
+            hovertemplate=
+            '<b>%{y:.2f}% of total operating hours</b> <extra>@ ≤%{customdata[0]} design capacity</extra>'
+        ),
+        secondary_y=True,
+        row=1,
+        col=1
+    )
+
+    # row 2
+    # add the load bar chart on the primary axis
+    fig.add_trace(
+        go.Bar(
+            marker = dict(
+                color = "#00C496",
+            ),
+            hovertemplate=
+            '<b>%{y:,}% of total heating output</b> <extra>@ %{customdata[0]} design capacity</extra>'
+        ),
+        secondary_y=False,
+        row=2,
+        col=1,
+    )
+    fig.update_yaxes(
+        ticksuffix='%'
+    )
+
+    # add the cumulative percent line on the secondary axis
+    fig.add_trace(
+        go.Scatter(
+            mode='lines+markers',
+            marker = dict(
+                color = "#FB9A2D",
+            ),
+            hovertemplate=
+            '<b>%{y:.2f}% of total heating output</b> <extra>@ ≤%{customdata[0]} design capacity</extra>'
+        ),
+        secondary_y=True,
+        row=2,
+        col=1
+    )
+
+    # add annotations - design/actual summary, then the negative load warning (dropped if there are no negative loads)
+    fig.add_annotation(
+        text='',
+        align='left',
+        showarrow=False,
+        bordercolor='black',
+        borderwidth= 2,
+        xref='paper',
+        yref='paper',
+        xanchor = 'right',
+        yanchor = 'bottom',
+        x=0.94,
+        y=1.05,
+        bgcolor="white",
+        borderpad = 10,
+        font = dict(size = 14, color='black')
+    )
+    fig.add_annotation(
+        text='',
+        align='left',
+        showarrow=False,
+        bordercolor='red',
+        borderwidth=2,
+        xref='paper',
+        yref='paper',
+        xanchor='right',
+        yanchor='bottom',
+        x=0.7,
+        y=1.05,
+        bgcolor="white",
+        borderpad=10,
+        font=dict(size=14, color='red')
+    )
+
+    # configure plot layout
+    fig.update_xaxes(type='category')
+
+    # set row 1 axis titles
+    fig.update_xaxes(
+        title_text='',
+        showticklabels=False,
+        showline=True,
+        linewidth=2,
+        linecolor='black',
+        mirror=True,
+        row=1
+    )
+    fig.update_yaxes(
+        title_text="<b>Operating hours</b>",
+        color = "#3B6D89",
+        showline=True,
+        linewidth=2,
+        linecolor='black',
+        secondary_y=False,
+        nticks=4,
+        row=1
+    )
+    fig.update_yaxes(
+        title_text='',
+        color = "#FB9A2D",
+        showline=True,
+        linewidth=2,
+        linecolor='black',
+        secondary_y=True,
+        showgrid=False,
+        range=[0,105],
+        nticks=2,
+        row=1
+    )
+
+    # set row 2 axis titles
+    fig.update_xaxes(
+        title_text='',
+        showline=True,
+        linewidth=2,
+        linecolor='black',
+        mirror=True,
+        row=2
+    )
+    fig.update_yaxes(
+        title_text="<b>Heating output</b>",
+        color = "#00C496",
+        showline=True,
+        linewidth=2,
+        linecolor='black',
+        secondary_y=False,
+        nticks=4,
+        row=2
+    )
+    fig.update_yaxes(
+        title_text='',
+        color = "#FB9A2D",
+        showline=True,
+        linewidth=2,
+        linecolor='black',
+        showgrid = False,
+        secondary_y=True,
+        range=[0, 105],
+        nticks=2,
+        row=2
+    )
+
+    # customize hover labels
+    # fig.update_layout(hovermode="x unified")
+    fig.update_layout(
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=12,
+        )
+    )
+
+    # set margins
+    fig.update_layout(
+        margin = dict(
+            l = 50,
+            r = 50,
+            t = 170,
+            b = 50
+        )
+    )
+
+    #set legend
+    fig.update_layout(
+        legend = dict(
+            xanchor = 'right',
+            yanchor = 'top',
+            x = 0.9,
+            y = 0.35
+        ),
+        showlegend=False
+    )
+
+    return fig.to_dict()
+#####################################################
+
+
+#####################################################
+# render_load_profile(summary, meta_df, bands_df=None) - fill the cached template with one building's data
+#
+#   Imports:
+#
+#   import numpy as np
+#   import pandas as pd
+#
+#
+#   Inputs:
+#
+#   summary - a load summary from summarize_loads(), merge_load_summaries() or update_load_summary()
+#   meta_df - the static inputs/metadata DataFrame from the load profile workbook (Design MBH, Building GSF, etc.)
+#   bands_df - optional confidence bands from bootstrap_load_profile(), drawn as error bars on the bar charts
+#
+#
+#   Outputs:
+#
+#   fig_dict - a plotly figure dictionary, ready for write_load_profile_html() or go.Figure(fig_dict)
+#
+#
+#   Notes:
+#
+#   -The figure is filled in on a copy of load_profile_template(), so rendering is mostly the bin math below. Nothing
+#    in fig_dict is shared with the cached template or other renders, it's safe to modify.
+#   -Raises a ValueError if the summary has no loads (max_load is None), e.g. every point was empty or excluded.
+#
+@profiled()
+def render_load_profile(summary, meta_df, bands_df=None):
+    if summary['max_load'] is None:
+        raise ValueError('Load summary has no load data to plot (every point is empty or was excluded).')
+
+    # unpack the summary
+    mbh_design = round(summary['mbh_design'],2)
+    n_bins = summary['n_bins']
+    td_in_hrs = summary['td_in_hrs']
+    start = pd.Timestamp(summary['start'])
+    end = pd.Timestamp(summary['end'])
+    total_op_hrs = summary['op_points']*td_in_hrs
+    total_load = summary['total_load']
+    max_load = round(summary['max_load'],2)
+    binned_loads = summary['bin_sums']
+    counts = summary['bin_counts']
+    mbh_increment = mbh_design/n_bins
+
+    # read GSF from metadata & calculate Btu/sf for design & actual
+    gsf = meta_df.iloc[1,0]
+    btu_sf_design = round(1000 * mbh_design / gsf,2)
+    btu_sf_actual = round(1000 * max_load / gsf,2)
+
+    # create bin labels
+    decimal_labels = [str((i+1)/n_bins) + 'x' for i in range(n_bins)]
+    increment_labels = ['(' + str(round(mbh_increment*i)) + '-' + str(round(mbh_increment*(i+1))) + ' MBH)'
+                        for i in range(n_bins)]
+    labels = ['<b>' + decimal_labels[i] + '</b><br>' + increment_labels[i] for i in range(n_bins)]
+    customdata = [[decimal_labels[i], increment_labels[i]] for i in range(n_bins)]
+
+    # cumulative loads & hours
+    cumulative_percent = list(100 * np.cumsum(binned_loads) / total_load)
+    cumulative_hours = list(np.cumsum(counts) * td_in_hrs)
+
+    # figure title
+    title = '<b>Heating Load Distribution</b> from {} to {}'.format(start.strftime('%B %-d, %Y'),end.strftime('%B %-d, %Y'))
+    for i in range(len(meta_df)-2):
+        title += '<br>' + meta_df.index[i+2] + ': ' + str(meta_df.iloc[i+2,0])
+
+    # fill in the traces - hours bars, cumulative hours, load bars, cumulative load
+    template = load_profile_template()
+    y_values = [
+        [x/sum(counts)*100 for x in counts],
+        [x/total_op_hrs*100 for x in cumulative_hours],
+        [round(x/total_load*100,2) for x in binned_loads],
+        cumulative_percent
+    ]
+    data = [dict(trace, x=labels, y=y, customdata=customdata) for trace, y in zip(template['data'], y_values)]
+
+    # bootstrap confidence bands as error bars on the hours & load bars
+    if bands_df is not None:
+        for i, column in [(0, 'Hours (%)'), (2, 'Load (%)')]:
+            data[i]['error_y'] = dict(type='data', symmetric=False, color='#555555', thickness=1,
+                                      array=(bands_df[column + ' High'] - bands_df[column]).clip(lower=0).tolist(),
+                                      arrayminus=(bands_df[column] - bands_df[column + ' Low']).clip(lower=0).tolist())
+
+    # fill in the annotations, add the warning if input data contains negative loads
+    annotations = [dict(template['layout']['annotations'][0], text="<b>Design MBH</b>: {:,}<br><b>Design Btu/sf</b>: \
+{:,}<br><br><b>Max. actual MBH</b>: {:,}<br><b>Max. actual Btu/sf</b>: {:,}<br>".format(mbh_design,btu_sf_design,max_load,
+                                                                                        btu_sf_actual))]
+    if summary['neg_points'] > 0:
+        annotations.append(dict(template['layout']['annotations'][1], text="<b>WARNING</b>:<br>Input file contains \
+negative load data-<br> # of negative data points: {} of {}<br> total negative kBtus: {}".format(
+            summary['neg_points'],summary['points'],round(summary['neg_load']*td_in_hrs,2))))
+
+    # fill in the title & axis titles
+    layout = dict(template['layout'], annotations=annotations)
+    layout['title'] = dict(layout['title'], text=title)
+    axis_titles = {
+        'yaxis2': "<b>Cumulative</b><br>(100% = {:,}".format(int(sum(counts)*td_in_hrs)) + " hours)",
+        'xaxis2': '<b>Part load operating point</b><br>(1.0x = design capacity, ' + str(mbh_design) + ' MBH)',
+        'yaxis4': "<b>Cumulative</b><br>(100% = {:,}".format(round(total_load)) + " kBtus)"
+    }
+    for axis, text in axis_titles.items():
+        layout[axis] = dict(layout[axis], title=dict(layout[axis].get('title', {}), text=text))
+
+    return dict(data=data, layout=layout)
+#####################################################
+
+
+#####################################################
+# plot_load_profile(summary, meta_df, bands_df=None) - part load distribution figure (the load_profile.py report)
+#
+#   Imports:
+#
+#   import plotly.graph_objects as go
+#
+#
+#   Inputs:
+#
+#   summary - a load summary from summarize_loads(), merge_load_summaries() or update_load_summary()
+#   meta_df - the static inputs/metadata DataFrame from the load profile workbook (Design MBH, Building GSF, etc.)
+#   bands_df - optional confidence bands from bootstrap_load_profile(), drawn as error bars on the bar charts
+#
+#
+#   Outputs:
+#
+#   fig - a Plotly figure with the operating hours & heating output distributions
+#
+#
+#   Notes:
+#
+#   -Everything is drawn from the summary, so no raw trend data is needed to redraw the figure.
+#   -For batch runs skip the Figure object & pass render_load_profile() straight to write_load_profile_html().
+#
+def plot_load_profile(summary, meta_df, bands_df=None):
+    return go.Figure(render_load_profile(summary, meta_df, bands_df))
+#####################################################
+
+
+#####################################################
+# write_load_profile_html(fig, html_path, include_plotlyjs='directory') - write a report without re-validating it
+#
+#   Imports:
+#
+#   import plotly.io as pio
+#
+#
+#   Inputs:
+#
+#   fig - a figure dictionary from render_load_profile() (or a Plotly figure)
+#   html_path - path to the .html file
+#   include_plotlyjs - 'directory' = reference one plotly.min.js saved next to the reports (copied there the first
+#                      time), 'cdn' = reference plotly.js online, True = inline the whole bundle (several MB)
+#
+#
+#   Outputs:
+#
+#   No outputs. Writes the .html file.
+#
+@profiled()
+def write_load_profile_html(fig, html_path, include_plotlyjs='directory'):
+    pio.write_html(fig, html_path, include_plotlyjs=include_plotlyjs, validate=False)
+#####################################################
+
+
+
+####################################################################################################################
+# CLASSES:
+
+#####################################################
+# StageProfiler - collects the stages recorded by profile_stage() & profiled() (see start_profiling())
+#
+#   Attributes:
+#
+#   records - list of dictionaries, one per finished stage, with:
+#             stage, depth (0 = top level), start_s (since profiling started), wall_s, cpu_s, rows,
+#             peak_traced_mb (only with trace_memory=True), peak_rss_mb (process peak so far) & thread
+#
+#
+#   Methods:
+#
+#   to_df() - the records as a DataFrame
+#   summary() - totals per stage name
+#   write_json(json_path) - save the records
+#   write_chrome_trace(trace_path) - save a Chrome trace (chrome://tracing, https://ui.perfetto.dev) for a
+#                                    flame-style view of nested stages
+#
+#
+#   Notes:
+#
+#   -Nesting depth is tracked per profiler, not per thread, so stages in worker threads all show up as depth 0+.
+#
+class StageProfiler:
+    def __init__(self, trace_memory=False):
+        self.records = []
+        self.trace_memory = trace_memory
+        self.t0 = time.perf_counter()
+        self._depth = 0
+        self._peaks = []  # running tracemalloc peak of each open stage
+        self._started_tracemalloc = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def close(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _enter(self):
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)  # save the outer stage's peak before resetting it
+            tracemalloc.reset_peak()
+            self._peaks.append(current)
+        self._depth += 1
+
+    def _exit(self, stage, end, cpu_end):
+        self._depth -= 1
+        peak_traced_mb = None
+        if self.trace_memory:
+            peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)  # an inner stage's peak is also the outer stage's
+            peak_traced_mb = peak / 1e6
+
+        self.records.append({
+            'stage': stage.name,
+            'depth': self._depth,
+            'start_s': stage.start - self.t0,
+            'wall_s': end - stage.start,
+            'cpu_s': cpu_end - stage.cpu_start,
+            'rows': stage.rows,
+            'peak_traced_mb': peak_traced_mb,
+            'peak_rss_mb': peak_rss_mb(),
+            'thread': threading.get_ident()
+        })
+
+    def to_df(self):
+        return pd.DataFrame(self.records, columns=['stage', 'depth', 'start_s', 'wall_s', 'cpu_s', 'rows',
+                                                   'peak_traced_mb', 'peak_rss_mb', 'thread'])
+
+    def summary(self):
+        df = self.to_df()
+        summary_df = df.groupby('stage', sort=False).agg(
+            calls=('wall_s', 'size'),
+            wall_s=('wall_s', 'sum'),
+            cpu_s=('cpu_s', 'sum'),
+            rows=('rows', 'sum'),
+            peak_traced_mb=('peak_traced_mb', 'max'),
+            peak_rss_mb=('peak_rss_mb', 'max')
+        )
+        return summary_df.sort_values('wall_s', ascending=False)
+
+    def write_json(self, json_path):
+        with open(json_path, 'w') as f:
+            json.dump({'stages': self.records}, f, indent=1)
+
+    def write_chrome_trace(self, trace_path):
+        pid = os.getpid()
+        events = [{
+            'name': record['stage'],
+            'ph': 'X',  # complete event, Chrome nests them by start time & duration
+            'ts': record['start_s'] * 1e6,
+            'dur': record['wall_s'] * 1e6,
+            'pid': pid,
+            'tid': record['thread'],
+            'args': {key: record[key] for key in ['cpu_s', 'rows', 'peak_traced_mb', 'peak_rss_mb']}
+        } for record in self.records]
+        with open(trace_path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'rows', 'start', 'cpu_start')
+
+    def __init__(self, profiler, name, rows):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.profiler._enter()
+        self.cpu_start = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        cpu_end = time.process_time()
+        self.profiler._exit(self, end, cpu_end)
+        return False
+
+
+class _NullStage:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()  # returned by profile_stage() when profiling is off
+#####################################################
+
+
+#####################################################
+# SharedWeather - a weather dataframe published in shared memory (see share_weather())
+#
+#   Attributes:
+#
+#   spec - picklable dictionary with everything attach_weather() needs (segment name, shape, columns, index dtype)
+#
+#
+#   Methods:
+#
+#   frame() - read-only dataframe view in the owner process
+#   close() - release & remove the segment. Also happens on garbage collection, at exit & when used in a with block.
+#
+class SharedWeather:
+    def __init__(self, weather_df):
+        index = pd.DatetimeIndex(weather_df.index)
+        n_rows, n_cols = weather_df.shape
+        self._shm = shared_memory.SharedMemory(create=True, size=max(8 * n_rows * (n_cols + 1), 1))
+        self._finalizer = weakref.finalize(self, _release_shared_memory, self._shm)
+
+        np.ndarray((n_rows,), dtype=np.int64, buffer=self._shm.buf)[:] = index.asi8
+        values = np.ndarray((n_cols, n_rows), dtype=np.float64, buffer=self._shm.buf, offset=8 * n_rows)
+        for i in range(n_cols):
+            values[i] = np.asarray(weather_df.iloc[:, i], dtype=np.float64)
+
+        self.spec = {
+            'name': self._shm.name,
+            'n_rows': n_rows,
+            'columns': [str(column) for column in weather_df.columns],
+            'index_dtype': str(index.dtype),
+            'index_name': index.name
+        }
+
+    def frame(self):
+        return _shared_weather_frame(self._shm, self.spec)
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def _release_shared_memory(shm):
+    try:
+        shm.close()
+    except BufferError:
+        pass  # a frame() view is still alive, the memory is freed when it goes away
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+#####################################################
+
+
+#####################################################
+# WeatherStack - many weather years for one site as one dense (file x hour of year x variable) array
+#
+#   Attributes:
+#
+#   values - numpy array, shape (n files, 8760, n variables). Memory-mapped & read-only after WeatherStack.load().
+#   labels - list of file labels, one per row of axis 0
+#   variables - list of variable names, one per entry of axis 2
+#
+#
+#   Methods:
+#
+#   WeatherStack.from_epws(epw_paths, labels=None, variables=None, dtype=np.float64) - build from .epw files
+#   WeatherStack.load(folder, mmap=True) / save(folder) - values.npy + stack.json in a folder
+#   variable(name) - (n files x 8760) array for one variable
+#   hourly_mean() / hourly_min() / hourly_max() - climatology for each hour of the year, across files
+#   percentiles(q) - percentiles of every variable over all files & hours (e.g. q=[0.4, 1, 99, 99.6] for design)
+#   monthly_means() - mean of every month in every file
+#   annual_means() / year_over_year_delta() - annual means per file & the change from the previous file
+#
+#
+#   Notes:
+#
+#   -Leap-year files are trimmed to 8760 hours by dropping Feb 29, so hour h is the same calendar hour in every
+#    file. The hour index is a non-leap 2017 calendar (HOURS_OF_YEAR).
+#   -Statistics are plain numpy reductions along an axis, no dataframe concatenation or groupby.
+#
+HOURS_OF_YEAR = pd.date_range('2017-01-01', periods=8760, freq='h')
+_MONTH_STARTS = np.flatnonzero(np.diff(HOURS_OF_YEAR.month, prepend=0))  # first hour of each month
+
+
+class WeatherStack:
+    def __init__(self, values, labels, variables):
+        self.values = values
+        self.labels = list(labels)
+        self.variables = list(variables)
+
+    @classmethod
+    def from_epws(cls, epw_paths, labels=None, variables=None, dtype=np.float64):
+        if labels is None:
+            labels = [os.path.splitext(os.path.basename(path))[0] for path in epw_paths]
+        values = None
+        for i, epw_path in enumerate(epw_paths):
+            epw_df = read_epw(epw_path)
+            if variables is None:
+                variables = list(epw_df.columns)
+            if values is None:
+                values = np.empty((len(epw_paths), 8760, len(variables)), dtype=dtype)
+
+            keep = ~((epw_df.index.month == 2) & (epw_df.index.day == 29))  # drop leap days
+            if keep.sum() != 8760:
+                raise ValueError('{} has {} hours after dropping leap days, expected 8760.'.format(epw_path, keep.sum()))
+            for j, variable in enumerate(variables):
+                values[i, :, j] = np.asarray(epw_df[variable], dtype=dtype)[keep]
+        return cls(values, labels, variables)
+
+    @classmethod
+    def load(cls, folder, mmap=True):
+        with open(os.path.join(folder, 'stack.json')) as f:
+            info = json.load(f)
+        values = np.load(os.path.join(folder, 'values.npy'), mmap_mode='r' if mmap else None)
+        return cls(values, info['labels'], info['variables'])
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        np.save(os.path.join(folder, 'values.npy'), np.ascontiguousarray(self.values))
+        with open(os.path.join(folder, 'stack.json'), 'w') as f:
+            json.dump({'labels': [str(label) for label in self.labels], 'variables': self.variables}, f, indent=1)
+
+    def variable(self, name):
+        return self.values[:, :, self.variables.index(name)]
+
+    def _hourly_frame(self, values):
+        return pd.DataFrame(values, index=HOURS_OF_YEAR, columns=self.variables)
+
+    def hourly_mean(self):
+        return self._hourly_frame(self.values.mean(axis=0))
+
+    def hourly_min(self):
+        return self._hourly_frame(self.values.min(axis=0))
+
+    def hourly_max(self):
+        return self._hourly_frame(self.values.max(axis=0))
+
+    def percentiles(self, q):
+        flat = self.values.reshape(-1, len(self.variables))  # every file & hour in one axis
+        return pd.DataFrame(np.percentile(flat, q, axis=0), index=pd.Index(np.atleast_1d(q), name='Percentile'),
+                            columns=self.variables)
+
+    def monthly_means(self):
+        sums = np.add.reduceat(self.values, _MONTH_STARTS, axis=1)  # months are contiguous runs of hours
+        hours = np.diff(np.append(_MONTH_STARTS, 8760))
+        means = sums / hours[None, :, None]
+        index = pd.MultiIndex.from_product([self.labels, range(1, 13)], names=['Label', 'Month'])
+        return pd.DataFrame(means.reshape(-1, len(self.variables)), index=index, columns=self.variables)
+
+    def annual_means(self):
+        return pd.DataFrame(self.values.mean(axis=1), index=pd.Index(self.labels, name='Label'),
+                            columns=self.variables)
+
+    def year_over_year_delta(self):
+        annual = self.values.mean(axis=1)
+        return pd.DataFrame(np.diff(annual, axis=0), index=pd.Index(self.labels[1:], name='Label'),
+                            columns=self.variables)
+#####################################################
+
+
+#####################################################
+# PrototypeLibrary - reference heating & cooling profiles by building type, normalized so they can be scaled
+#
+#   Attributes:
+#
+#   types - list of building types, one per row of the arrays
+#   heating / cooling - (n types x 8760) arrays of each prototype's loads per MBH of its peak heating load
+#   dry_bulb - (n types x 8760) array of the dry bulb (F) each prototype was simulated with
+#   peak_mbh - array of each prototype's peak heating load (MBH)
+#   gsf - array of each prototype's floor area (sf), NaN if it isn't known
+#   heating_fit / cooling_fit - (n types x 2) arrays of the slope (per F) & balance point (F) of each prototype's
+#                               normalized load vs. dry bulb
+#
+#
+#   Methods:
+#
+#   PrototypeLibrary.from_xlsx(xlsx_path=PROTOTYPE_PROFILES_XLSX, gsf=None, ...) - one building type per sheet, named
+#       by the sheet. gsf is each prototype's floor area, a number or dict of type: GSF.
+#   load_prototype_library(xlsx_path=PROTOTYPE_PROFILES_XLSX, gsf=None) - from_xlsx(), only read once per session (per
+#       xlsx_path & gsf). The prototype workbooks don't have floor areas, pass gsf to size buildings by 'Building GSF'.
+#   index(types) - row of each type, raises a ValueError for types that aren't in the library
+#
+#
+#   Notes:
+#
+#   -The sheets are the 8760 hour prototype exports like bldg_heat_cool_profiles.xlsx: a dry bulb column ('DBT from
+#    epw'), heating ('Heating MBH/kBtu') & cooling ('kBtu/h') in MBH. Pass other column names to from_xlsx().
+#   -The fits are least squares lines through the hours with load, the balance point is where the line hits zero. A
+#    prototype with no weather dependence (or the wrong sign) gets a zero slope.
+#
+PROTOTYPE_PROFILES_XLSX = 'Input Load Profiles/bldg_heat_cool_profiles.xlsx'
+
+
+class PrototypeLibrary:
+    def __init__(self, types, heating, cooling, dry_bulb, peak_mbh, gsf):
+        self.types = list(types)
+        self.heating = heating
+        self.cooling = cooling
+        self.dry_bulb = dry_bulb
+        self.peak_mbh = peak_mbh
+        self.gsf = gsf
+        self.heating_fit = np.array([self._fit(t, h, -1) for t, h in zip(dry_bulb, heating)]).reshape(-1, 2)
+        self.cooling_fit = np.array([self._fit(t, c, 1) for t, c in zip(dry_bulb, cooling)]).reshape(-1, 2)
+
+    @classmethod
+    def from_xlsx(cls, xlsx_path=PROTOTYPE_PROFILES_XLSX, gsf=None, dry_bulb_col='DBT from epw',
+                  heating_col='Heating MBH/kBtu', cooling_col='kBtu/h'):
+        sheets = pd.read_excel(xlsx_path, sheet_name=None)
+        types = list(sheets)
+        columns = [dry_bulb_col, heating_col, cooling_col]
+        values = np.empty((3, len(types), 8760))
+        for i, (sheet_name, sheet_df) in enumerate(sheets.items()):
+            profile = sheet_df[columns].apply(pd.to_numeric, errors='coerce').dropna()
+            if len(profile) != 8760:
+                raise ValueError('{} has {} hours, expected 8760.'.format(sheet_name, len(profile)))
+            values[:, i] = profile.to_numpy().T
+        dry_bulb, heating, cooling = values
+
+        peak_mbh = heating.max(axis=1)
+        peak_mbh = np.where(peak_mbh > 0, peak_mbh, cooling.max(axis=1))  # cooling only prototypes
+        if not isinstance(gsf, dict):
+            gsf = dict.fromkeys(types, gsf)
+        gsf = np.array([np.nan if gsf.get(t) is None else gsf[t] for t in types], dtype=float)
+        return cls(types, heating / peak_mbh[:, None], cooling / peak_mbh[:, None], dry_bulb, peak_mbh, gsf)
+
+    def index(self, types):
+        rows = {t: i for i, t in enumerate(self.types)}
+        missing = set(types) - set(rows)
+        if missing:
+            raise ValueError('No prototype for {}, the library has {}.'.format(sorted(map(str, missing)), self.types))
+        return np.array([rows[t] for t in types], dtype=int)
+
+    @staticmethod
+    def _fit(dry_bulb, load, sign):
+        # slope & balance point of load vs. dry bulb over the hours with load, sign is the expected slope sign
+        on = load > 0
+        if on.sum() < 2 or np.ptp(dry_bulb[on]) == 0:
+            return 0.0, dry_bulb.max()
+        slope, intercept = np.polyfit(dry_bulb[on], load[on], 1)
+        if np.sign(slope) != sign:
+            return 0.0, dry_bulb.max()
+        return slope, -intercept / slope
+
+
+def load_prototype_library(xlsx_path=PROTOTYPE_PROFILES_XLSX, gsf=None):
+    if isinstance(gsf, dict):
+        gsf = tuple(gsf.items())  # hashable for the cache
+    return _load_prototype_library(xlsx_path, gsf)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_prototype_library(xlsx_path, gsf):
+    return PrototypeLibrary.from_xlsx(xlsx_path, gsf=dict(gsf) if isinstance(gsf, tuple) else gsf)
+#####################################################
+
+
+#####################################################
+# StageGraph - memoized graph of analysis stages, a stage only reruns when something it depends on changes
+#
+#   Attributes:
+#
+#   stages - dict of stage name: (func, input stage names, param names)
+#   last_run - dict of stage name: seconds for the stages that actually ran in the last run(), the rest came from
+#              the memo
+#
+#
+#   Methods:
+#
+#   add(name, func, inputs=(), params=()) - add a stage. func is called with the outputs of the input stages (in
+#       order), then the named params as keyword arguments. Input stages have to be added first.
+#   stage(name, inputs=(), params=()) - decorator version of add()
+#   run(name, **params) - output of a stage, running it & anything upstream of it only if their inputs changed.
+#       params can hold every parameter of the graph, each stage only looks at its own.
+#   key(name, **params) - the hash a stage's output is memoized under
+#   clear() - forget every memoized output
+#
+#
+#   Notes:
+#
+#   -A stage's key hashes its name, its params & the keys of its input stages (not their outputs), so checking the
+#    whole graph is a few small hashes no matter how big the data is, e.g. ingest -> clean -> bin -> figure:
+#    changing the design MBH only changes the bin & figure keys, so only those two run.
+#   -Params are hashed by content: bytes & file-like objects (e.g. Streamlit uploads) by their bytes, existing file
+#    paths by size & modified time, numpy/pandas objects by their values, anything else by repr().
+#   -Each stage keeps its last max_entries outputs, so flipping back to an earlier value is free. Outputs are shared,
+#    stage functions shouldn't modify their inputs.
+#
+class StageGraph:
+    def __init__(self, max_entries=8):
+        self.stages = {}
+        self.max_entries = max_entries
+        self.last_run = {}
+        self._memo = {}
+
+    def add(self, name, func, inputs=(), params=()):
+        missing = [stage for stage in inputs if stage not in self.stages]
+        if missing:
+            raise ValueError('Add the input stages {} before {}.'.format(missing, name))
+        self.stages[name] = (func, tuple(inputs), tuple(params))
+        self._memo[name] = collections.OrderedDict()
+
+    def stage(self, name, inputs=(), params=()):
+        def decorator(func):
+            self.add(name, func, inputs, params)
+            return func
+        return decorator
+
+    def run(self, name, **params):
+        self.last_run = {}
+        return self._run(name, params, {})
+
+    def key(self, name, **params):
+        return self._key(name, params, {})
+
+    def clear(self):
+        for memo in self._memo.values():
+            memo.clear()
+
+    def _key(self, name, params, keys):
+        # keys is shared through one run, so each stage (& each big param) is only hashed once
+        if name not in keys:
+            func, inputs, param_names = self.stages[name]
+            digest = hashlib.sha1(name.encode())
+            for stage in inputs:
+                digest.update(self._key(stage, params, keys).encode())
+            for param in param_names:
+                if param not in params:
+                    raise TypeError("Stage '{}' needs the '{}' param.".format(name, param))
+                digest.update(param.encode() + b'=' + _hash_value(params[param]).encode())
+            keys[name] = digest.hexdigest()
+        return keys[name]
+
+    def _run(self, name, params, keys):
+        key = self._key(name, params, keys)
+        memo = self._memo[name]
+        if key in memo:
+            memo.move_to_end(key)
+            return memo[key]
+
+        func, inputs, param_names = self.stages[name]
+        args = [self._run(stage, params, keys) for stage in inputs]
+        start = time.perf_counter()
+        with profile_stage(name):
+            output = func(*args, **{param: params[param] for param in param_names})
+        self.last_run[name] = time.perf_counter() - start
+        memo[key] = output
+        if len(memo) > self.max_entries:
+            memo.popitem(last=False)
+        return output
+
+
+def _hash_value(value):
+    # content hash of a stage param, see StageGraph
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return hashlib.sha1(value).hexdigest()
+    if hasattr(value, 'getbuffer'):  # io.BytesIO & Streamlit's UploadedFile
+        with value.getbuffer() as buffer:
+            return hashlib.sha1(buffer).hexdigest()
+    if isinstance(value, (str, os.PathLike)) and os.path.isfile(value):
+        stat = os.stat(value)
+        return repr((os.path.abspath(value), stat.st_size, stat.st_mtime_ns))
+    if isinstance(value, np.ndarray):
+        return hashlib.sha1(repr((value.dtype.str, value.shape)).encode()
+                            + np.ascontiguousarray(value).tobytes()).hexdigest()
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        labels = list(value.columns) if isinstance(value, pd.DataFrame) else value.name
+        return hashlib.sha1(repr(labels).encode()
+                            + pd.util.hash_pandas_object(value).to_numpy().tobytes()).hexdigest()
+    return repr(value)
+#####################################################
@@ -33,326 +33,107 @@ file_name_in = '7646 SDSU EIS.xlsx'
 sheet_name = 'Calculated Load'
 data_range = 'A:I'
 meta_data_range = 'K:L'
+summary_path_out = 'Load Summaries/'    # saved bins/totals for incremental updates
+results_db_path = 'Results/load_profile_results.db'    # results database for portfolio-wide queries
+exclude_bad_data = False    # drop points flagged by scan_data_quality() before binning
+save_results_db = False    # save the results & monthly totals to the results database
+profile_run = False    # time each stage & save a stage summary + Chrome trace next to the plot
+compact_frames = False    # downcast the load data to float32/int8/categoricals & print a memory report
+export_workbook = False    # write the load data, bins & monthly totals to a workbook in the template's layout
+bootstrap_bands = False    # resample the data by day thousands of times & show confidence bands on the bins & peak
+
+if profile_run:
+    start_profiling(trace_memory=True)
 
 # read load data into dataframe and calculate the total load, drop empty rows
-load_df = pd.read_excel(
-    file_path_in + file_name_in,
-    sheet_name=sheet_name,
-    usecols=data_range,
-    engine='openpyxl'
-)
-load_df.dropna(axis='index',how='all',inplace=True)
-
-# read load data into dataframe and calculate the total load, drop empty rows
-start = pd.to_datetime(load_df['Timestamp'].iloc[0])
-start_plus_one = pd.to_datetime(load_df['Timestamp'].iloc[1])
-end = pd.to_datetime(load_df['Timestamp'].iloc[-1])
-td_in_hrs = round((start_plus_one - start).seconds/3600,2)
-total_hrs = len(load_df)*td_in_hrs
-total_op_hrs = len(load_df['Heating Load (MBH)'][load_df['Heating Load (MBH)'] > 0])*td_in_hrs
-total_load = load_df['Heating Load (MBH)'].sum()
-max_load = round(load_df['Heating Load (MBH)'].max(),2)
-neg_loads = load_df['Heating Load (MBH)'][load_df['Heating Load (MBH)'] < 0]
-
-# read static inputs & metadata into dataframe
-meta_df = pd.read_excel(
-    file_path_in + file_name_in,
-    sheet_name=sheet_name,
-    index_col=0,
-    usecols=meta_data_range,
-    engine='openpyxl'
-)
-meta_df.dropna(inplace=True)
-
-# read design MBH from spreadsheet and calculate 5% load increment
-mbh_design = round(meta_df.iloc[0,0],2)
-mbh_increment = mbh_design/20
-
-# read GSF from spreadsheet & calculate Btu/sf for design & actual
-gsf = meta_df.iloc[1,0]
-btu_sf_design = round(1000 * mbh_design / gsf,2)
-btu_sf_actual = round(1000 * max_load / gsf,2)
-
-# create bins and axes for plotting
-# bins = [str(5*(x+1)) + '%' for x in range(20)]
-decimal_labels = list(np.zeros(20))
-increment_labels = list(np.zeros(20))
-labels = list(np.zeros(20))
-for i in range(20):
-    decimal_labels[i] = str(5*(i+1)/100) + 'x'
-    increment_labels[i] = '(' + str(round(mbh_increment*i)) + '-' + str(round(mbh_increment*(i+1))) + ' MBH)'
-    # labels[i] = '<b>' + percent_labels[i] + '</b><br>' + increment_labels[i]
-    labels[i] = '<b>' + decimal_labels[i] + '</b><br>' + increment_labels[i]
-
-# create some variables
-binned_loads = [0] * 20
-cumulative_loads = [0] * 20
-cumulative_percent = [0] * 20
-c_load = 0
-cumulative_hours = [0] * 20
-c_hours = 0
-# bins and variables for hours histogram
-# counts, bin_edges = np.histogram(load_df['Heating Load (MBH)'][load_df['Heating Load (MBH)'] > 0], bins=20, range=(0,mbh_design))
-counts = [0] * 20
-
-# populate variables
-for i in range(20):
-    binned_loads[i] = load_df['Heating Load (MBH)'][(load_df['Heating Load (MBH)'] > (i * mbh_increment)) & (load_df['Heating Load (MBH)'] <= ((i + 1) * mbh_increment))].sum()
-    counts[i] = load_df['Heating Load (MBH)'][(load_df['Heating Load (MBH)'] > (i * mbh_increment)) & (load_df['Heating Load (MBH)'] <= ((i + 1) * mbh_increment))].count()
-
-    c_load += binned_loads[i]
-    c_hours += counts[i] * td_in_hrs
-
-    cumulative_loads[i] = c_load
-    cumulative_percent[i] = 100 * cumulative_loads[i]/total_load
-
-    cumulative_hours[i] = c_hours
-
-# create a figure with a secondary y-axis
-fig = make_subplots(
-    rows = 2,
-    cols = 1,
-    vertical_spacing=0.05,
-    specs=[[{"secondary_y": True}],[{"secondary_y": True}]]
-)
-
-# Set figure title
-title = '<b>Heating Load Distribution</b> from {} to {}'.format(start.strftime('%B %-d, %Y'),end.strftime('%B %-d, %Y'))
-for i in range(len(meta_df)-2):
-    title += '<br>' + meta_df.index[i+2] + ': ' + str(meta_df.iloc[i+2,0])
-fig.update_layout(
-    autosize=True,
-    title = dict(
-        text = title,
-        xanchor = 'left',
-        yanchor = 'top',
-        y = 0.95,
-        font = dict(color='black')
-    )
-)
-
-# row 1
-# add the hours bar chart on the primary axis
-fig.add_trace(
-    go.Bar(
-        x=labels,
-        y=[x/sum(counts)*100 for x in counts],
-        marker=dict(
-            color = "#3B6D89"
-        ),
-        customdata=np.stack([decimal_labels, increment_labels]).transpose(),
-        hovertemplate='<b>%{y:.2f}% of total operating hours</b> <extra>@ %{customdata[0]} design capacity</extra>'
-    ),
-    secondary_y=False,
-    row = 1,
-    col = 1
-)
-
-# add the cumulative percent line on the secondary axis
-fig.add_trace(
-    go.Scatter(
-        x=labels,
-        y=[x/total_op_hrs*100 for x in cumulative_hours],
-        mode='lines+markers',
-        marker = dict(
-            color = "#FB9A2D",
-        ),
-        customdata=np.stack([decimal_labels, increment_labels]).transpose(),
-        hovertemplate=
-        '<b>%{y:.2f}% of total operating hours</b> <extra>@ ≤%{customdata[0]} design capacity</extra>'
-    ),
-    secondary_y=True,
-    row=1,
-    col=1
-)
-
-# row 2
-# add the load bar chart on the primary axis
-fig.add_trace(
-    go.Bar(
-        x=labels,
-        y=[round(x/total_load*100,2) for x in binned_loads],
-        marker = dict(
-            color = "#00C496",
-        ),
-        customdata=np.stack([decimal_labels, increment_labels]).transpose(),
-        hovertemplate=
-        '<b>%{y:,}% of total heating output</b> <extra>@ %{customdata[0]} design capacity</extra>'
-    ),
-    secondary_y=False,
-    row=2,
-    col=1,
-)
-fig.update_yaxes(
-    ticksuffix='%'
-)
-
-# add the cumulative percent line on the secondary axis
-fig.add_trace(
-    go.Scatter(
-        x=labels,
-        y=cumulative_percent,
-        mode='lines+markers',
-        marker = dict(
-            color = "#FB9A2D",
-        ),
-        customdata=np.stack([decimal_labels, increment_labels]).transpose(),
-        hovertemplate=
-        '<b>%{y:.2f}% of total heating output</b> <extra>@ ≤%{customdata[0]} design capacity</extra>'
-    ),
-    secondary_y=True,
-    row=2,
-    col=1
-)
-
-# add annotations
-fig.add_annotation(
-    text= "<b>Design MBH</b>: {:,}<br><b>Design Btu/sf</b>: {:,}<br><br><b>Max. actual MBH</b>: {:,}<br><b>Max. actual \
-Btu/sf</b>: {:,}<br>".format(mbh_design,btu_sf_design,max_load,btu_sf_actual),
-    align='left',
-    showarrow=False,
-    bordercolor='black',
-    borderwidth= 2,
-    xref='paper',
-    yref='paper',
-    xanchor = 'right',
-    yanchor = 'bottom',
-    x=0.94,
-    y=1.05,
-    bgcolor="white",
-    borderpad = 10,
-    font = dict(size = 14, color='black')
-)
-# throw a warning if input data contains negative loads
-if len(neg_loads) > 0:
-    fig.add_annotation(
-        text="<b>WARNING</b>:<br>Input file contains negative load data-<br> # of negative data points: {} of {}<br> \
-total negative kBtus: {}".format(len(neg_loads),len(load_df),round(sum(neg_loads)*td_in_hrs,2)),
-        align='left',
-        showarrow=False,
-        bordercolor='red',
-        borderwidth=2,
-        xref='paper',
-        yref='paper',
-        xanchor='right',
-        yanchor='bottom',
-        x=0.7,
-        y=1.05,
-        bgcolor="white",
-        borderpad=10,
-        font=dict(size=14, color='red')
+with profile_stage('read_excel: load data') as stage:
+    load_df = pd.read_excel(
+        file_path_in + file_name_in,
+        sheet_name=sheet_name,
+        usecols=data_range,
+        engine='openpyxl'
     )
-    # counts.insert(0, len(neg_loads))
-    # binned_loads.insert(0, load_df['Heating Load (MBH)'][(load_df['Heating Load (MBH)'] < 0)].sum())
-    # cumulative_loads.insert(0, 0)
-    # cumulative_percent.insert(0, 0)
-    # cumulative_hours.insert(0, 0)
-    # labels.insert(0,'<b>!!!</b><br>Negative Load<br>(check inputs)')
-    # decimal_labels.insert(0, 'negative')
-    # increment_labels.insert(0, 'negative')
+    load_df.dropna(axis='index',how='all',inplace=True)
+    stage.rows = len(load_df)
+
+# shrink the load data - measurement columns to float32 where precision allows, repeated values to categoricals
+if compact_frames:
+    compact_df = compact_dtypes(load_df)
+    print('\nMEMORY REPORT:')
+    print(memory_report(load_df, compact_df))
+    load_df = compact_df
+
+# scan the load data for flatlined sensors, spikes, duplicate timestamps, etc. negative loads are left to the
+# negative load warning on the figure
+dq_summary, dq_mask = scan_data_quality(load_df['Heating Load (MBH)'], timestamps=load_df['Timestamp'])
+print('\nDATA QUALITY SUMMARY:')
+print(dq_summary)
+if exclude_bad_data:
+    load_df = load_df[~dq_mask['Any Issue'].to_numpy()]
 
-# configure plot layout
-fig.update_xaxes(type='category')
-
-# set row 1 axis titles
-fig.update_xaxes(
-    title_text='',
-    showticklabels=False,
-    showline=True,
-    linewidth=2,
-    linecolor='black',
-    mirror=True,
-    row=1
-)
-fig.update_yaxes(
-    title_text="<b>Operating hours</b>",
-    color = "#3B6D89",
-    showline=True,
-    linewidth=2,
-    linecolor='black',
-    secondary_y=False,
-    nticks=4,
-    row=1
-)
-fig.update_yaxes(
-    title_text="<b>Cumulative</b><br>(100% = {:,}".format(int(sum(counts)*td_in_hrs)) + " hours)",
-    color = "#FB9A2D",
-    showline=True,
-    linewidth=2,
-    linecolor='black',
-    secondary_y=True,
-    showgrid=False,
-    range=[0,105],
-    nticks=2,
-    row=1
-)
-
-# set row 2 axis titles
-fig.update_xaxes(
-    title_text='<b>Part load operating point</b><br>(1.0x = design capacity, ' + str(mbh_design) + ' MBH)',
-    showline=True,
-    linewidth=2,
-    linecolor='black',
-    mirror=True,
-    row=2
-)
-fig.update_yaxes(
-    title_text="<b>Heating output</b>",
-    color = "#00C496",
-    showline=True,
-    linewidth=2,
-    linecolor='black',
-    secondary_y=False,
-    nticks=4,
-    row=2
-)
-fig.update_yaxes(
-    title_text="<b>Cumulative</b><br>(100% = {:,}".format(round(total_load)) + " kBtus)",
-    color = "#FB9A2D",
-    showline=True,
-    linewidth=2,
-    linecolor='black',
-    showgrid = False,
-    secondary_y=True,
-    range=[0, 105],
-    nticks=2,
-    row=2
-)
-
-# customize hover labels
-# fig.update_layout(hovermode="x unified")
-fig.update_layout(
-    hoverlabel=dict(
-        bgcolor="white",
-        font_size=12,
+# read static inputs & metadata into dataframe
+with profile_stage('read_excel: metadata'):
+    meta_df = pd.read_excel(
+        file_path_in + file_name_in,
+        sheet_name=sheet_name,
+        index_col=0,
+        usecols=meta_data_range,
+        engine='openpyxl'
     )
-)
+    meta_df.dropna(inplace=True)
 
-# set margins
-fig.update_layout(
-    margin = dict(
-        l = 50,
-        r = 50,
-        t = 170,
-        b = 50
-    )
-)
+# read design MBH from spreadsheet
+mbh_design = round(meta_df.iloc[0,0],2)
 
-#set legend
-fig.update_layout(
-    legend = dict(
-        xanchor = 'right',
-        yanchor = 'top',
-        x = 0.9,
-        y = 0.35
-    ),
-    showlegend=False
-)
+# bin the loads and merge them into the building's saved summary. only rows newer than the last run are binned, so
+# re-exporting the full trend history each month doesn't cost a full re-analysis
+summary_path = summary_path_out + file_name_in + ' - ' + sheet_name + '.json'
+summary = update_load_summary(summary_path, load_df, mbh_design, exclude_bad_data=exclude_bad_data)
+
+# monthly totals for the results database & the workbook export
+if save_results_db or export_workbook:
+    period_df = summarize_load_periods(load_df['Timestamp'], load_df['Heating Load (MBH)'], summary['td_in_hrs'])
+
+# save the results & monthly totals to the results database
+if save_results_db:
+    with profile_stage('results database', rows=len(load_df)):
+        results_db = open_results_db(results_db_path)
+        save_load_results(results_db, summary, meta_df, source_file=file_name_in, sheet_name=sheet_name,
+                          period_df=period_df)
+        results_db.close()
+
+# confidence bands on the bin shares & peak load from resampling whole days of the data
+bands_df = None
+if bootstrap_bands:
+    with profile_stage('bootstrap_load_profile', rows=len(load_df)):
+        bands_df, peak_band = bootstrap_load_profile(load_df['Timestamp'], load_df['Heating Load (MBH)'], mbh_design,
+                                                     n_boot=2000, seed=0)
+    print('\nCONFIDENCE BANDS (90%):')
+    print(bands_df)
+    print(peak_band)
+
+# create the part load distribution figure from the summary
+with profile_stage('plot_load_profile'):
+    fig = plot_load_profile(summary, meta_df, bands_df)
 
 # open the figure in a web browser
 fig.show()
 
-# write the figure to a shareable .html file
+# write the figure to a shareable .html file. plotly.js is loaded from the CDN instead of copying the whole bundle
+# into every report
 file_path_out = 'Output Plots/'
 file_name_out = 'Heat Load Analysis - ' + file_name_in
-fig.write_html(file_path_out + file_name_out + '_Plot.html')
\ No newline at end of file
+write_load_profile_html(fig, file_path_out + file_name_out + '_Plot.html', include_plotlyjs='cdn')
+
+# export the processed load data & results in the load profile template's layout for the client
+if export_workbook:
+    write_load_profile_workbook(file_path_out + file_name_out + '_Export.xlsx', load_df, meta_df,
+                                sheets={'Bins': load_bin_table(summary), 'Monthly': period_df})
+
+# save the stage timings
+if profile_run:
+    profiler = stop_profiling()
+    print('\nSTAGE TIMINGS:')
+    print(profiler.summary())
+    profiler.write_json(file_path_out + file_name_out + '_Profile.json')
+    profiler.write_chrome_trace(file_path_out + file_name_out + '_Trace.json')
@@ -0,0 +1,140 @@
+####################################################################################################################
+# load_profile_app.py
+#
+# Streamlit app for exploring building load profiles - load_profile.py with the inputs as widgets
+
+
+
+####################################################################################################################
+# IMPORTS
+import io
+import pandas as pd
+
+from eatlib import * # import eatlib - the only library you'll ever need
+
+####################################################################################################################
+# FUNCTIONS
+
+# the analysis as a stage graph: ingest -> clean -> bin -> figure. each stage is memoized by its inputs, so changing
+# the design MBH or bin count only re-runs bin & figure, picking another sheet re-runs everything after ingest
+def excel_source(workbook):
+    # uploads are read from the start every time, paths as they are
+    return io.BytesIO(workbook.getvalue()) if hasattr(workbook, 'getvalue') else workbook
+
+
+def list_sheets(workbook):
+    return openpyxl.load_workbook(excel_source(workbook), read_only=True).sheetnames
+
+
+def ingest(workbook, sheet_name, data_range, meta_data_range):
+    # same reads as load_profile.py
+    load_df = pd.read_excel(excel_source(workbook), sheet_name=sheet_name, usecols=data_range, engine='openpyxl')
+    load_df.dropna(axis='index', how='all', inplace=True)
+    meta_df = pd.read_excel(excel_source(workbook), sheet_name=sheet_name, index_col=0, usecols=meta_data_range,
+                            engine='openpyxl')
+    meta_df.dropna(inplace=True)
+    return load_df, meta_df
+
+
+def clean(ingested, exclude_bad_data):
+    load_df, meta_df = ingested
+    load_df = load_df.assign(Timestamp=parse_timestamps(load_df['Timestamp']).to_numpy())  # parsed once, not per bin
+    dq_summary, dq_mask = scan_data_quality(load_df['Heating Load (MBH)'], timestamps=load_df['Timestamp'])
+    if exclude_bad_data:
+        load_df = load_df[~dq_mask['Any Issue'].to_numpy()]
+    return load_df, dq_summary
+
+
+def bin_stage(cleaned, mbh_design, n_bins):
+    load_df, dq_summary = cleaned
+    return summarize_loads(load_df['Timestamp'], load_df['Heating Load (MBH)'], mbh_design, n_bins=n_bins)
+
+
+def figure(summary, ingested):
+    return plot_load_profile(summary, ingested[1])
+
+
+def load_profile_graph():
+    graph = StageGraph()
+    graph.add('sheets', list_sheets, params=('workbook',))
+    graph.add('ingest', ingest, params=('workbook', 'sheet_name', 'data_range', 'meta_data_range'))
+    graph.add('clean', clean, inputs=('ingest',), params=('exclude_bad_data',))
+    graph.add('bin', bin_stage, inputs=('clean',), params=('mbh_design', 'n_bins'))
+    graph.add('figure', figure, inputs=('bin', 'ingest'))
+    return graph
+
+####################################################################################################################
+# SCRIPT
+
+# do some housekeeping and create some variables
+st.set_page_config(layout="wide")
+example_file = 'Input Load Profiles/7646 SDSU EIS.xlsx'
+if 'load_profile_graph' not in st.session_state:
+    st.session_state['load_profile_graph'] = load_profile_graph()  # memoized stages are kept for the session
+graph = st.session_state['load_profile_graph']
+
+# use triple quotes instead of st.write() for multiline printing using Markdown syntax
+# (https://www.markdownguide.org/cheat-sheet/)
+"""`Welcome to the party! This is an experimental app. If you run
+into any bugs/errors or have suggestions for additional features/functionality, please use the "Report a bug with
+this app" tool in the drop down menu in the top right corner of this page. Thanks for playing!`
+
+# Load Profile Explorer
+
+Part load distribution of a building's heating load, from a workbook in the load profile template's layout
+('Timestamp' & 'Heating Load (MBH)' columns, static inputs with the design MBH & GSF next to them).
+
+To get started, upload a workbook - or use the example."""
+
+uploaded_file = st.file_uploader("Upload a load profile workbook", type='xlsx')
+workbook = uploaded_file if uploaded_file is not None else example_file
+if uploaded_file is None:
+    st.caption('Showing the example: ' + example_file)
+
+# inputs - everything load_profile.py has hard-coded
+with st.sidebar:
+    sheet_name = st.selectbox('Sheet', graph.run('sheets', workbook=workbook),
+                              index=None if uploaded_file is not None else 0)
+    data_range = st.text_input('Data columns', 'A:I')
+    meta_data_range = st.text_input('Static inputs columns', 'K:L')
+    exclude_bad_data = st.checkbox('Exclude bad data', help='Drop points flagged by the data quality scan before '
+                                                            'binning')
+
+if sheet_name is not None:
+    params = dict(workbook=workbook, sheet_name=sheet_name, data_range=data_range, meta_data_range=meta_data_range,
+                  exclude_bad_data=exclude_bad_data)
+    load_df, meta_df = graph.run('ingest', **params)
+    ingest_runs = dict(graph.last_run)
+
+    # the design MBH defaults to the workbook's, a new sheet resets it
+    with st.sidebar:
+        mbh_design = st.number_input('Design MBH', min_value=1.0, value=float(round(meta_df.iloc[0, 0], 2)),
+                                     key='mbh_design ' + graph.key('ingest', **params))
+        n_bins = st.slider('Part load bins', min_value=5, max_value=40, value=20)
+    params.update(mbh_design=mbh_design, n_bins=n_bins)
+
+    fig = graph.run('figure', **params)
+    stage_runs = {**ingest_runs, **graph.last_run}
+    summary = graph.run('bin', **params)  # already memoized by the figure run
+    load_df, dq_summary = graph.run('clean', **params)
+
+    st.caption('Ran ' + (', '.join('{} ({:.0f} ms)'.format(name, 1000 * seconds)
+                                   for name, seconds in stage_runs.items()) or 'nothing, all stages memoized'))
+
+    """
+    ### Part Load Distribution:
+
+    Pan and zoom with your mouse to get a closer look at the data. Double click inside the graph to reset the axes.
+
+    You can download this graph as a .png by clicking the camera icon in the plot figure menu.
+    """
+    st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander('Bins'):
+        st.dataframe(load_bin_table(summary))
+
+    with st.expander('Data Quality'):
+        st.dataframe(dq_summary)
+
+    with st.expander('Raw Data'):
+        st.dataframe(load_df)
@@ -117,3 +117,7 @@ fig2 = plot_epw(epw_df2)
 fig2.show()
 
 
+# compare the two files variable by variable (statistics, monthly means, degree days, correlation with the first).
+# threads, not processes - this script has no __main__ guard, so spawned workers would re-run it
+comparison_df = compare_epws([epw_path1, epw_path2], processes=False)
+print(comparison_df.xs('Dry Bulb Temperature', level='Variable'))
@@ -11,129 +11,6 @@ import pandas as pd
 
 from eatlib import * # import eatlib - the only library you'll ever need
 # from pvlib.iotools import epw
-import ladybug_pandas as lbp
-from ladybug.epw import EPW
-
-####################################################################################################################
-# FUNCTIONS
-
-def stringify_path(
-    filepath_or_buffer: FilePathOrBuffer[AnyStr],
-) -> FilePathOrBuffer[AnyStr]:
-    """
-    Attempt to convert a path-like object to a string.
-
-    Parameters
-    ----------
-    filepath_or_buffer : object to be converted
-
-    Returns
-    -------
-    str_filepath_or_buffer : maybe a string version of the object
-
-    Notes
-    -----
-    Objects supporting the fspath protocol (python 3.6+) are coerced
-    according to its __fspath__ method.
-
-    For backwards compatibility with older pythons, pathlib.Path and
-    py.path objects are specially coerced.
-
-    Any other object is passed through unchanged, which includes bytes,
-    strings, buffers, or anything else that's not even path-like.
-    """
-    if hasattr(filepath_or_buffer, "__fspath__"):
-        # https://github.com/python/mypy/issues/1424
-        return filepath_or_buffer.__fspath__()  # type: ignore
-    elif isinstance(filepath_or_buffer, pathlib.Path):
-        return str(filepath_or_buffer)
-    return _expand_user(filepath_or_buffer)
-
-
-#####################################################
-#   read_epw(epw_file) - read a .epw weather file into a pandas dataframe
-#
-#   Imports:
-#   from pvlib.iotools import epw
-#   import pandas as pd
-#   import datetime
-#   import plotly.graph_objects as go
-#
-#
-#   Inputs:
-#
-#   epw_file - a .epw weather file (https://energyplus.net/weather)
-#
-#
-#   Outputs:
-#
-#   load_df - a dataframe representation of the .epw data with slightly modified columns.
-#   metadata - the site metadata available in the .epw file
-#
-#
-#   Notes:
-#
-#   -See (https://pvlib-python.readthedocs.io/en/stable/generated/pvlib.iotools.read_epw.html#pvlib.iotools.read_epw)
-#    for more information.
-#   -Show interpolated data in a different color
-#
-#
-#   TODO:
-#
-#   - make column names better
-#
-#
-def read_epw(epw_path):
-    # read in a .epw file using ladybug-pandas (https://github.com/ladybug-tools/ladybug-pandas)
-    epw = EPW(epw_path)
-    epw._import_data()
-    df = lbp.DataFrame.from_epw(epw)
-    df_ip = df.ladybug.to_ip()
-
-    # drop unwanted columns, & reset the timestamp column
-    df_ip.index.name='timestamp'
-    # df_ip.reset_index(inplace=True)
-    return df_ip
-#####################################################
-
-
-#####################################################
-#   plot_epw(epw_df) - plot weather data from a dataframe constructed with read_epw()
-#
-#   Imports:
-#
-#   import pandas as pd
-#   import plotly.graph_objects as go
-#
-#
-#   Inputs:
-#
-#   epw_df - a dataframe constructed with read_epw()
-#
-#
-#   Outputs:
-#
-#   fig - a Plotly figure
-#
-#
-def plot_epw(epw_df):
-    # use graph_objects to create the figure
-    fig = go.Figure()
-
-    # create traces for all columns vs. timestamps
-    for i in range(epw_df.shape[1]):
-        fig.add_trace(go.Scatter(x=epw_df.index, y=epw_df.iloc[:, i],
-                                 visible='legendonly',
-                                 mode='lines',
-                                 name=epw_df.columns[i]))
-
-    # layout configuration
-    fig.update_layout(showlegend=True)  # force the legend for single-trace plots
-    fig.update_layout(legend_title_text='Legend')
-    fig.update_layout(hovermode='x')
-    return fig
-
-
 
 ####################################################################################################################
 # SCRIPT
@@ -156,9 +33,9 @@ reports/presentations.
 
 This app is compatible with weather data files saved in the [.epw](https://energyplus.net/weather/sources) EnergyPlus format.
 
-To get started, upload a .epw file - or click "See example"."""
+To get started, upload one or more .epw files - or click "See example"."""
 
-uploaded_file = st.file_uploader("Upload a .epw file", type='epw')
+uploaded_files = st.file_uploader("Upload .epw files", type='epw', accept_multiple_files=True)
 
 if st.button('See example'):
     # epw_df = read_epw(epw_path + random.choice(os.listdir(epw_path)))  # pick a random example file
@@ -190,34 +67,75 @@ if st.button('See example'):
 
     st.plotly_chart(fig, use_container_width=True)
 
-if uploaded_file is not None:
-    bytes = uploaded_file.read()
-    epw_df = read_epw(bytes)
-
-    fig = plot_epw(epw_df)
+if uploaded_files:
+    # parsed files are kept for the session, so changing the variable or adding a file doesn't re-parse the others
+    parsed = st.session_state.setdefault('parsed_epws', {})  # file_id -> (name, epw_df, summary_df)
+    failed = st.session_state.setdefault('failed_epws', {})  # file_id -> error message, so bad files aren't re-read
+    uploaded_ids = {uploaded_file.file_id for uploaded_file in uploaded_files}
+    for cache in (parsed, failed):
+        for file_id in list(cache):
+            if file_id not in uploaded_ids:
+                del cache[file_id]  # file was removed from the uploader
 
     """
-    ### Raw Data:
-
-    Uploaded file should be in .epw format
+    ### Compare Files:
 
-    Click "See example" again to see a different example, or upload a different file.
+    The same variable from every uploaded file on one time axis. Files are added as soon as they're parsed.
     """
 
-    # # this line displays the .csv file in table format, with the index column suppressed to avoid confusion
-    # st.dataframe(epw_df.assign(drop_index='').set_index('drop_index'))
-    st.dataframe(epw_df)
+    variable = st.selectbox('Variable', EPW_VARIABLES)
+    overlay_chart = st.empty()
+    names = {uploaded_file.file_id: uploaded_file.name for uploaded_file in uploaded_files}
+    file_slots = {file_id: st.empty() for file_id in names}
+
+    def show_file(file_id):
+        name, epw_df, summary_df = parsed[file_id]
+        with file_slots[file_id].container():
+            with st.expander(name):
+                """
+                Annual statistics (0.4th & 99.6th percentiles of dry bulb are the ASHRAE 99.6% heating & 0.4% cooling
+                design conditions):
+                """
+                st.dataframe(summary_df)
+
+                """
+                Raw Data:
+                """
+                st.dataframe(epw_df)
+
+                """
+                Point Trend Graph - click on point names in the legend to make them visible:
+                """
+                st.plotly_chart(plot_epw(epw_df), use_container_width=True)
+
+    def show_overlay():
+        epw_dfs = {parsed[file_id][0]: parsed[file_id][1] for file_id in file_slots if file_id in parsed}
+        overlay_chart.plotly_chart(plot_epw_overlay(epw_dfs, variable), use_container_width=True)
+
+    # show the files we already have, then parse the new ones on a bounded thread pool & add each one as it finishes
+    for file_id in file_slots:
+        if file_id in parsed:
+            show_file(file_id)
+        elif file_id in failed:
+            file_slots[file_id].error(failed[file_id])
+        else:
+            file_slots[file_id].info('Reading ' + names[file_id] + '...')
+    show_overlay()
+
+    new_files = {uploaded_file.file_id: uploaded_file for uploaded_file in uploaded_files
+                 if uploaded_file.file_id not in parsed and uploaded_file.file_id not in failed}
+    if new_files:
+        for file_id, epw_df, summary_df, error in read_epws(new_files, max_workers=4, processes=False):
+            if error is not None:
+                failed[file_id] = 'Could not read ' + names[file_id] + ': ' + str(error)
+                file_slots[file_id].error(failed[file_id])
+                continue
+            parsed[file_id] = (names[file_id], epw_df, summary_df)
+            show_file(file_id)
+            show_overlay()
 
     """
-    ### Point Trend Graph:
-
-    Click on point names in the legend to make them visible.
-
     Pan and zoom with your mouse to get a closer look at the data. Double click inside the graph to reset the axes.
 
     You can download this graph as a .png by clicking the camera icon in the plot figure menu.
     """
-
-    st.plotly_chart(fig, use_container_width=True)
-
-